@@ -0,0 +1,133 @@
+# bench_booking_queue.py
+#
+# 订票队列对比测试：在临时数据库中生成多趟列车（每趟一次运行）的待处理订单，
+# 先由线程池直接并发调用 OrderService.process_order 批准一半订单，
+# 再通过按运行分片的 BookingQueue 批准另一半，比较吞吐量、死锁/锁等待重试导致的失败数，
+# 并输出队列各分片的深度和延迟统计。
+#
+# 用法（在项目根目录执行）:
+#   python -m benchmarks.bench_booking_queue --runs 8 --orders 4000 --workers 4
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db import db
+from db import database as database_module
+from db.db_config import DB_CONFIG
+from db.db_setup import create_tables, create_procedures, create_triggers
+from core.booking_queue import BookingQueue
+from core.services import OrderService
+from benchmarks.bench_data import START_DATE, connect, populate
+
+def add_runs(cursor, runs, stops, seats, orders, seed):
+    """在 populate 生成的 B0001 之外复制出更多列车，返回按列车打乱的订单ID列表"""
+    rng = random.Random(seed)
+    cursor.execute("SELECT order_id FROM `SalesOrders`")
+    order_ids = [row[0] for row in cursor.fetchall()]
+    for n in range(2, runs + 1):
+        train = f"B{n:04d}"
+        cursor.execute(
+            "INSERT INTO `Trains` (`train_number`, `train_type`, `total_seats`, `departure_station_id`, "
+            "`arrival_station_id`) VALUES (%s, 'High-Speed', %s, 1, %s)",
+            (train, seats, stops)
+        )
+        cursor.execute(
+            "INSERT INTO `Stopovers` (`train_number`, `station_id`, `start_date`, `arrival_time`, "
+            "`departure_time`, `stop_order`, `seats`) "
+            "SELECT %s, station_id, start_date, arrival_time, departure_time, stop_order, seats "
+            "FROM `Stopovers` WHERE train_number = 'B0001'",
+            (train,)
+        )
+        rows = []
+        for i in range(orders):
+            dep = rng.randint(1, stops - 1)
+            arr = rng.randint(dep + 1, stops)
+            rows.append((f"Q{n:03d}{i:07d}", train, START_DATE, dep, arr, dep, arr, 10 * (arr - dep), 'BENCH0001'))
+        cursor.executemany(
+            "INSERT INTO `SalesOrders` (`order_id`, `train_number`, `start_date`, `departure_station_id`, "
+            "`arrival_station_id`, `dep_stop_order`, `arr_stop_order`, `price`, `customer_id`, `operation_type`, `status`) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'Booking', 'Ready')",
+            rows
+        )
+        order_ids.extend(row[0] for row in rows)
+    rng.shuffle(order_ids)
+    return order_ids
+
+def summarize(label, results, elapsed):
+    approved = sum(1 for success, _ in results if success)
+    failures = {}
+    for success, message in results:
+        if not success:
+            failures[message] = failures.get(message, 0) + 1
+    print(f"\n=== {label} ===")
+    print(f"approved: {approved}, rejected: {len(results) - approved}, "
+          f"{len(results) / elapsed:.1f} requests/s ({elapsed:.2f} s)")
+    for message, count in sorted(failures.items(), key=lambda item: -item[1]):
+        print(f"  {count:>6}  {message}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare direct and queued order approval")
+    parser.add_argument("--runs", type=int, default=8)
+    parser.add_argument("--stops", type=int, default=8)
+    parser.add_argument("--seats", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=4000, help="orders per run")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    bench_db = f"{DB_CONFIG['database']}_bench"
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{bench_db}`")
+    cursor.execute(f"CREATE DATABASE `{bench_db}` DEFAULT CHARACTER SET 'utf8mb4'")
+    cursor.close()
+    conn.close()
+
+    conn = connect(bench_db)
+    cursor = conn.cursor(buffered=True)
+    try:
+        create_tables(cursor)
+        create_procedures(cursor)
+        create_triggers(cursor)
+        _, staff_ids = populate(cursor, args.stops, args.seats, args.orders, 1, args.seed)
+        order_ids = add_runs(cursor, args.runs, args.stops, args.seats, args.orders, args.seed)
+        conn.commit()
+
+        # 让全局 db 实例和连接池指向临时数据库（连接池上限为32）
+        DB_CONFIG['database'] = bench_db
+        database_module.POOL_SIZE = min(args.workers + 1, 32)
+        db.close()
+        db.connect()
+        db.pool = None
+
+        half = len(order_ids) // 2
+        print(f"{args.runs} runs x {args.orders} orders, {args.workers} workers, "
+              f"{args.seats} seats, {args.stops - 1} segments")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(
+                lambda order_id: OrderService.process_order(order_id, True, staff_ids[0]), order_ids[:half]
+            ))
+        summarize("direct thread pool", results, time.perf_counter() - start)
+
+        booking_queue = BookingQueue(workers=args.workers)
+        start = time.perf_counter()
+        futures = [booking_queue.process_order(order_id, True, staff_ids[0]) for order_id in order_ids[half:]]
+        results = [future.result() for future in futures]
+        summarize("booking queue", results, time.perf_counter() - start)
+        booking_queue.stop()
+
+        print(f"\n{'shard':>5} {'done':>7} {'failed':>7} {'avg wait':>10} {'avg svc':>9} {'p95':>9}")
+        for stats in booking_queue.stats():
+            print(f"{stats['shard']:>5} {stats['completed']:>7} {stats['failed']:>7} "
+                  f"{stats['avg_wait_ms']:>8.1f}ms {stats['avg_service_ms']:>7.1f}ms "
+                  f"{stats['p95_latency_ms']:>7.1f}ms")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
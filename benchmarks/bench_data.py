@@ -0,0 +1,70 @@
+# bench_data.py
+#
+# 基准测试共用的数据生成：在临时数据库中生成一趟列车 B0001 及其待处理订单。
+
+import datetime
+import random
+
+import mysql.connector
+from db.db_config import DB_CONFIG
+
+START_DATE = datetime.date(2025, 1, 1)
+
+def connect(database=None):
+    config = dict(DB_CONFIG)
+    if database:
+        config['database'] = database
+    else:
+        config.pop('database', None)
+    return mysql.connector.connect(**config)
+
+def populate(cursor, stops, seats, orders, staff, seed):
+    """生成一趟列车及其待处理订单，返回 (订单ID列表, 乘务员ID列表)"""
+    rng = random.Random(seed)
+    cursor.executemany(
+        "INSERT INTO `Stations` (`station_name`, `station_code`) VALUES (%s, %s)",
+        [(f"S{i:03d}", f"C{i:03d}") for i in range(1, stops + 1)]
+    )
+    cursor.execute(
+        "INSERT INTO `Trains` (`train_number`, `train_type`, `total_seats`, `departure_station_id`, `arrival_station_id`) VALUES (%s, %s, %s, %s, %s)",
+        ('B0001', 'High-Speed', seats, 1, stops)
+    )
+
+    t = datetime.datetime.combine(START_DATE, datetime.time(8))
+    stopovers = []
+    for order in range(1, stops + 1):
+        arrival = t if order > 1 else None
+        departure = t + datetime.timedelta(minutes=2) if order < stops else None
+        stopovers.append(('B0001', order, START_DATE, arrival, departure, order, seats))
+        t += datetime.timedelta(minutes=30)
+    cursor.executemany(
+        "INSERT INTO `Stopovers` (`train_number`, `station_id`, `start_date`, `arrival_time`, "
+        "`departure_time`, `stop_order`, `seats`) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        stopovers
+    )
+    cursor.executemany(
+        "INSERT INTO `Prices` (`train_number`, `departure_station_id`, `arrival_station_id`, `price`) VALUES (%s, %s, %s, %s)",
+        [('B0001', i, j, 10 * (j - i)) for i in range(1, stops + 1) for j in range(i + 1, stops + 1)]
+    )
+
+    cursor.execute("INSERT INTO `Customers` (`name`, `phone`, `id_card`) VALUES (%s, %s, %s)",
+                   ('Bench', '10000000000', 'BENCH0001'))
+    staff_ids = [f"B{i:03d}" for i in range(staff)]
+    cursor.executemany(
+        "INSERT INTO `Salespersons` (`salesperson_id`, `salesperson_name`, `contact_number`, `email`, `password`, `role`) "
+        "VALUES (%s, %s, %s, %s, %s, 'Salesperson')",
+        [(sid, sid, '10000000000', f"{sid}@bench.local", '-') for sid in staff_ids]
+    )
+
+    order_rows = []
+    for n in range(orders):
+        dep = rng.randint(1, stops - 1)
+        arr = rng.randint(dep + 1, stops)
+        order_rows.append((f"O{n:08d}", 'B0001', START_DATE, dep, arr, dep, arr, 10 * (arr - dep), 'BENCH0001'))
+    cursor.executemany(
+        "INSERT INTO `SalesOrders` (`order_id`, `train_number`, `start_date`, `departure_station_id`, "
+        "`arrival_station_id`, `dep_stop_order`, `arr_stop_order`, `price`, `customer_id`, `operation_type`, `status`) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'Booking', 'Ready')",
+        order_rows
+    )
+    return [row[0] for row in order_rows], staff_ids
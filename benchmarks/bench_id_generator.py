@@ -0,0 +1,85 @@
+# bench_id_generator.py
+#
+# 订单号生成器吞吐量测试（纯内存，不需要数据库）：
+# 分别测量单线程逐个生成、批量生成以及多线程并发生成的速度，
+# 并校验所有ID唯一、单线程生成的ID严格递增、订单号不超过 VARCHAR(20)。
+#
+# 用法（在项目根目录执行）:
+#   python -m benchmarks.bench_id_generator --count 2000000 --threads 4
+
+import argparse
+import sys
+import threading
+import time
+
+from utils.id_generator import IdGenerator
+
+def measure(label, count, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {count / elapsed / 1e6:6.2f} M ids/s ({elapsed:.3f} s)")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the order ID generator")
+    parser.add_argument("--count", type=int, default=2000000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--node", type=int, default=1)
+    args = parser.parse_args()
+
+    errors = []
+    generator = IdGenerator(args.node)
+
+    next_id = generator.next_id
+    ids = measure("next_id", args.count, lambda: [next_id() for _ in range(args.count)])
+    if any(b <= a for a, b in zip(ids, ids[1:])):
+        errors.append("next_id: ids are not strictly increasing")
+
+    batches = args.count // args.batch
+    batch_ids = measure("next_ids", batches * args.batch, lambda: [
+        value for _ in range(batches) for value in generator.next_ids(args.batch)
+    ])
+    if batch_ids[0] <= ids[-1] or any(b <= a for a, b in zip(batch_ids, batch_ids[1:])):
+        errors.append("next_ids: ids are not strictly increasing")
+
+    order_ids = measure("next_order_id", args.count, lambda: [
+        generator.next_order_id() for _ in range(args.count)
+    ])
+    if max(len(order_id) for order_id in order_ids) > 20:
+        errors.append("next_order_id: order id longer than VARCHAR(20)")
+    if order_ids != sorted(order_ids):
+        errors.append("next_order_id: string order differs from generation order")
+
+    results = [None] * args.threads
+    per_thread = args.count // args.threads
+
+    def worker(index):
+        results[index] = [next_id() for _ in range(per_thread)]
+
+    def run_threads():
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    measure(f"next_id x{args.threads} threads", per_thread * args.threads, run_threads)
+    concurrent = [value for chunk in results for value in chunk]
+    if len(set(concurrent)) != len(concurrent):
+        errors.append("threads: duplicate ids")
+
+    last_ms, node, sequence = IdGenerator.parse(order_ids[-1])
+    print(f"last order id: {order_ids[-1]} (node {node}, sequence {sequence}, "
+          f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(last_ms / 1000))})")
+
+    if errors:
+        print("FAIL")
+        for error in errors:
+            print(f"  {error}")
+        sys.exit(1)
+    print("PASS: all ids unique and ordered")
+
+if __name__ == "__main__":
+    main()
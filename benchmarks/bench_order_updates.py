@@ -0,0 +1,151 @@
+# bench_order_updates.py
+#
+# 订单状态更新吞吐量对比（before/after）：
+#   before: 旧版 after_order_success / after_order_refund 触发器，
+#           每次 UPDATE SalesOrders 都先执行两次 stop_order 查询，再判断状态变化是否与余票有关
+#   after:  当前的触发器定义，余票只在批准新订单和批准退款时由 OrderService 在事务中调整
+# 两轮使用相同的临时数据和相同的状态变化序列（批准、申请退款、拒绝退款、批准退款），
+# 两轮对余票的调整相同，区别只在于与余票无关的更新是否也要付出触发器中的查询，
+# 每轮逐条提交，比较每秒更新数。
+#
+# 用法（在项目根目录执行）:
+#   python -m benchmarks.bench_order_updates --orders 5000
+
+import argparse
+import random
+import time
+
+from db.db_config import DB_CONFIG
+from db.db_setup import create_tables, create_procedures, create_triggers
+from benchmarks.bench_data import START_DATE, connect, populate
+
+LEGACY_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS after_order_success",
+    """
+    CREATE TRIGGER after_order_success
+    AFTER UPDATE ON `SalesOrders`
+    FOR EACH ROW
+    BEGIN
+        DECLARE dep_order INT;
+        DECLARE arr_order INT;
+        SELECT stop_order INTO dep_order FROM Stopovers s2
+        WHERE s2.train_number = NEW.train_number AND s2.start_date = NEW.start_date
+        AND s2.station_id = NEW.departure_station_id;
+        SELECT stop_order INTO arr_order FROM Stopovers s3
+        WHERE s3.train_number = NEW.train_number AND s3.start_date = NEW.start_date
+        AND s3.station_id = NEW.arrival_station_id;
+        IF NEW.status = 'Success' AND OLD.status = 'Ready' THEN
+            UPDATE Stopovers s SET s.seats = s.seats - 1
+            WHERE s.train_number = NEW.train_number AND s.start_date = NEW.start_date
+            AND s.seats > 0 AND s.stop_order >= dep_order AND s.stop_order < arr_order;
+        END IF;
+    END
+    """,
+    "DROP TRIGGER IF EXISTS after_order_refund",
+    """
+    CREATE TRIGGER after_order_refund
+    AFTER UPDATE ON `SalesOrders`
+    FOR EACH ROW
+    BEGIN
+        DECLARE dep_order INT;
+        DECLARE arr_order INT;
+        SELECT stop_order INTO dep_order FROM Stopovers s2
+        WHERE s2.train_number = NEW.train_number AND s2.start_date = NEW.start_date
+        AND s2.station_id = NEW.departure_station_id;
+        SELECT stop_order INTO arr_order FROM Stopovers s3
+        WHERE s3.train_number = NEW.train_number AND s3.start_date = NEW.start_date
+        AND s3.station_id = NEW.arrival_station_id;
+        IF NEW.status = 'Refunded' AND OLD.status = 'RefundPending' THEN
+            UPDATE Stopovers s SET s.seats = s.seats + 1
+            WHERE s.train_number = NEW.train_number AND s.start_date = NEW.start_date
+            AND s.stop_order >= dep_order AND s.stop_order < arr_order;
+        END IF;
+    END
+    """,
+]
+
+# 每个订单依次经历的状态变化，第一步批准扣减座位，最后一步批准退款归还座位
+TRANSITIONS = [
+    ("Ready", "Success"),
+    ("Success", "RefundPending"),
+    ("RefundPending", "Success"),
+    ("Success", "RefundPending"),
+    ("RefundPending", "Refunded"),
+]
+
+def reset(cursor, seats):
+    cursor.execute("UPDATE `SalesOrders` SET status = 'Ready', version = 0")
+    cursor.execute("UPDATE `Stopovers` SET seats = %s", (seats,))
+
+def run_updates(conn, cursor, order_ids, legacy):
+    """按 TRANSITIONS 逐条更新并提交，返回 (更新数, 耗时)"""
+    updates = 0
+    start = time.perf_counter()
+    for original, new in TRANSITIONS:
+        for order_id, dep, arr in order_ids:
+            cursor.execute(
+                "UPDATE `SalesOrders` SET status = %s, version = version + 1 "
+                "WHERE order_id = %s AND start_date = %s AND status = %s",
+                (new, order_id, START_DATE, original)
+            )
+            if not legacy and (original, new) in (('Ready', 'Success'), ('RefundPending', 'Refunded')):
+                # 当前实现：只有批准新订单和批准退款时由应用调整余票
+                cursor.execute(
+                    "UPDATE `Stopovers` SET seats = seats + %s WHERE train_number = 'B0001' "
+                    "AND start_date = %s AND stop_order >= %s AND stop_order < %s",
+                    (1 if new == 'Refunded' else -1, START_DATE, dep, arr)
+                )
+            conn.commit()
+            updates += 1
+    return updates, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Order status update throughput, legacy triggers vs current")
+    parser.add_argument("--stops", type=int, default=8)
+    parser.add_argument("--seats", type=int, default=100000)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    bench_db = f"{DB_CONFIG['database']}_bench"
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{bench_db}`")
+    cursor.execute(f"CREATE DATABASE `{bench_db}` DEFAULT CHARACTER SET 'utf8mb4'")
+    cursor.close()
+    conn.close()
+
+    conn = connect(bench_db)
+    cursor = conn.cursor(buffered=True)
+    try:
+        create_tables(cursor)
+        create_procedures(cursor)
+        populate(cursor, args.stops, args.seats, args.orders, 1, args.seed)
+        cursor.execute("SELECT order_id, dep_stop_order, arr_stop_order FROM `SalesOrders`")
+        order_ids = cursor.fetchall()
+        random.Random(args.seed).shuffle(order_ids)
+        conn.commit()
+
+        results = {}
+        for label, legacy in (("before (legacy triggers)", True), ("after (current)", False)):
+            create_triggers(cursor)
+            if legacy:
+                for stmt in LEGACY_TRIGGERS:
+                    cursor.execute(stmt)
+            reset(cursor, args.seats)
+            conn.commit()
+            updates, elapsed = run_updates(conn, cursor, order_ids, legacy)
+            results[label] = updates / elapsed
+            print(f"{label:<26} {updates} updates in {elapsed:.2f} s, {updates / elapsed:.1f} updates/s")
+
+        cursor.execute("SELECT MIN(seats), MAX(seats) FROM `Stopovers` WHERE stop_order < %s", (args.stops,))
+        low, high = cursor.fetchone()
+        print(f"seats after both runs: {low}..{high} (expected {args.seats})")
+        before, after = results.values()
+        print(f"speedup: {after / before:.2f}x")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
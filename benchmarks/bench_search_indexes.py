@@ -0,0 +1,200 @@
+# bench_search_indexes.py
+#
+# 余票查询索引对比测试：在临时数据库中生成大规模数据，对比
+#   before: DATE(s1.departure_time) = %s 过滤 + 单列 idx_stopovers_station_id
+#   after : departure_time 范围过滤 + 迁移 0001 的组合索引
+# 的 EXPLAIN 执行计划与查询耗时。
+#
+# 用法（在项目根目录执行）:
+#   python -m benchmarks.bench_search_indexes --trains 2000 --days 60 --stops 12
+
+import argparse
+import datetime
+import random
+import time
+
+import mysql.connector
+from db.db_config import DB_CONFIG
+from db.db_setup import create_tables
+from db.db_migrations import MIGRATIONS
+
+SEARCH_QUERY = """
+    SELECT
+        s1.train_number, s1.start_date, s1.departure_time, s2.arrival_time,
+        MIN(s3.seats) as min_seats, t.train_type, p.price
+    FROM
+        Stopovers s1
+        JOIN Stopovers s2 ON s1.train_number = s2.train_number AND s1.start_date = s2.start_date
+        JOIN Stopovers s3 ON s1.train_number = s3.train_number AND s1.start_date = s3.start_date
+        JOIN Trains t ON s1.train_number = t.train_number
+        JOIN Prices p ON s1.train_number = p.train_number
+            AND s1.station_id = p.departure_station_id
+            AND s2.station_id = p.arrival_station_id
+    WHERE
+        s1.station_id = %s
+        AND s2.station_id = %s
+        AND s1.stop_order < s2.stop_order
+        AND s3.stop_order >= s1.stop_order
+        AND s3.stop_order < s2.stop_order
+        {date_filter}
+    GROUP BY
+        s1.train_number, s1.start_date, s1.departure_time, s2.arrival_time, t.train_type, p.price
+    ORDER BY
+        s1.departure_time
+"""
+
+BEFORE_FILTER = "AND DATE(s1.departure_time) = %s"
+AFTER_FILTER = "AND s1.departure_time >= %s AND s1.departure_time < %s + INTERVAL 1 DAY"
+
+NEW_INDEXES = ("idx_stopovers_station_date", "idx_stopovers_station_departure", "idx_stopovers_run_order")
+
+def connect(database=None):
+    config = dict(DB_CONFIG)
+    if database:
+        config['database'] = database
+    else:
+        config.pop('database', None)
+    return mysql.connector.connect(**config)
+
+def populate(cursor, trains, days, stops, stations, seed):
+    """生成车站、列车、经停和票价数据，返回用于查询的 (出发站ID, 到达站ID, 日期)"""
+    rng = random.Random(seed)
+    cursor.executemany(
+        "INSERT INTO `Stations` (`station_name`, `station_code`) VALUES (%s, %s)",
+        [(f"S{i:05d}", f"C{i:05d}") for i in range(1, stations + 1)]
+    )
+    # 两个枢纽站让大量列车同时经过，模拟热门线路
+    hub_a, hub_b = 1, 2
+    first_day = datetime.date(2025, 1, 1)
+
+    routes = {}
+    train_rows = []
+    for n in range(trains):
+        train_number = f"B{n:05d}"
+        if rng.random() < 0.5:
+            route = rng.sample(range(3, stations + 1), stops - 2)
+            i = rng.randint(0, len(route))
+            route.insert(i, hub_a)
+            route.insert(rng.randint(i + 1, len(route)), hub_b)
+        else:
+            route = rng.sample(range(3, stations + 1), stops)
+        routes[train_number] = route
+        train_rows.append((train_number, 'High-Speed', 1000, route[0], route[-1]))
+    cursor.executemany(
+        "INSERT INTO `Trains` (`train_number`, `train_type`, `total_seats`, `departure_station_id`, `arrival_station_id`) VALUES (%s, %s, %s, %s, %s)",
+        train_rows
+    )
+
+    stopover_sql = (
+        "INSERT INTO `Stopovers` (`train_number`, `station_id`, `start_date`, `arrival_time`, "
+        "`departure_time`, `stop_order`, `seats`) VALUES (%s, %s, %s, %s, %s, %s, %s)"
+    )
+    batch = []
+    for train_number, route in routes.items():
+        base_hour = rng.randint(5, 20)
+        for d in range(days):
+            day = first_day + datetime.timedelta(days=d)
+            t = datetime.datetime.combine(day, datetime.time(base_hour))
+            for order, station_id in enumerate(route, start=1):
+                arrival = t if order > 1 else None
+                departure = t + datetime.timedelta(minutes=2) if order < len(route) else None
+                batch.append((train_number, station_id, day, arrival, departure, order, rng.randint(0, 1000)))
+                t += datetime.timedelta(minutes=rng.randint(20, 90))
+            if len(batch) >= 5000:
+                cursor.executemany(stopover_sql, batch)
+                batch = []
+    if batch:
+        cursor.executemany(stopover_sql, batch)
+
+    price_rows = []
+    for train_number, route in routes.items():
+        for i in range(len(route)):
+            for j in range(i + 1, len(route)):
+                price_rows.append((train_number, route[i], route[j], round(10 + 15 * (j - i), 2)))
+    for i in range(0, len(price_rows), 5000):
+        cursor.executemany(
+            "INSERT INTO `Prices` (`train_number`, `departure_station_id`, `arrival_station_id`, `price`) VALUES (%s, %s, %s, %s)",
+            price_rows[i:i + 5000]
+        )
+
+    return hub_a, hub_b, (first_day + datetime.timedelta(days=days // 2)).strftime('%Y-%m-%d')
+
+def explain(cursor, query, params):
+    cursor.execute("EXPLAIN " + query, params)
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def timed(cursor, query, params, repeat):
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        rows = len(cursor.fetchall())
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return rows, timings[len(timings) // 2] * 1000, timings[0] * 1000
+
+def report(label, plan, rows, median_ms, best_ms):
+    print(f"\n=== {label} ===")
+    print(f"{'table':<6} {'type':<8} {'key':<34} {'rows':>10}  Extra")
+    for step in plan:
+        print(f"{str(step.get('table')):<6} {str(step.get('type')):<8} {str(step.get('key')):<34} "
+              f"{str(step.get('rows')):>10}  {step.get('Extra') or ''}")
+    print(f"result rows: {rows}, median: {median_ms:.2f} ms, best: {best_ms:.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ticket search indexes")
+    parser.add_argument("--trains", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--stops", type=int, default=12)
+    parser.add_argument("--stations", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    bench_db = f"{DB_CONFIG['database']}_bench"
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{bench_db}`")
+    cursor.execute(f"CREATE DATABASE `{bench_db}` DEFAULT CHARACTER SET 'utf8mb4'")
+    cursor.close()
+    conn.close()
+
+    conn = connect(bench_db)
+    cursor = conn.cursor(buffered=True)
+    try:
+        create_tables(cursor)
+        print(f"Populating {args.trains} trains x {args.days} days x {args.stops} stops...")
+        dep_id, arr_id, day = populate(cursor, args.trains, args.days, args.stops, args.stations, args.seed)
+        conn.commit()
+        cursor.execute("ANALYZE TABLE `Stopovers`, `Prices`, `Trains`")
+        cursor.fetchall()
+
+        # before: 原始单列索引 + DATE() 过滤
+        for name in NEW_INDEXES:
+            try:
+                cursor.execute(f"DROP INDEX {name} ON `Stopovers`")
+            except mysql.connector.Error:
+                pass
+        cursor.execute("CREATE INDEX idx_stopovers_station_id ON `Stopovers` (`station_id`)")
+        before_query = SEARCH_QUERY.format(date_filter=BEFORE_FILTER)
+        before_params = (dep_id, arr_id, day)
+        report("before", explain(cursor, before_query, before_params),
+               *timed(cursor, before_query, before_params, args.repeat))
+
+        # after: 迁移 0001 的组合索引 + 范围过滤
+        for stmt in MIGRATIONS[0][2]:
+            cursor.execute(stmt)
+        cursor.execute("ANALYZE TABLE `Stopovers`")
+        cursor.fetchall()
+        after_query = SEARCH_QUERY.format(date_filter=AFTER_FILTER)
+        after_params = (dep_id, arr_id, day, day)
+        report("after", explain(cursor, after_query, after_params),
+               *timed(cursor, after_query, after_params, args.repeat))
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# bench_seat_allocator.py
+#
+# 座位分配器性能与装载率测试（纯内存，不需要数据库）：
+# 对一趟长途列车随机生成订票/退票请求，统计每次分配的耗时，并与“取第一个空闲座位”
+# 的首次适配策略比较在余票计数仍充足时因碎片导致无法分配的请求数。
+#
+# 用法（在项目根目录执行）:
+#   python -m benchmarks.bench_seat_allocator --seats 1000 --stops 24 --requests 100000
+
+import argparse
+import random
+import time
+
+from utils.seat_allocator import SeatAllocator
+
+def first_fit(occupied, mask):
+    """对照组：返回第一个在整段行程上空闲的座位"""
+    for seat in range(1, len(occupied)):
+        if not occupied[seat] & mask:
+            return seat
+    return None
+
+def run(args, best_fit):
+    rng = random.Random(args.seed)
+    segments = args.stops - 1
+    allocator = SeatAllocator(args.seats, segments)
+    occupied = [0] * (args.seats + 1)
+    remaining = [args.seats] * segments  # 与 Stopovers.seats 相同的按区间计数
+    held = []
+    timings = []
+    fragmented = 0
+    sold = 0
+
+    for _ in range(args.requests):
+        if held and rng.random() < args.refund_rate:
+            seat, dep, arr = held.pop(rng.randrange(len(held)))
+            mask = SeatAllocator.segment_mask(dep, arr)
+            if best_fit:
+                allocator.release(seat, dep, arr)
+            occupied[seat] &= ~mask
+            for segment in range(dep - 1, arr - 1):
+                remaining[segment] += 1
+            continue
+
+        dep = rng.randint(1, args.stops - 1)
+        arr = rng.randint(dep + 1, min(args.stops, dep + args.max_trip))
+        if min(remaining[dep - 1:arr - 1]) <= 0:
+            continue  # 按计数已售罄，两种策略都会拒绝
+
+        mask = SeatAllocator.segment_mask(dep, arr)
+        start = time.perf_counter()
+        seat = allocator.allocate(dep, arr) if best_fit else first_fit(occupied, mask)
+        timings.append(time.perf_counter() - start)
+        if seat is None:
+            fragmented += 1
+            continue
+
+        occupied[seat] |= mask
+        for segment in range(dep - 1, arr - 1):
+            remaining[segment] -= 1
+        held.append((seat, dep, arr))
+        sold += 1
+
+    timings.sort()
+    return {
+        'sold': sold,
+        'fragmented': fragmented,
+        'median_us': timings[len(timings) // 2] * 1e6,
+        'p99_us': timings[int(len(timings) * 0.99)] * 1e6,
+        'load': 1 - sum(remaining) / (args.seats * segments),
+        'patterns': len(allocator._groups) if best_fit else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-seat segment allocator")
+    parser.add_argument("--seats", type=int, default=1000)
+    parser.add_argument("--stops", type=int, default=24)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--max-trip", type=int, default=12, help="max stops per trip")
+    parser.add_argument("--refund-rate", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{args.seats} seats, {args.stops} stops, {args.requests} requests")
+    for label, best_fit in (("best fit", True), ("first fit", False)):
+        result = run(args, best_fit)
+        patterns = f", distinct patterns: {result['patterns']}" if result['patterns'] is not None else ""
+        print(f"\n=== {label} ===")
+        print(f"sold: {result['sold']}, rejected by fragmentation: {result['fragmented']}, "
+              f"final load factor: {result['load'] * 100:.1f}%{patterns}")
+        print(f"allocation median: {result['median_us']:.1f} us, p99: {result['p99_us']:.1f} us")
+
+if __name__ == "__main__":
+    main()
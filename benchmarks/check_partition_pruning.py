@@ -0,0 +1,85 @@
+# check_partition_pruning.py
+#
+# 分区裁剪检查：对常用查询执行 EXPLAIN，确认按月分区的表只访问一个分区。
+# 使用 db_config 中配置的数据库（只执行 EXPLAIN，不修改数据），
+# 以 Stopovers 中最早的一趟运行和今天的报表日期作为查询参数。
+#
+# 用法（在项目根目录执行）:
+#   python -m benchmarks.check_partition_pruning
+
+import datetime
+import sys
+
+import mysql.connector
+from db.db_config import DB_CONFIG
+
+def explain(cursor, query, params):
+    """返回 EXPLAIN 结果中每个表访问的分区列表 {表别名: [分区名]}"""
+    cursor.execute("EXPLAIN " + query, params)
+    return {
+        row['table']: (row['partitions'] or '').split(',')
+        for row in cursor.fetchall()
+        if row['table'] and row['partitions'] is not None
+    }
+
+def main():
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute("SELECT train_number, start_date FROM Stopovers ORDER BY start_date LIMIT 1")
+        run = cursor.fetchone()
+        if not run:
+            print("No stopovers found, load sample data first")
+            sys.exit(1)
+        train_number, start_date = run['train_number'], run['start_date']
+        report_date = datetime.date.today()
+
+        checks = [
+            (
+                "route of one run",
+                "SELECT stop_order, seats FROM Stopovers WHERE train_number = %s AND start_date = %s",
+                (train_number, start_date)
+            ),
+            (
+                "seat reservation",
+                "UPDATE Stopovers SET seats = seats - 1 WHERE train_number = %s AND start_date = %s "
+                "AND stop_order >= %s AND stop_order < %s AND seats > 0",
+                (train_number, start_date, 1, 2)
+            ),
+            (
+                "seat allocator load",
+                "SELECT so.seat_number FROM SalesOrders so WHERE so.train_number = %s AND so.start_date = %s "
+                "AND so.seat_number IS NOT NULL AND so.status IN ('Ready', 'Success', 'RefundPending')",
+                (train_number, start_date)
+            ),
+            (
+                "order approval",
+                "UPDATE SalesOrders SET status = 'Success' WHERE order_id = %s AND start_date = %s AND status = 'Ready'",
+                ('0', start_date)
+            ),
+            (
+                "daily sales report",
+                "SELECT op.order_id FROM OrderOperations op WHERE op.operation_time >= %s "
+                "AND op.operation_time < %s + INTERVAL 1 DAY AND op.operation_type = 'Approve'",
+                (report_date, report_date)
+            ),
+        ]
+
+        failed = 0
+        for label, query, params in checks:
+            partitions = explain(cursor, query, params)
+            pruned = bool(partitions) and all(len(names) == 1 for names in partitions.values())
+            failed += not pruned
+            detail = ", ".join(f"{table}: {','.join(names)}" for table, names in partitions.items())
+            print(f"{'PASS' if pruned else 'FAIL'}  {label:<22} {detail or 'table is not partitioned'}")
+
+        if failed:
+            print(f"{failed} queries are not pruned to a single partition")
+            sys.exit(1)
+        print("All checked queries prune to a single partition")
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import threading
+import time
+
+from db import db
+from db.db_config import SYSTEM_SALESPERSON_ID
+from core.booking_queue import booking_queue
+
+class AutoApprovalRules:
+    """自动审批规则，值为None的规则不生效"""
+
+    def __init__(self, min_seats_left=10, max_price=1000, min_customer_orders=0, max_customer_refunds=3):
+        """
+        Args:
+            min_seats_left (int): 订单所经区间的最少余票不低于该值时才自动批准，
+                                  把最后几张票留给人工审核
+            max_price (float): 票价不超过该值时才自动批准
+            min_customer_orders (int): 乘客至少有这么多张已成功的订单（不含本单）
+            max_customer_refunds (int): 乘客已退款和已取消的订单不超过该值
+        """
+        self.min_seats_left = min_seats_left
+        self.max_price = max_price
+        self.min_customer_orders = min_customer_orders
+        self.max_customer_refunds = max_customer_refunds
+
+    def describe(self):
+        """规则说明，写入操作记录的备注"""
+        parts = []
+        if self.min_seats_left is not None:
+            parts.append(f"seats>={self.min_seats_left}")
+        if self.max_price is not None:
+            parts.append(f"price<={self.max_price}")
+        if self.min_customer_orders is not None:
+            parts.append(f"orders>={self.min_customer_orders}")
+        if self.max_customer_refunds is not None:
+            parts.append(f"refunds<={self.max_customer_refunds}")
+        return ", ".join(parts) or "no rules"
+
+
+class AutoApprovalEngine:
+    """订单自动审批线程
+
+    定期从 PendingOrdersView 中按下单时间取出满足全部规则的新订单，
+    以系统乘务员身份经 booking_queue 在各运行的分片中分批批准，
+    每个订单的批准和所依据的规则都写入 OrderOperations。
+    不满足规则的订单和退款申请保持待处理状态，由乘务员人工审核。
+    """
+
+    def __init__(self, rules=None, interval=10, batch_size=100, failed_retry_interval=600):
+        """
+        Args:
+            rules (AutoApprovalRules): 审批规则，为空时使用默认规则
+            interval (int): 两次审批之间的间隔（秒）
+            batch_size (int): 每个事务最多批准的订单数
+            failed_retry_interval (int): 批准失败的订单在这段时间（秒）内不再自动重试
+        """
+        self.rules = rules or AutoApprovalRules()
+        self.interval = interval
+        self.batch_size = batch_size
+        self.failed_retry_interval = failed_retry_interval
+        self.salesperson_id = SYSTEM_SALESPERSON_ID
+        # 订单ID -> 批准失败的时间（time.monotonic）
+        self._failed = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self):
+        """启动后台审批线程（守护线程，不阻止程序退出）"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="auto-approval", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """通知审批线程退出并等待当前批次结束"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def find_eligible(self, limit, exclude=()):
+        """按下单时间顺序查询满足规则的待处理新订单
+
+        规则在 SQL 中过滤，不满足规则的订单不会占用批次名额。
+
+        Args:
+            limit (int): 最多返回的订单数
+            exclude (iterable): 跳过的订单ID（最近批准失败的订单）
+
+        Returns:
+            list: 订单ID列表
+        """
+        conditions = []
+        params = []
+        rules = self.rules
+        if rules.max_price is not None:
+            conditions.append("v.price <= %s")
+            params.append(rules.max_price)
+        if rules.min_seats_left is not None:
+            conditions.append("""
+                (SELECT MIN(s.seats) FROM Stopovers s
+                 WHERE s.train_number = so.train_number
+                 AND s.start_date = so.start_date
+                 AND s.stop_order >= so.dep_stop_order
+                 AND s.stop_order < so.arr_stop_order) >= %s
+            """)
+            params.append(rules.min_seats_left)
+        if rules.min_customer_orders is not None:
+            conditions.append("""
+                (SELECT COUNT(*) FROM SalesOrders h
+                 WHERE h.customer_id = so.customer_id AND h.status = 'Success') >= %s
+            """)
+            params.append(rules.min_customer_orders)
+        if rules.max_customer_refunds is not None:
+            conditions.append("""
+                (SELECT COUNT(*) FROM SalesOrders h
+                 WHERE h.customer_id = so.customer_id AND h.status IN ('Refunded', 'Cancelled')) <= %s
+            """)
+            params.append(rules.max_customer_refunds)
+        exclude = list(exclude)
+        if exclude:
+            conditions.append(f"v.order_id NOT IN ({', '.join(['%s'] * len(exclude))})")
+            params.extend(exclude)
+
+        query = f"""
+        SELECT v.order_id
+        FROM PendingOrdersView v
+        JOIN SalesOrders so ON so.order_id = v.order_id
+        WHERE v.status = 'Ready'
+        AND so.dep_stop_order IS NOT NULL
+        {''.join(f' AND {condition}' for condition in conditions)}
+        ORDER BY v.operation_time
+        LIMIT %s
+        """
+        rows = db.execute_pooled_query(query, tuple(params) + (limit,), fetch_all=True)
+        if rows is None:
+            raise RuntimeError("Failed to query pending orders")
+        return [row['order_id'] for row in rows]
+
+    def run_once(self):
+        """分批批准所有满足规则的订单
+
+        整批失败（如其中一个订单余票不足）时改为逐个批准，
+        仍然失败的订单在 failed_retry_interval 秒内不再自动处理，
+        避免同一批订单反复失败而挡住后面的订单。
+
+        Returns:
+            int: 实际批准的订单数
+        """
+        remarks = f"Auto-approved ({self.rules.describe()})"
+        now = time.monotonic()
+        self._failed = {
+            order_id: failed_at for order_id, failed_at in self._failed.items()
+            if now - failed_at < self.failed_retry_interval
+        }
+        approved = 0
+        while not self._stop_event.is_set():
+            order_ids = self.find_eligible(self.batch_size, self._failed)
+            if not order_ids:
+                break
+            processed = []
+            success, message = booking_queue.process_orders(
+                order_ids, True, self.salesperson_id, remarks=remarks, processed=processed
+            ).result()
+            if not success:
+                # 整批已回滚，逐个重试
+                for order_id in order_ids:
+                    if self._stop_event.is_set():
+                        break
+                    success, message = booking_queue.process_orders(
+                        [order_id], True, self.salesperson_id, remarks=remarks, processed=processed
+                    ).result()
+                    if not success:
+                        print(f"Error auto-approving order {order_id}: {message}")
+                        self._failed[order_id] = time.monotonic()
+            approved += len(processed)
+            if len(order_ids) < self.batch_size:
+                break
+        return approved
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error in automatic order approval: {e}")
+
+
+# 全局自动审批引擎（默认不启动，由管理员在员工界面开启）
+auto_approval = AutoApprovalEngine()
@@ -0,0 +1,219 @@
+import collections
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+
+from db import db
+from core.services import OrderService
+
+class _Shard:
+    """一个工作线程及其请求队列和统计数据"""
+
+    def __init__(self, index, sample_size):
+        self.index = index
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.total_service = 0.0
+        self.max_wait = 0.0
+        self.max_service = 0.0
+        self.latencies = collections.deque(maxlen=sample_size)  # 最近请求的总耗时（排队+处理）
+
+    def record(self, wait, service, success):
+        with self.lock:
+            if success:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.total_wait += wait
+            self.total_service += service
+            self.max_wait = max(self.max_wait, wait)
+            self.max_service = max(self.max_service, service)
+            self.latencies.append(wait + service)
+
+    def stats(self):
+        with self.lock:
+            count = self.completed + self.failed
+            latencies = sorted(self.latencies)
+            return {
+                'shard': self.index,
+                'depth': self.queue.qsize(),
+                'completed': self.completed,
+                'failed': self.failed,
+                'avg_wait_ms': self.total_wait / count * 1000 if count else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+                'avg_service_ms': self.total_service / count * 1000 if count else 0.0,
+                'max_service_ms': self.max_service * 1000,
+                'p95_latency_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+            }
+
+
+class BookingQueue:
+    """按列车运行分片的订票请求队列
+
+    下单、审批和退款申请按 (train_number, start_date) 分到固定的工作线程，
+    同一运行的请求在同一个线程中串行执行，不再在 Stopovers 的同一批行上互相等待行锁；
+    不同运行分布在不同线程上并行处理。请求以 Future 返回结果，
+    每个分片记录队列深度、排队时间、处理时间和最近请求的 p95 延迟。
+    """
+
+    def __init__(self, workers=4, sample_size=1000):
+        """
+        Args:
+            workers (int): 工作线程（分片）数，不应超过连接池大小
+            sample_size (int): 每个分片用于计算 p95 延迟的最近请求数
+        """
+        self._shards = [_Shard(i, sample_size) for i in range(workers)]
+        self._lock = threading.Lock()
+        self._running = False
+
+    def start(self):
+        """启动工作线程（守护线程，不阻止程序退出）"""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for shard in self._shards:
+                shard.thread = threading.Thread(
+                    target=self._run, args=(shard,), name=f"booking-queue-{shard.index}", daemon=True
+                )
+                shard.thread.start()
+
+    def stop(self, timeout=5):
+        """处理完已提交的请求后停止工作线程"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            for shard in self._shards:
+                shard.queue.put(None)
+        for shard in self._shards:
+            shard.thread.join(timeout)
+            shard.thread = None
+
+    def shard_for(self, train_number, start_date):
+        """运行对应的分片编号"""
+        key = f"{train_number}|{start_date}".encode()
+        return zlib.crc32(key) % len(self._shards)
+
+    def submit(self, train_number, start_date, func, *args, **kwargs):
+        """将请求提交到运行对应的分片，首次提交时自动启动工作线程
+
+        Returns:
+            Future: func(*args, **kwargs) 的结果
+        """
+        self.start()
+        future = Future()
+        shard = self._shards[self.shard_for(train_number, start_date)]
+        shard.queue.put((future, func, args, kwargs, time.perf_counter()))
+        return future
+
+    def create_order(self, train_number, start_date, *args, **kwargs):
+        """排队执行 OrderService.create_order"""
+        return self.submit(
+            train_number, start_date, OrderService.create_order, train_number, start_date, *args, **kwargs
+        )
+
+    def create_group_order(self, train_number, start_date, *args, **kwargs):
+        """排队执行 OrderService.create_group_order"""
+        return self.submit(
+            train_number, start_date, OrderService.create_group_order, train_number, start_date, *args, **kwargs
+        )
+
+    def process_order(self, order_id, approve=True, salesperson_id=None):
+        """排队执行 OrderService.process_order"""
+        return self._submit_for_order(order_id, OrderService.process_order, order_id, approve, salesperson_id)
+
+    def process_orders(self, order_ids, approve=True, salesperson_id=None, remarks=None, processed=None):
+        """排队执行 OrderService.process_orders
+
+        整批订单始终在一个事务中处理（全部成功或全部回滚），不按运行拆分。
+        只涉及一个运行时在该运行的分片中执行；跨多个运行时在其中最小的运行的分片中执行，
+        与其他运行上的请求之间由事务按固定顺序加锁保证正确。
+
+        Returns:
+            Future: (success, message)
+        """
+        order_ids = list(dict.fromkeys(order_ids))
+        rows = None
+        if order_ids:
+            placeholders = ", ".join(["%s"] * len(order_ids))
+            rows = db.execute_pooled_query(
+                f"SELECT DISTINCT train_number, start_date FROM SalesOrders WHERE order_id IN ({placeholders})",
+                tuple(order_ids), fetch_all=True
+            )
+        if not rows:
+            # 订单都不存在时直接执行，由 process_orders 返回错误信息
+            return self._completed(
+                OrderService.process_orders, order_ids, approve, salesperson_id,
+                remarks=remarks, processed=processed
+            )
+        train_number, start_date = min((row['train_number'], str(row['start_date'])) for row in rows)
+        return self.submit(
+            train_number, start_date, OrderService.process_orders, order_ids, approve,
+            salesperson_id, remarks=remarks, processed=processed
+        )
+
+    def request_refund(self, order_id, idempotency_key=None):
+        """排队执行 OrderService.request_refund"""
+        return self._submit_for_order(
+            order_id, OrderService.request_refund, order_id, idempotency_key=idempotency_key
+        )
+
+    def stats(self):
+        """各分片的队列深度和延迟统计
+
+        Returns:
+            list: 每个分片一个字典，包含 shard, depth, completed, failed,
+                  avg_wait_ms, max_wait_ms, avg_service_ms, max_service_ms, p95_latency_ms
+        """
+        return [shard.stats() for shard in self._shards]
+
+    def _submit_for_order(self, order_id, func, *args, **kwargs):
+        # 按订单所属的运行分片；订单不存在时直接执行，由 func 返回错误信息
+        run = db.execute_pooled_query(
+            "SELECT train_number, start_date FROM SalesOrders WHERE order_id = %s",
+            (order_id,), fetch_one=True
+        )
+        if not run:
+            return self._completed(func, *args, **kwargs)
+        return self.submit(run['train_number'], run['start_date'], func, *args, **kwargs)
+
+    @staticmethod
+    def _completed(func, *args, **kwargs):
+        # 在调用线程中直接执行，返回已完成的 Future
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _run(self, shard):
+        while True:
+            item = shard.queue.get()
+            if item is None:
+                break
+            future, func, args, kwargs, submitted = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                shard.record(started - submitted, time.perf_counter() - started, False)
+                future.set_exception(e)
+                continue
+            # OrderService 以 (success, message) 返回业务失败
+            success = not (isinstance(result, tuple) and result and result[0] is False)
+            shard.record(started - submitted, time.perf_counter() - started, success)
+            future.set_result(result)
+
+
+# 全局订票队列
+booking_queue = BookingQueue()
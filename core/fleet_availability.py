@@ -0,0 +1,144 @@
+# fleet_availability.py
+
+import datetime
+import threading
+
+import numpy as np
+
+from db import db
+
+class FleetAvailabilityMatrix:
+    """全线余票矩阵
+
+    以 NumPy 矩阵保存所有列车运行（行）在各区间（列）上的余票，
+    区间 k 表示从第 k 站出发到第 k+1 站，对应 Stopovers 中 stop_order = k 的 seats。
+    各运行的区间数不同，不存在的区间由 valid 掩码标记。
+    """
+
+    def __init__(self, runs, total_seats, seats, valid):
+        """
+        Args:
+            runs (list): (train_number, start_date) 列表，与矩阵行一一对应
+            total_seats (np.ndarray): 每个运行的总座位数，形状 (n_runs,)
+            seats (np.ndarray): 余票矩阵，形状 (n_runs, max_segments)
+            valid (np.ndarray): 有效区间掩码，形状同 seats
+        """
+        self.runs = runs
+        self.run_index = {run: i for i, run in enumerate(runs)}
+        self.total_seats = total_seats
+        self.seats = seats
+        self.valid = valid
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls):
+        """一次批量读取 Stopovers 构建矩阵"""
+        query = """
+        SELECT
+            s.train_number,
+            s.start_date,
+            s.stop_order,
+            s.seats,
+            t.total_seats
+        FROM Stopovers s
+        JOIN Trains t ON s.train_number = t.train_number
+        ORDER BY s.train_number, s.start_date, s.stop_order
+        """
+        rows = db.execute_query(query, fetch_all=True)
+        if rows is None:
+            raise RuntimeError("Failed to load Stopovers")
+        return cls.from_rows(rows)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """根据按 (train_number, start_date, stop_order) 排序的经停记录构建矩阵"""
+        runs = []
+        run_stops = []
+        totals = []
+        for row in rows:
+            run = (row['train_number'], row['start_date'])
+            if not runs or runs[-1] != run:
+                runs.append(run)
+                run_stops.append([])
+                totals.append(row['total_seats'])
+            run_stops[-1].append((row['stop_order'], row['seats']))
+
+        # 终点站没有出发区间，因此区间数为站数-1
+        max_segments = max((max(order for order, _ in stops) - 1 for stops in run_stops), default=0)
+        total_seats = np.array(totals, dtype=np.int32)
+        seats = np.zeros((len(runs), max(max_segments, 0)), dtype=np.int32)
+        valid = np.zeros(seats.shape, dtype=bool)
+
+        for i, stops in enumerate(run_stops):
+            last_order = max(order for order, _ in stops)
+            for order, seat_count in stops:
+                if order < last_order:
+                    seats[i, order - 1] = seat_count
+                    valid[i, order - 1] = True
+
+        return cls(runs, total_seats, seats, valid)
+
+    def min_seats(self):
+        """每个运行在所有区间上的最少余票，形状 (n_runs,)"""
+        masked = np.where(self.valid, self.seats, np.iinfo(np.int32).max)
+        result = masked.min(axis=1) if masked.shape[1] else np.zeros(len(self.runs), dtype=np.int32)
+        # 没有有效区间的运行（单站数据）视为满座可售
+        return np.where(self.valid.any(axis=1), result, self.total_seats)
+
+    def runs_below(self, threshold):
+        """任一区间余票少于 threshold 的运行
+
+        Returns:
+            list: (train_number, start_date, min_seats) 列表
+        """
+        min_seats = self.min_seats()
+        indices = np.nonzero(min_seats < threshold)[0]
+        return [(self.runs[i][0], self.runs[i][1], int(min_seats[i])) for i in indices]
+
+    def load_factor_by_segment(self):
+        """各运行各区间的上座率，无效区间为 NaN，形状同 seats"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            factor = 1.0 - self.seats / self.total_seats[:, None].astype(np.float64)
+        return np.where(self.valid, factor, np.nan)
+
+    def load_summary(self):
+        """每个运行的区间数、最少余票、最高和平均上座率
+
+        Returns:
+            list: (train_number, start_date, segments, min_seats, max_load, avg_load) 列表
+        """
+        factor = self.load_factor_by_segment()
+        segments = self.valid.sum(axis=1)
+        min_seats = self.min_seats()
+        has_segments = segments > 0
+        max_load = np.full(len(self.runs), np.nan)
+        avg_load = np.full(len(self.runs), np.nan)
+        if has_segments.any():
+            max_load[has_segments] = np.nanmax(factor[has_segments], axis=1)
+            avg_load[has_segments] = np.nanmean(factor[has_segments], axis=1)
+        return [
+            (run[0], run[1], int(segments[i]), int(min_seats[i]), float(max_load[i]), float(avg_load[i]))
+            for i, run in enumerate(self.runs)
+        ]
+
+    def apply_booking(self, train_number, start_date, dep_stop_order, arr_stop_order, delta=-1):
+        """增量更新一次订票/退票对余票的影响
+
+        Args:
+            train_number (str): 列车号
+            start_date (date|str): 发车日期
+            dep_stop_order (int): 出发站顺序
+            arr_stop_order (int): 到达站顺序
+            delta (int): 余票变化量，订票为 -1，退票为 +1
+
+        Returns:
+            bool: 矩阵中是否存在该运行
+        """
+        if isinstance(start_date, str):
+            start_date = datetime.date.fromisoformat(start_date)
+        row = self.run_index.get((train_number, start_date))
+        if row is None:
+            return False
+        with self._lock:
+            self.seats[row, dep_stop_order - 1:arr_stop_order - 1] += delta
+        return True
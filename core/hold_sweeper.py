@@ -0,0 +1,55 @@
+import threading
+
+from core.services import OrderService
+
+class SeatHoldSweeper:
+    """座位预留清理线程，定期分批释放已过期的座位预留"""
+
+    def __init__(self, interval=30, batch_size=500):
+        """
+        Args:
+            interval (int): 两次清理之间的间隔（秒）
+            batch_size (int): 每个事务最多释放的预留数
+        """
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台清理线程（守护线程，不阻止程序退出）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="seat-hold-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """通知清理线程退出并等待当前批次结束"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def sweep(self):
+        """释放所有已过期的预留，每批一个短事务，避免长时间持有行锁
+
+        Returns:
+            int: 释放的预留总数
+        """
+        total = 0
+        while not self._stop_event.is_set():
+            released = OrderService.release_expired_holds(self.batch_size)
+            total += released
+            if released < self.batch_size:
+                break
+        return total
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                released = self.sweep()
+                if released:
+                    print(f"Released {released} expired seat holds")
+            except Exception as e:
+                print(f"Error releasing expired seat holds: {e}")
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import Label, Entry, Button
 from core.services import OrderService
+from core.booking_queue import booking_queue
 
 class OrderManagementInterface:
     """订单管理界面类，处理订单查询和操作"""
@@ -27,10 +28,14 @@ class OrderManagementInterface:
         self.display_table(
             lambda: OrderService.get_orders_by_passenger(name, id_card),
             ["order_id", "train_number", "train_type", "From", "To", 
-            "Price", "customer_name", "customer_phone", "operation_type", 
+            "Seat", "Price", "customer_name", "customer_phone", "operation_type", 
             "operation_time", "status"],
             is_order_view=True,
             window_size="1200x400",
+            get_more_func=lambda last_row: OrderService.get_orders_by_passenger(
+                name, id_card, after=(last_row[10], last_row[0])
+            ),
+            page_size=OrderService.ORDER_HISTORY_PAGE_SIZE,
         )
 
     
@@ -48,10 +53,17 @@ class OrderManagementInterface:
     def request_refund(self, order_id, refresh_callback):
         """申请退款"""
         if self.utils.show_confirmation("Confirm Refund", "Are you sure you want to request a refund for this order?"):
-            success, message = OrderService.request_refund(order_id)
-            if success:
-                self.utils.show_message("Success", message)
-                if refresh_callback:
-                    refresh_callback()  # 刷新订单列表
-            else:
-                self.utils.show_error("Error", message)
\ No newline at end of file
+            self.utils.when_done(
+                booking_queue.request_refund(order_id),
+                lambda result: self._on_refund_requested(result, refresh_callback)
+            )
+
+    def _on_refund_requested(self, result, refresh_callback):
+        """退款申请完成后在主线程中显示结果并刷新订单列表"""
+        success, message = result
+        if success:
+            self.utils.show_message("Success", message)
+            if refresh_callback:
+                refresh_callback()  # 刷新订单列表
+        else:
+            self.utils.show_error("Error", message)
\ No newline at end of file
@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import Label, Entry, Button
-from core.services import TrainService
+import datetime
+from core.services import TrainService, StationService
 
 class RouteViewerInterface:
     """列车路线查看界面类"""
@@ -62,4 +63,55 @@ class RouteViewerInterface:
             command=query_route).pack(pady=10)
         
         Button(self.parent, text="Back to Main Menu", 
-            command=self.show_main_menu).pack(pady=20)
\ No newline at end of file
+            command=self.show_main_menu).pack(pady=20)
+
+    def show_station_board_frame(self):
+        """显示车站发车/到达时刻表查询界面"""
+        self.utils.clear_frame(self.parent)
+        Label(self.parent, text="Station Board", font=("Arial", 14)).pack(pady=10)
+
+        # 车站输入
+        Label(self.parent, text="Station:").pack()
+        station_entry = Entry(self.parent)
+        station_entry.insert(0, "南京")
+        station_entry.pack(pady=5)
+
+        # 时间窗口
+        now = datetime.datetime.now()
+        Label(self.parent, text="From (YYYY-MM-DD HH:MM):").pack()
+        start_entry = Entry(self.parent)
+        start_entry.insert(0, now.strftime('%Y-%m-%d %H:%M'))
+        start_entry.pack(pady=5)
+
+        Label(self.parent, text="To (YYYY-MM-DD HH:MM):").pack()
+        end_entry = Entry(self.parent)
+        end_entry.insert(0, (now + datetime.timedelta(hours=4)).strftime('%Y-%m-%d %H:%M'))
+        end_entry.pack(pady=5)
+
+        def show_board(departures):
+            station = station_entry.get().strip()
+            window_start = start_entry.get().strip()
+            window_end = end_entry.get().strip()
+
+            if not station:
+                self.utils.show_error("Error", "Please enter station")
+                return
+
+            board_func = StationService.departure_board if departures else StationService.arrival_board
+            adjacent = "Next Station" if departures else "Previous Station"
+            terminal = "Terminal" if departures else "Origin"
+            self.display_table(
+                lambda: board_func(station, window_start, window_end),
+                ["Train", "Start_date", "Type", "Arrival", "Departure",
+                adjacent, f"{adjacent} Time", terminal, "Seats"],
+                window_size="1000x400",
+            )
+
+        Button(self.parent, text="Departures", 
+            command=lambda: show_board(True)).pack(pady=5)
+
+        Button(self.parent, text="Arrivals", 
+            command=lambda: show_board(False)).pack(pady=5)
+
+        Button(self.parent, text="Back to Main Menu", 
+            command=self.show_main_menu).pack(pady=20)
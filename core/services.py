@@ -2,6 +2,10 @@ from db import db  # Import the singleton database instance
 from db.models import Train, Station, Price
 from mysql.connector import Error
 from utils.hash_utils import hash_password
+from utils.search_cache import search_cache
+from utils.station_index import station_index, PINYIN_AVAILABLE
+from utils.seat_allocator import SeatAllocator, seat_allocators
+from utils.id_generator import order_id_generator
 
 class TrainService:
     @staticmethod
@@ -156,9 +160,186 @@ class StationService:
             ])
         return station_data, None
 
+    @staticmethod
+    def get_station_index():
+        """获取车站前缀索引，首次使用或失效后从数据库加载"""
+        if not station_index.loaded:
+            stations = Station.find_all()
+            if stations is not None:  # None 表示查询出错，保持未加载状态以便重试
+                station_index.build(stations)
+        return station_index
+
+    @staticmethod
+    def suggest_stations(prefix, limit=10):
+        """按站名、站点代码或拼音首字母前缀返回候选站名"""
+        return [
+            s['station_name']
+            for s in StationService.get_station_index().suggest(prefix, limit)
+        ]
+
+    @staticmethod
+    def resolve_station(text):
+        """将站名/代码/拼音首字母解析为车站记录，无法解析时返回None（不访问数据库）"""
+        return StationService.get_station_index().resolve(text)
+
+    @staticmethod
+    def pinyin_search_available():
+        """是否支持按拼音查询车站（需要安装 pypinyin）"""
+        return PINYIN_AVAILABLE
+
+    @staticmethod
+    def departure_board(station, window_start=None, window_end=None, limit=100):
+        """获取车站发车时刻表
+
+        一次按 (station_id, departure_time) 索引的范围查询，返回时间窗口内从该站
+        出发的列车、下一停靠站、终点站以及该站出发区间的余票。
+
+        Args:
+            station (str): 站名、站点代码或拼音首字母
+            window_start (str|datetime, optional): 窗口开始时间，默认为当前时间
+            window_end (str|datetime, optional): 窗口结束时间，默认为开始时间后4小时
+            limit (int): 最多返回的车次数
+
+        Returns:
+            tuple: (data, error_message)
+                data: [列车号, 发车日期, 类型, 到达时间, 出发时间, 下一站, 下一站到达时间, 终点站, 余票]
+        """
+        return StationService._station_board(station, window_start, window_end, limit, departures=True)
+
+    @staticmethod
+    def arrival_board(station, window_start=None, window_end=None, limit=100):
+        """获取车站到达时刻表
+
+        与 departure_board 相同，但按 (station_id, arrival_time) 索引查询到达该站的列车，
+        返回上一停靠站、始发站以及到达该站区间的余票。
+
+        Returns:
+            tuple: (data, error_message)
+                data: [列车号, 发车日期, 类型, 到达时间, 出发时间, 上一站, 上一站出发时间, 始发站, 余票]
+        """
+        return StationService._station_board(station, window_start, window_end, limit, departures=False)
+
+    @staticmethod
+    def _station_board(station, window_start, window_end, limit, departures):
+        import datetime
+
+        station_row = StationService.resolve_station(station)
+        if not station_row:
+            return [], "Station not found."
+
+        try:
+            start = StationService._parse_board_time(window_start) or datetime.datetime.now()
+            end = StationService._parse_board_time(window_end) or start + datetime.timedelta(hours=4)
+        except ValueError:
+            return [], "Invalid time format. Please use YYYY-MM-DD HH:MM"
+        if end <= start:
+            return [], "Window end must be after window start."
+
+        if departures:
+            # 下一站: stop_order + 1；终点站: 列车的到达站
+            time_column = "s.departure_time"
+            adjacent_order = "s.stop_order + 1"
+            adjacent_time = "adj.arrival_time"
+            terminal_column = "t.arrival_station_id"
+            seats_expr = "s.seats"
+        else:
+            # 上一站: stop_order - 1；始发站: 列车的出发站；余票取进站区间
+            time_column = "s.arrival_time"
+            adjacent_order = "s.stop_order - 1"
+            adjacent_time = "adj.departure_time"
+            terminal_column = "t.departure_station_id"
+            seats_expr = "adj.seats"
+
+        query = f"""
+        SELECT 
+            s.train_number,
+            s.start_date,
+            t.train_type,
+            s.arrival_time,
+            s.departure_time,
+            adj_st.station_name AS adjacent_station,
+            {adjacent_time} AS adjacent_time,
+            term.station_name AS terminal_station,
+            {seats_expr} AS remaining_seats
+        FROM 
+            Stopovers s
+            JOIN Trains t ON s.train_number = t.train_number
+            JOIN Stations term ON term.station_id = {terminal_column}
+            LEFT JOIN Stopovers adj ON adj.train_number = s.train_number
+                AND adj.start_date = s.start_date
+                AND adj.stop_order = {adjacent_order}
+            LEFT JOIN Stations adj_st ON adj_st.station_id = adj.station_id
+        WHERE 
+            s.station_id = %s
+            AND {time_column} >= %s
+            AND {time_column} < %s
+        ORDER BY 
+            {time_column}
+        LIMIT %s
+        """
+        rows = db.execute_query(
+            query, (station_row['station_id'], start, end, int(limit)), fetch_all=True
+        )
+
+        if rows is None:
+            return [], "Error querying station board"
+        if not rows:
+            return [], f"No trains at {station_row['station_name']} in the selected window"
+
+        def fmt(value):
+            return value.strftime('%Y-%m-%d %H:%M') if value else '-'
+
+        board = []
+        for row in rows:
+            board.append([
+                row['train_number'],
+                row['start_date'].strftime('%Y-%m-%d'),
+                row['train_type'],
+                fmt(row['arrival_time']),
+                fmt(row['departure_time']),
+                row['adjacent_station'] or '-',
+                fmt(row['adjacent_time']),
+                row['terminal_station'],
+                row['remaining_seats'] if row['remaining_seats'] is not None else '-'
+            ])
+        return board, None
+
+    @staticmethod
+    def _parse_board_time(value):
+        """解析时刻表窗口时间，支持 datetime 或 'YYYY-MM-DD HH:MM' 字符串"""
+        import datetime
+
+        if not value:
+            return None
+        if isinstance(value, datetime.datetime):
+            return value
+        for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+            try:
+                return datetime.datetime.strptime(value.strip(), fmt)
+            except ValueError:
+                continue
+        raise ValueError(value)
+
 class TicketService:
+    # 排序方式：名称 -> (SQL排序表达式, 内存排序键)
+    # 内存排序键作用于 _format_route 生成的行：[3]出发时间 [5]到达时间 [6]票价 [7]余票
+    SORT_MODES = {
+        'departure': ("od.departure_time", lambda row: row[3]),
+        'arrival': ("od.arrival_time, od.departure_time", lambda row: (row[5], row[3])),
+        'duration': (
+            "TIMESTAMPDIFF(SECOND, od.departure_time, od.arrival_time), od.departure_time",
+            lambda row: (TicketService._duration_seconds(row), row[3])
+        ),
+        'price': ("od.price, od.departure_time", lambda row: (row[6], row[3])),
+        'seats': ("od.min_seats DESC, od.departure_time", lambda row: (-row[7], row[3])),
+    }
+
+    # 不指定日期的并行查询：按出发时间范围划分的最大分区数（每个分区占用一个池连接）
+    SEARCH_PARTITIONS = 4
+
     @staticmethod
-    def search_available_tickets(dep_station_name, arr_station_name, departure_date=None):
+    def search_available_tickets(dep_station_name, arr_station_name, departure_date=None,
+                                 sort_by='departure', limit=None, parallel=False):
         """
         查询所有经过指定起点和终点站点的列车信息，按列车和发车日期分组
 
@@ -166,93 +347,518 @@ class TicketService:
             dep_station_name: 起点站名
             arr_station_name: 终点站名
             departure_date: 可选，指定出发日期 (格式: YYYY-MM-DD)
+            sort_by: 排序方式，见 SORT_MODES (departure/arrival/duration/price/seats)
+            limit: 可选，只返回排名前 limit 的列车
+            parallel: 未指定日期时，按日期范围分区并在连接池上并行查询
 
         返回:
             包含符合条件的列车信息的列表，以及错误信息(如果有)
         """
-        # Step 1: 验证车站是否存在
-        dep_station = Station.find_one({'station_name': dep_station_name})
-        arr_station = Station.find_one({'station_name': arr_station_name})
+        if sort_by not in TicketService.SORT_MODES:
+            return [], f"Unknown sort mode: {sort_by}"
+        ranked = sort_by != 'departure' or limit is not None
+
+        # Step 1: 通过内存索引验证车站是否存在，无效站名不会访问数据库
+        dep_station = StationService.resolve_station(dep_station_name)
+        arr_station = StationService.resolve_station(arr_station_name)
         if not dep_station or not arr_station:
             return [], "Departure or arrival station not found."
+        dep_station_name = dep_station['station_name']
+        arr_station_name = arr_station['station_name']
+
+        # Step 2: 查询缓存
+        cache_key = (dep_station_name, arr_station_name, departure_date or None)
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            return TicketService._rank_rows(cached[0], sort_by, limit), cached[1]
+        cache_token = search_cache.begin()
         
-        # Step 2: 构建日期过滤条件
+        # Step 3: 构建日期过滤条件
         date_filter = ""
         params = []
         if departure_date:
-            date_filter = "AND DATE(s1.departure_time) = %s"
-            params.append(departure_date)
+            # 使用时间范围而非 DATE() 函数，以便使用索引
+            date_filter = "AND od.departure_time >= %s AND od.departure_time < %s + INTERVAL 1 DAY"
+            params.extend([departure_date, departure_date])
         
-        # Step 3: 查询所有经过起点站和终点站的列车，并获取价格信息
+        # Step 4: 查询所有经过起点站和终点站的列车，并获取价格信息
+        # 排名查询将排序和 LIMIT 下推到 SQL，结果不完整因此不写入缓存
+        if parallel and not departure_date:
+            train_results = TicketService._query_routes_parallel(
+                dep_station.get('station_id'), arr_station.get('station_id'),
+                sort_by=sort_by, limit=limit
+            )
+        else:
+            train_results = TicketService._query_routes(
+                dep_station.get('station_id'), arr_station.get('station_id'),
+                date_filter, params,
+                order_by=TicketService.SORT_MODES[sort_by][0], limit=limit
+            )
+    
+        if not train_results:
+            error = "No trains found passing through both stations in the correct order."
+            if train_results is not None and not ranked:  # None 表示查询出错，不缓存
+                search_cache.put(cache_key, ([], error), [], cache_token)
+            return [], error
+    
+        # Step 5: 构建返回结果
+        train_data = [
+            TicketService._format_route(train, dep_station_name, arr_station_name)
+            for train in train_results
+        ]
+        if ranked:
+            return train_data, None
+
+        search_cache.put(
+            cache_key, (train_data, None),
+            [(train[0], train[1]) for train in train_data], cache_token
+        )
+        return list(train_data), None
+
+    @staticmethod
+    def search_many(queries):
+        """
+        批量查询多组起止站和日期的余票信息
+
+        与逐个调用 search_available_tickets 不同，车站通过内存索引解析，所有未命中缓存的
+        请求共享一次 OdAvailability 扫描，再在内存中按请求分桶。
+
+        参数:
+            queries: [(起点站名, 终点站名, 出发日期或None), ...]
+
+        返回:
+            dict: {请求元组: (列车信息列表, 错误信息)}，列表格式与 search_available_tickets 相同
+        """
+        import datetime
+
+        results = {}
+        pending = {}  # cache_key -> [原始请求元组]
+        for query in queries:
+            # 车站通过内存索引解析，缓存键使用规范站名
+            dep_station = StationService.resolve_station(query[0])
+            arr_station = StationService.resolve_station(query[1])
+            if not dep_station or not arr_station:
+                results[query] = ([], "Departure or arrival station not found.")
+                continue
+            departure_date = query[2] if len(query) > 2 else None
+            cache_key = (dep_station['station_name'], arr_station['station_name'], departure_date or None)
+            cached = search_cache.get(cache_key)
+            if cached is not None:
+                results[query] = (list(cached[0]), cached[1])
+            else:
+                pending.setdefault(cache_key, []).append(query)
+
+        if not pending:
+            return results
+        cache_token = search_cache.begin()
+
+        # Step 1: 按起止站合并日期范围，构建一次扫描的过滤条件
+        pair_ranges = {}  # (dep_id, arr_id) -> [最早日期, 最晚日期]，None 表示不限日期
+        requests = []
+        for cache_key in pending:
+            dep_id = StationService.resolve_station(cache_key[0])['station_id']
+            arr_id = StationService.resolve_station(cache_key[1])['station_id']
+
+            day = None
+            if cache_key[2]:
+                try:
+                    day = datetime.datetime.strptime(cache_key[2], '%Y-%m-%d').date()
+                except ValueError:
+                    for query in pending[cache_key]:
+                        results[query] = ([], "Invalid date format. Please use YYYY-MM-DD format")
+                    continue
+
+            pair = (dep_id, arr_id)
+            if day is None:
+                pair_ranges[pair] = None
+            elif pair not in pair_ranges:
+                pair_ranges[pair] = [day, day]
+            elif pair_ranges[pair] is not None:
+                pair_ranges[pair] = [min(pair_ranges[pair][0], day), max(pair_ranges[pair][1], day)]
+            requests.append((cache_key, pair, day))
+
+        if not requests:
+            return results
+
+        conditions = []
+        params = []
+        for (dep_id, arr_id), date_range in pair_ranges.items():
+            if date_range is None:
+                conditions.append("(od.departure_station_id = %s AND od.arrival_station_id = %s)")
+                params.extend([dep_id, arr_id])
+            else:
+                conditions.append(
+                    "(od.departure_station_id = %s AND od.arrival_station_id = %s"
+                    " AND od.departure_time >= %s AND od.departure_time < %s)"
+                )
+                params.extend([dep_id, arr_id, date_range[0],
+                               date_range[1] + datetime.timedelta(days=1)])
+
+        # Step 2: 一次扫描取回所有请求涉及的行
+        batch_query = """
+        SELECT 
+            od.departure_station_id,
+            od.arrival_station_id,
+            od.train_number,
+            od.start_date,
+            od.departure_time,
+            od.arrival_time,
+            od.min_seats,
+            t.train_type,
+            od.price
+        FROM 
+            OdAvailability od
+            JOIN Trains t ON od.train_number = t.train_number
+        WHERE 
+            """ + " OR ".join(conditions) + """
+        ORDER BY 
+            od.departure_time
+        """
+        rows = db.execute_query(batch_query, tuple(params), fetch_all=True)
+        if rows is None:
+            for cache_key, _, _ in requests:
+                for query in pending[cache_key]:
+                    results[query] = ([], "Error querying available tickets.")
+            return results
+
+        by_pair = {}
+        for row in rows:
+            by_pair.setdefault((row['departure_station_id'], row['arrival_station_id']), []).append(row)
+
+        # Step 3: 按请求分桶并写入缓存
+        for cache_key, pair, day in requests:
+            matched = [
+                row for row in by_pair.get(pair, [])
+                if day is None or (row['departure_time'] and row['departure_time'].date() == day)
+            ]
+            if matched:
+                train_data = [
+                    TicketService._format_route(row, cache_key[0], cache_key[1])
+                    for row in matched
+                ]
+                result = (train_data, None)
+            else:
+                result = ([], "No trains found passing through both stations in the correct order.")
+
+            search_cache.put(cache_key, result, [(train[0], train[1]) for train in result[0]], cache_token)
+            for query in pending[cache_key]:
+                results[query] = (list(result[0]), result[1])
+
+        return results
+
+    @staticmethod
+    def search_ranked(dep_station_name, arr_station_name, departure_dates, sort_by='departure', limit=10):
+        """
+        在多个出发日期中按指定方式查询排名前 limit 的列车
+
+        各日期通过 search_many 一次取回（并利用缓存），每个日期先取前 limit 名，
+        再用堆归并得到全局前 limit 名。
+
+        参数:
+            dep_station_name: 起点站名
+            arr_station_name: 终点站名
+            departure_dates: 出发日期列表 (格式: YYYY-MM-DD)
+            sort_by: 排序方式，见 SORT_MODES
+            limit: 返回的列车数
+
+        返回:
+            列车信息列表（格式同 search_available_tickets），以及错误信息(如果有)
+        """
+        import heapq
+        import itertools
+
+        if sort_by not in TicketService.SORT_MODES:
+            return [], f"Unknown sort mode: {sort_by}"
+
+        queries = [(dep_station_name, arr_station_name, day) for day in departure_dates]
+        results = TicketService.search_many(queries)
+
+        per_day = []
+        errors = []
+        for query in queries:
+            rows, error = results[query]
+            if rows:
+                per_day.append(TicketService._rank_rows(rows, sort_by, limit))
+            elif error:
+                errors.append(error)
+
+        if not per_day:
+            return [], errors[0] if errors else "No trains found for the selected dates."
+
+        key = TicketService.SORT_MODES[sort_by][1]
+        merged = heapq.merge(*per_day, key=key)
+        if limit is not None:
+            merged = itertools.islice(merged, limit)
+        return list(merged), None
+
+    @staticmethod
+    def _rank_rows(rows, sort_by='departure', limit=None):
+        """在内存中对已格式化的结果排序并截取前 limit 名"""
+        import heapq
+
+        key = TicketService.SORT_MODES[sort_by][1]
+        if limit is not None:
+            return heapq.nsmallest(limit, rows, key=key)
+        if sort_by == 'departure':
+            return list(rows)  # 缓存中的结果已按出发时间排序
+        return sorted(rows, key=key)
+
+    @staticmethod
+    def _duration_seconds(row):
+        """计算格式化结果行的行程时长（秒），时间缺失时排在最后"""
+        import datetime
+
+        if row[3] == '-' or row[5] == '-':
+            return float('inf')
+        departure = datetime.datetime.strptime(row[3], '%Y-%m-%d %H:%M:%S')
+        arrival = datetime.datetime.strptime(row[5], '%Y-%m-%d %H:%M:%S')
+        return (arrival - departure).total_seconds()
+
+    @staticmethod
+    def search_calendar(dep_station_name, arr_station_name, start_date, days=7):
+        """
+        按日历查询一段日期内每天的可售列车、最低票价和最多余票
+
+        所有日期通过一次范围查询取回，再在内存中按出发日期分组，
+        而不是逐日调用 search_available_tickets。
+
+        参数:
+            dep_station_name: 起点站名
+            arr_station_name: 终点站名
+            start_date: 起始出发日期 (格式: YYYY-MM-DD)
+            days: 查询天数
+
+        返回:
+            每天一行的列表 [日期, 可售车次数, 车次, 最低票价, 最多余票, 最早出发时间]，
+            以及错误信息(如果有)
+        """
+        import datetime
+
+        dep_station = StationService.resolve_station(dep_station_name)
+        arr_station = StationService.resolve_station(arr_station_name)
+        if not dep_station or not arr_station:
+            return [], "Departure or arrival station not found."
+
+        try:
+            first_day = datetime.datetime.strptime(start_date, '%Y-%m-%d').date()
+            days = int(days)
+        except (TypeError, ValueError):
+            return [], "Invalid start date or number of days."
+        if days <= 0:
+            return [], "Number of days must be positive."
+        end_day = first_day + datetime.timedelta(days=days)
+
+        train_results = TicketService._query_routes(
+            dep_station.get('station_id'), arr_station.get('station_id'),
+            "AND od.departure_time >= %s AND od.departure_time < %s",
+            [first_day, end_day]
+        )
+        if train_results is None:
+            # 查询出错时不返回日历，避免把故障显示成所有日期都无票
+            return [], "Error querying trains for the selected dates."
+
+        # 按出发日期分组
+        by_day = {}
+        for train in train_results:
+            by_day.setdefault(train['departure_time'].date(), []).append(train)
+
+        calendar_data = []
+        for offset in range(days):
+            day = first_day + datetime.timedelta(days=offset)
+            trains = by_day.get(day, [])
+            available = [t for t in trains if t['min_seats'] > 0]
+            calendar_data.append([
+                day.strftime('%Y-%m-%d'),
+                len(available),
+                ', '.join(t['train_number'] for t in available) or '-',
+                min(float(t['price']) for t in available) if available else '-',
+                max(t['min_seats'] for t in trains) if trains else '-',
+                available[0]['departure_time'].strftime('%H:%M') if available else '-'
+            ])
+
+        if not by_day:
+            return calendar_data, "No trains found passing through both stations in the selected dates."
+        return calendar_data, None
+
+    @staticmethod
+    def _query_routes_parallel(dep_station_id, arr_station_id, sort_by='departure', limit=None):
+        """不指定日期时的并行查询
+
+        先从 idx_od_lookup 取得起止站间的出发时间范围，按天划分为最多 SEARCH_PARTITIONS 个
+        连续分区，每个分区在独立的池连接上执行 _query_routes，最后将各分区的有序结果
+        按排序方式归并。
+
+        返回:
+            与 _query_routes 相同的行列表，查询出错时返回None
+        """
+        import datetime
+        import heapq
+        import itertools
+        from concurrent.futures import ThreadPoolExecutor
+
+        span = db.execute_pooled_query(
+            """
+            SELECT MIN(departure_time) AS first_departure, MAX(departure_time) AS last_departure
+            FROM OdAvailability
+            WHERE departure_station_id = %s AND arrival_station_id = %s
+            """,
+            (dep_station_id, arr_station_id), fetch_one=True
+        )
+        if span is None:
+            return None
+        if span['first_departure'] is None:
+            return []
+
+        first_day = span['first_departure'].date()
+        days = (span['last_departure'].date() - first_day).days + 1
+        partitions = min(TicketService.SEARCH_PARTITIONS, days)
+        step = -(-days // partitions)  # 向上取整
+        bounds = [
+            datetime.datetime.combine(first_day + datetime.timedelta(days=i), datetime.time())
+            for i in range(0, days, step)
+        ]
+        bounds.append(datetime.datetime.combine(first_day + datetime.timedelta(days=days), datetime.time()))
+
+        order_by = TicketService.SORT_MODES[sort_by][0]
+
+        def query_partition(lower, upper):
+            return TicketService._query_routes(
+                dep_station_id, arr_station_id,
+                "AND od.departure_time >= %s AND od.departure_time < %s", (lower, upper),
+                order_by=order_by, limit=limit, pooled=True
+            )
+
+        with ThreadPoolExecutor(max_workers=len(bounds) - 1) as executor:
+            results = list(executor.map(query_partition, bounds[:-1], bounds[1:]))
+        if any(result is None for result in results):
+            return None
+
+        # 各分区已按同一排序方式有序，归并时复用内存排序键
+        sort_key = TicketService.SORT_MODES[sort_by][1]
+        merged = heapq.merge(
+            *results, key=lambda train: sort_key(TicketService._format_route(train, None, None))
+        )
+        return list(itertools.islice(merged, limit))
+
+    @staticmethod
+    def _query_routes(dep_station_id, arr_station_id, date_filter="", params=(),
+                      order_by="od.departure_time", limit=None, pooled=False):
+        """从 OdAvailability 物化表查询起止站之间的列车运行，按出发时间排序
+
+        OdAvailability 由 Stopovers/Prices 上的触发器增量维护，每行即一个
+        (列车, 发车日期, 出发站, 到达站) 组合及其票价和最少余票，
+        因此查询只需一次 (departure_station_id, arrival_station_id, departure_time) 索引扫描。
+        pooled 为 True 时在连接池的连接上执行，供并行查询的工作线程使用。
+        """
         route_query = """
         SELECT 
-            s1.train_number,
-            s1.start_date,
-            s1.departure_time,
-            s2.arrival_time,
-            MIN(s3.seats) as min_seats,
+            od.train_number,
+            od.start_date,
+            od.departure_time,
+            od.arrival_time,
+            od.min_seats,
             t.train_type,
-            p.price
+            od.price
         FROM 
-            Stopovers s1
-            JOIN Stopovers s2 ON s1.train_number = s2.train_number AND s1.start_date = s2.start_date
-            JOIN Stopovers s3 ON s1.train_number = s3.train_number AND s1.start_date = s3.start_date
-            JOIN Trains t ON s1.train_number = t.train_number
-            JOIN Prices p ON s1.train_number = p.train_number 
-                AND s1.station_id = p.departure_station_id
-                AND s2.station_id = p.arrival_station_id
+            OdAvailability od
+            JOIN Trains t ON od.train_number = t.train_number
         WHERE 
-            s1.station_id = %s
-            AND s2.station_id = %s
-            AND s1.stop_order < s2.stop_order
-            AND s3.stop_order >= s1.stop_order
-            AND s3.stop_order < s2.stop_order
+            od.departure_station_id = %s
+            AND od.arrival_station_id = %s
             """ + date_filter + """
-        GROUP BY
-            s1.train_number, s1.start_date, s1.departure_time, s2.arrival_time, t.train_type, p.price
         ORDER BY 
-            s1.departure_time
+            """ + order_by + """
         """
-    
-        params = [dep_station.get('station_id'), arr_station.get('station_id')] + params
-    
-        train_results = db.execute_query(route_query, tuple(params), fetch_all=True)
-    
-        if not train_results:
-            return [], "No trains found passing through both stations in the correct order."
-    
-        # Step 4: 构建返回结果
-        train_data = []
-    
-        for train in train_results:
-            train_info = [
-                train['train_number'],
-                train['start_date'].strftime('%Y-%m-%d'),
-                dep_station_name,
-                train['departure_time'].strftime('%Y-%m-%d %H:%M:%S') if train['departure_time'] else '-',
-                arr_station_name,
-                train['arrival_time'].strftime('%Y-%m-%d %H:%M:%S') if train['arrival_time'] else '-',
-                float(train['price']),
-                train['min_seats'],
-                train['train_type']
-            ]
-        
-            train_data.append(train_info)
-    
-        return train_data, None
+        params = [dep_station_id, arr_station_id] + list(params)
+        if limit is not None:
+            route_query += " LIMIT %s"
+            params.append(int(limit))
+        if pooled:
+            return db.execute_pooled_query(route_query, tuple(params), fetch_all=True)
+        return db.execute_query(route_query, tuple(params), fetch_all=True)
+
+    @staticmethod
+    def _format_route(train, dep_station_name, arr_station_name):
+        """将查询结果行转换为界面显示的列表"""
+        return [
+            train['train_number'],
+            train['start_date'].strftime('%Y-%m-%d'),
+            dep_station_name,
+            train['departure_time'].strftime('%Y-%m-%d %H:%M:%S') if train['departure_time'] else '-',
+            arr_station_name,
+            train['arrival_time'].strftime('%Y-%m-%d %H:%M:%S') if train['arrival_time'] else '-',
+            float(train['price']),
+            train['min_seats'],
+            train['train_type']
+        ]
+
+    @staticmethod
+    def get_search_cache_stats():
+        """获取余票查询缓存的命中统计
+
+        Returns:
+            dict: hits, misses, hit_rate, size, evictions, invalidations, expirations
+        """
+        return search_cache.stats()
+
+class OrderConflictError(Exception):
+    """订单处理时状态或余票已被并发事务改变"""
+    pass
+
+class OrderVersionConflict(OrderConflictError):
+    """订单在读取之后已被其他操作修改（版本号不匹配）"""
+    pass
+
+class IdempotentReplay(Exception):
+    """幂等键对应的请求已经执行过，result 为首次执行的结果"""
+
+    def __init__(self, result):
+        super().__init__(result[1])
+        self.result = result
 
 class OrderService:
+    # 死锁或锁等待超时时，订单处理事务的最大尝试次数
+    MAX_TRANSACTION_RETRIES = 3
+    # 版本号冲突时重新读取订单并重试的最大次数
+    MAX_VERSION_RETRIES = 5
+    # 座位已被其他进程占用（SeatAssignments 主键冲突）时重新加载分配器并重选的最大尝试次数
+    SEAT_ASSIGNMENT_ATTEMPTS = 3
+    # 下单时座位预留的有效期（分钟），过期后由后台清理线程释放
+    SEAT_HOLD_TTL_MINUTES = 30
+    # 一次团体订票的最多乘客数
+    MAX_GROUP_SIZE = 50
+    # 幂等键的保留时间（小时），过期后由 ev_purge_idempotency_keys 事件删除
+    IDEMPOTENCY_KEY_TTL_HOURS = 24
+    # 乘客订单历史每页的订单数
+    ORDER_HISTORY_PAGE_SIZE = 50
+    # 变更序号的空缺（事务未提交或已回滚）持续超过该秒数后视为回滚，不再等待
+    CHANGE_FEED_GAP_TIMEOUT_SECONDS = 60
+    # 一次变更查询最多读取的变更数，超过时分页返回（more 为True）
+    CHANGE_FEED_MAX_CHANGES = 1000
+
     @staticmethod
     def create_order(train_number, start_date, departure_station, arrival_station, 
-                    price, customer_name, customer_id_card):
-        """创建订单"""
+                    price, customer_name, customer_id_card, idempotency_key=None):
+        """创建订单
+
+        订单插入、所经区间的座位扣减和座位预留记录在同一个事务中完成，
+        预留在 SEAT_HOLD_TTL_MINUTES 分钟内有效，期间座位不会被其他订单占用，
+        余票查询中也不再计入这些座位。
+
+        提供 idempotency_key 时，同一个键的重试直接返回首次成功下单的结果，不会重复下单。
+        """
         try:
-            # 验证客户信息
+            if idempotency_key:
+                replay = OrderService._idempotent_result(idempotency_key, 'create_order')
+                if replay:
+                    return replay
+
+            # 验证客户信息（查询均在连接池上执行，可由订票队列的多个工作线程同时调用）
             customer_query = """
             SELECT * FROM Customers 
             WHERE name = %s AND id_card = %s
             """
-            customer = db.execute_query(
+            customer = db.execute_pooled_query(
                 customer_query, 
                 (customer_name, customer_id_card),
                 fetch_one=True
@@ -265,56 +871,292 @@ class OrderService:
             dep_station_query = "SELECT station_id FROM Stations WHERE station_name = %s"
             arr_station_query = "SELECT station_id FROM Stations WHERE station_name = %s"
             
-            dep_station = db.execute_query(dep_station_query, (departure_station,), fetch_one=True)
-            arr_station = db.execute_query(arr_station_query, (arrival_station,), fetch_one=True)
+            dep_station = db.execute_pooled_query(dep_station_query, (departure_station,), fetch_one=True)
+            arr_station = db.execute_pooled_query(arr_station_query, (arrival_station,), fetch_one=True)
             
             if not dep_station or not arr_station:
                 return False, "Departure or arrival station not found."
+
+            # 查询出发站和到达站在该次列车中的顺序
+            stops_query = """
+            SELECT dep.stop_order AS dep_stop_order, arr.stop_order AS arr_stop_order
+            FROM Stopovers dep
+            JOIN Stopovers arr ON arr.train_number = dep.train_number
+                AND arr.start_date = dep.start_date
+            WHERE dep.train_number = %s
+            AND dep.start_date = %s
+            AND dep.station_id = %s
+            AND arr.station_id = %s
+            """
+            stops = db.execute_pooled_query(
+                stops_query,
+                (train_number, start_date, dep_station['station_id'], arr_station['station_id']),
+                fetch_one=True
+            )
+
+            if not stops or stops['dep_stop_order'] >= stops['arr_stop_order']:
+                return False, "Route not found for this train."
             
-            # 生成订单号 (年月日时分秒+4位随机数)
-            import datetime
-            import random
-            order_id = datetime.datetime.now().strftime('%Y%m%d%H%M%S') + \
-                      str(random.randint(1000, 9999))
+            # 生成订单号（按时间递增，进程内不重复，多进程部署时由节点号区分）
+            order_id = order_id_generator.next_order_id()
             
             # 插入订单
             order_query = """
             INSERT INTO SalesOrders (
                 order_id, train_number, start_date,
                 departure_station_id, arrival_station_id,
+                dep_stop_order, arr_stop_order,
                 price, customer_id, 
                 operation_type, status
             ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, 
+                %s, %s, %s, %s, %s, %s, %s, %s, %s, 
                 'Booking', 'Ready'
             )
             """
             
-            # 执行订单插入
-            db.execute_query(
-                order_query,
-                (order_id, train_number, start_date,
-                 dep_station['station_id'], arr_station['station_id'],
-                 price, customer_id_card)
+            def insert_order(cursor):
+                if idempotency_key:
+                    OrderService._claim_idempotency_key(cursor, idempotency_key, 'create_order')
+                cursor.execute(
+                    order_query,
+                    (order_id, train_number, start_date,
+                     dep_station['station_id'], arr_station['station_id'],
+                     stops['dep_stop_order'], stops['arr_stop_order'],
+                     price, customer_id_card)
+                )
+                OrderService._reserve_seats(
+                    cursor, train_number, start_date,
+                    stops['dep_stop_order'], stops['arr_stop_order']
+                )
+                seat_number = OrderService._assign_seat(
+                    cursor, order_id, train_number, start_date,
+                    stops['dep_stop_order'], stops['arr_stop_order']
+                )
+                cursor.execute(
+                    """
+                    INSERT INTO SeatHolds (
+                        order_id, train_number, start_date,
+                        dep_stop_order, arr_stop_order, expires_at
+                    ) VALUES (
+                        %s, %s, %s, %s, %s, NOW() + INTERVAL %s MINUTE
+                    )
+                    """,
+                    (order_id, train_number, start_date,
+                     stops['dep_stop_order'], stops['arr_stop_order'],
+                     OrderService.SEAT_HOLD_TTL_MINUTES)
+                )
+                message = (f"Order created successfully! Order ID: {order_id}, Seat: {seat_number}\n"
+                           f"Seat held for {OrderService.SEAT_HOLD_TTL_MINUTES} minutes pending approval")
+                if idempotency_key:
+                    OrderService._complete_idempotency_key(cursor, idempotency_key, message)
+                return message
+
+            try:
+                message = OrderService._run_transaction(insert_order, run=(train_number, start_date))
+            except IdempotentReplay as e:
+                return e.result
+            except OrderConflictError as e:
+                return False, str(e)
+
+            OrderService._seats_changed(
+                train_number, start_date,
+                stops['dep_stop_order'], stops['arr_stop_order'], -1
             )
             
-            return True, f"Order created successfully! Order ID: {order_id}"
+            return True, message
             
         except Exception as e:
             return False, f"Failed to create order: {str(e)}"
+
+    @staticmethod
+    def create_group_order(train_number, start_date, departure_station, arrival_station,
+                           price, passengers, idempotency_key=None):
+        """为多名乘客创建同一行程的订单（团体订票）
+
+        所有乘客用一次查询校验，所有订单和座位预留各用一条多行 INSERT 写入，
+        所经区间的余票一次扣减 len(passengers) 张，全部在同一个事务中完成：
+        任一乘客信息有误或余票、座位不足时整个团体都不会下单。
+
+        Args:
+            train_number (str): 列车号
+            start_date (str): 发车日期
+            departure_station (str): 出发站名
+            arrival_station (str): 到达站名
+            price (decimal): 单张票价
+            passengers (list): (name, id_card) 列表
+            idempotency_key (str, optional): 客户端生成的幂等键，重试时返回首次成功的结果
+
+        Returns:
+            tuple: (success, message)
+        """
+        try:
+            if idempotency_key:
+                replay = OrderService._idempotent_result(idempotency_key, 'create_group_order')
+                if replay:
+                    return replay
+
+            if not passengers:
+                return False, "No passengers given."
+            if len(passengers) > OrderService.MAX_GROUP_SIZE:
+                return False, f"A group booking can include at most {OrderService.MAX_GROUP_SIZE} passengers."
+
+            id_cards = [id_card for _, id_card in passengers]
+            if len(set(id_cards)) != len(id_cards):
+                return False, "Each passenger can only appear once in a group booking."
+
+            # 一次查询校验所有乘客
+            placeholders = ", ".join(["%s"] * len(id_cards))
+            customers = db.execute_pooled_query(
+                f"SELECT name, id_card FROM Customers WHERE id_card IN ({placeholders})",
+                tuple(id_cards),
+                fetch_all=True
+            )
+            if customers is None:
+                return False, "Failed to verify passengers."
+            names = {customer['id_card']: customer['name'] for customer in customers}
+            invalid = [name for name, id_card in passengers if names.get(id_card) != name]
+            if invalid:
+                return False, f"Customer information not found or incorrect: {', '.join(invalid)}"
+
+            # 一次查询得到出发站、到达站及其在该次列车中的顺序
+            route = db.execute_pooled_query(
+                """
+                SELECT dep.station_id AS departure_station_id, arr.station_id AS arrival_station_id,
+                       dep.stop_order AS dep_stop_order, arr.stop_order AS arr_stop_order
+                FROM Stopovers dep
+                JOIN Stations dep_st ON dep_st.station_id = dep.station_id
+                JOIN Stopovers arr ON arr.train_number = dep.train_number
+                    AND arr.start_date = dep.start_date
+                JOIN Stations arr_st ON arr_st.station_id = arr.station_id
+                WHERE dep.train_number = %s
+                AND dep.start_date = %s
+                AND dep_st.station_name = %s
+                AND arr_st.station_name = %s
+                """,
+                (train_number, start_date, departure_station, arrival_station),
+                fetch_one=True
+            )
+            if not route or route['dep_stop_order'] >= route['arr_stop_order']:
+                return False, "Route not found for this train."
+
+            # 一次生成整个团体的订单号
+            order_ids = order_id_generator.next_order_ids(len(passengers))
+
+            order_values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, 'Booking', 'Ready')"] * len(passengers))
+            order_params = []
+            for order_id, id_card in zip(order_ids, id_cards):
+                order_params.extend([
+                    order_id, train_number, start_date,
+                    route['departure_station_id'], route['arrival_station_id'],
+                    route['dep_stop_order'], route['arr_stop_order'],
+                    price, id_card
+                ])
+
+            hold_values = ", ".join(["(%s, %s, %s, %s, %s, NOW() + INTERVAL %s MINUTE)"] * len(passengers))
+            hold_params = []
+            for order_id in order_ids:
+                hold_params.extend([
+                    order_id, train_number, start_date,
+                    route['dep_stop_order'], route['arr_stop_order'],
+                    OrderService.SEAT_HOLD_TTL_MINUTES
+                ])
+
+            def insert_orders(cursor):
+                if idempotency_key:
+                    OrderService._claim_idempotency_key(cursor, idempotency_key, 'create_group_order')
+                cursor.execute(
+                    f"""
+                    INSERT INTO SalesOrders (
+                        order_id, train_number, start_date,
+                        departure_station_id, arrival_station_id,
+                        dep_stop_order, arr_stop_order,
+                        price, customer_id,
+                        operation_type, status
+                    ) VALUES {order_values}
+                    """,
+                    tuple(order_params)
+                )
+                OrderService._reserve_seats(
+                    cursor, train_number, start_date,
+                    route['dep_stop_order'], route['arr_stop_order'], count=len(passengers)
+                )
+                seat_numbers = OrderService._assign_seats(
+                    cursor, order_ids, train_number, start_date,
+                    route['dep_stop_order'], route['arr_stop_order']
+                )
+                cursor.execute(
+                    f"""
+                    INSERT INTO SeatHolds (
+                        order_id, train_number, start_date,
+                        dep_stop_order, arr_stop_order, expires_at
+                    ) VALUES {hold_values}
+                    """,
+                    tuple(hold_params)
+                )
+                lines = [
+                    f"{name}: Order ID {order_id}, Seat {seat_number}"
+                    for (name, _), order_id, seat_number in zip(passengers, order_ids, seat_numbers)
+                ]
+                message = (f"{len(passengers)} orders created successfully!\n" + "\n".join(lines) +
+                           f"\nSeats held for {OrderService.SEAT_HOLD_TTL_MINUTES} minutes pending approval")
+                if idempotency_key:
+                    OrderService._complete_idempotency_key(cursor, idempotency_key, message)
+                return message
+
+            try:
+                message = OrderService._run_transaction(insert_orders, run=(train_number, start_date))
+            except IdempotentReplay as e:
+                return e.result
+            except OrderConflictError as e:
+                return False, str(e)
+
+            OrderService._seats_changed(
+                train_number, start_date,
+                route['dep_stop_order'], route['arr_stop_order'], -len(passengers)
+            )
+
+            return True, message
+
+        except Exception as e:
+            return False, f"Failed to create group order: {str(e)}"
     
     @staticmethod
-    def get_orders_by_passenger(name, id_card):
-        """根据乘客信息查询订单"""
+    def get_orders_by_passenger(name, id_card, after=None, page_size=None):
+        """根据乘客信息分页查询订单，按下单时间从新到旧排列
+
+        使用 (customer_id, operation_time) 索引做键集分页：下一页从上一页最后一个订单之后开始，
+        不用 OFFSET 跳过已读的订单，翻到多深每页的开销都相同。
+
+        Args:
+            name (str): 乘客姓名
+            id_card (str): 乘客身份证号
+            after (tuple, optional): 上一页最后一个订单的 (operation_time, order_id)，为空时查询第一页
+            page_size (int, optional): 每页订单数，默认 ORDER_HISTORY_PAGE_SIZE
+
+        Returns:
+            tuple: (orders_data, error)
+        """
         try:
             print(f"Querying orders for passenger {name} with ID: {id_card}")
-            query = """
+            page_size = page_size or OrderService.ORDER_HISTORY_PAGE_SIZE
+            params = [id_card, name]
+            keyset = ""
+            if after:
+                operation_time, order_id = after
+                keyset = """
+                AND (so.operation_time < %s
+                     OR (so.operation_time = %s AND so.order_id < %s))
+                """
+                params.extend([operation_time, operation_time, order_id])
+            params.append(page_size)
+            query = f"""
                 SELECT 
                     so.order_id,
                     so.train_number,
                     t.train_type,
                     dep.station_name AS departure_station,
                     arr.station_name AS arrival_station,
+                    so.seat_number,
                     so.price,
                     c.name AS customer_name,
                     c.phone AS customer_phone,
@@ -326,14 +1168,18 @@ class OrderService:
                 JOIN Stations dep ON so.departure_station_id = dep.station_id
                 JOIN Stations arr ON so.arrival_station_id = arr.station_id
                 JOIN Customers c ON so.customer_id = c.id_card
-                WHERE c.name = %s AND c.id_card = %s
-                ORDER BY so.operation_time DESC
+                WHERE so.customer_id = %s AND c.name = %s
+                {keyset}
+                ORDER BY so.operation_time DESC, so.order_id DESC
+                LIMIT %s
             """
             
-            orders = db.execute_query(query, (name, id_card), fetch_all=True)
+            orders = db.execute_pooled_query(query, tuple(params), fetch_all=True)
 
+            if orders is None:
+                return [], "Failed to query orders"
             if not orders:
-                return [], "No orders found for this passenger"
+                return [], "No more orders for this passenger" if after else "No orders found for this passenger"
 
             orders_data = []
             for order in orders:
@@ -343,6 +1189,7 @@ class OrderService:
                     order['train_type'],
                     order['departure_station'],
                     order['arrival_station'],
+                    order['seat_number'] or '-',
                     f"${float(order['price']):.2f}",
                     order['customer_name'],
                     order['customer_phone'],
@@ -358,28 +1205,51 @@ class OrderService:
     
     @staticmethod
     def cancel_order(order_id):
-        """取消订单"""
+        """取消订单，同时释放下单时预留的座位
+
+        以读取时的版本号为条件更新订单，期间订单被其他操作修改时重新读取并重试。
+        """
         try:
-            # 检查订单状态
-            check_query = """
-            SELECT status FROM SalesOrders 
-            WHERE order_id = %s
-            """
-            order = db.execute_query(check_query, (order_id,), fetch_one=True)
-            
-            if not order:
-                return False, "Order not found"
-            
-            if order['status'] != 'Ready':
-                return False, "Only orders in Ready status can be cancelled"
-            
-            # 更新订单状态
-            update_query = """
-            UPDATE SalesOrders 
-            SET status = 'Cancelled'
-            WHERE order_id = %s
-            """
-            db.execute_query(update_query, (order_id,))
+            for _ in range(OrderService.MAX_VERSION_RETRIES):
+                # 检查订单状态
+                check_query = """
+                SELECT order_id, start_date, status, version FROM SalesOrders 
+                WHERE order_id = %s
+                """
+                order = db.execute_pooled_query(check_query, (order_id,), fetch_one=True)
+                
+                if not order:
+                    return False, "Order not found"
+                
+                if order['status'] != 'Ready':
+                    return False, "Only orders in Ready status can be cancelled"
+                
+                def cancel(cursor):
+                    OrderService._update_order_version(cursor, order, "status = 'Cancelled'")
+                    hold = OrderService._consume_hold(cursor, order_id)
+                    if hold:
+                        OrderService._release_seats(
+                            cursor, hold['train_number'], hold['start_date'],
+                            hold['dep_stop_order'], hold['arr_stop_order']
+                        )
+                    return hold
+
+                try:
+                    hold = OrderService._run_transaction(cancel)
+                    break
+                except OrderVersionConflict:
+                    continue
+                except OrderConflictError as e:
+                    return False, str(e)
+            else:
+                return False, "Order was modified by another operation, please try again"
+
+            if hold:
+                OrderService._seats_changed(
+                    hold['train_number'], hold['start_date'],
+                    hold['dep_stop_order'], hold['arr_stop_order'], 1,
+                    seat_number=hold['seat_number']
+                )
             
             return True, "Order cancelled successfully"
             
@@ -387,32 +1257,53 @@ class OrderService:
             return False, f"Failed to cancel order: {str(e)}"
 
     @staticmethod
-    def request_refund(order_id):
-        """申请退款"""
+    def request_refund(order_id, idempotency_key=None):
+        """申请退款
+
+        以读取时的版本号为条件更新订单，期间订单被其他操作修改时重新读取并重试。
+        提供 idempotency_key 时，同一个键的重试直接返回首次成功申请的结果。
+        """
         try:
-            # 检查订单状态
-            check_query = """
-            SELECT status FROM SalesOrders 
-            WHERE order_id = %s
-            """
-            order = db.execute_query(check_query, (order_id,), fetch_one=True)
-            
-            if not order:
-                return False, "Order not found"
-            
-            if order['status'] != 'Success':
-                return False, "Only successful orders can request refund"
-            
-            # 更新订单状态为待退款
-            update_query = """
-            UPDATE SalesOrders 
-            SET status = 'RefundPending',
-                operation_type = 'Refund'
-            WHERE order_id = %s
-            """
-            db.execute_query(update_query, (order_id,))
-            
-            return True, "Refund request submitted successfully"
+            if idempotency_key:
+                replay = OrderService._idempotent_result(idempotency_key, 'request_refund')
+                if replay:
+                    return replay
+
+            for _ in range(OrderService.MAX_VERSION_RETRIES):
+                # 检查订单状态
+                check_query = """
+                SELECT order_id, start_date, status, version FROM SalesOrders 
+                WHERE order_id = %s
+                """
+                order = db.execute_pooled_query(check_query, (order_id,), fetch_one=True)
+                
+                if not order:
+                    return False, "Order not found"
+                
+                if order['status'] != 'Success':
+                    return False, "Only successful orders can request refund"
+                
+                # 更新订单状态为待退款
+                def request(cursor):
+                    if idempotency_key:
+                        OrderService._claim_idempotency_key(cursor, idempotency_key, 'request_refund')
+                    OrderService._update_order_version(
+                        cursor, order, "status = 'RefundPending', operation_type = 'Refund'"
+                    )
+                    if idempotency_key:
+                        OrderService._complete_idempotency_key(
+                            cursor, idempotency_key, "Refund request submitted successfully"
+                        )
+
+                try:
+                    OrderService._run_transaction(request)
+                    return True, "Refund request submitted successfully"
+                except IdempotentReplay as e:
+                    return e.result
+                except OrderVersionConflict:
+                    continue
+
+            return False, "Order was modified by another operation, please try again"
             
         except Exception as e:
             return False, f"Failed to request refund: {str(e)}"
@@ -429,51 +1320,198 @@ class OrderService:
             if not orders:
                 return [], "No pending orders found"
 
-            orders_data = []
-            for order in orders:
-                orders_data.append([
-                    order['order_id'],
-                    order['train_number'],
-                    order['train_type'],
-                    order['departure_station'],
-                    order['arrival_station'],
-                    f"${float(order['price']):.2f}",
-                    order['customer_name'],
-                    order['customer_phone'],
-                    order['operation_type'],
-                    order['operation_time'].strftime('%Y-%m-%d %H:%M:%S'),
-                    order['status']
-                ])
-                
-            return orders_data, None
+            return [OrderService._pending_order_row(order) for order in orders], None
             
         except Exception as e:
             return [], f"Error querying orders: {str(e)}"
 
+    @staticmethod
+    def get_pending_order_changes(since_seq=None):
+        """获取变更序号 since_seq 之后新增或变化的待处理订单
+
+        SalesOrders 上的触发器把每个新订单、状态变化和删除按顺序记入 OrderChanges，
+        这里只读取序号之后涉及的订单的当前状态，乘务员界面刷新时不必重新查询全部待处理订单。
+        首次查询或序号之后的变更已被清理时返回完整列表。积压的变更多于 CHANGE_FEED_MAX_CHANGES 条时
+        只处理前 CHANGE_FEED_MAX_CHANGES 条并返回 more，调用方应立即用返回的 seq 再次查询。
+
+        序号在事务中分配、在提交时才可见，较小的序号可能晚于较大的序号提交。
+        返回的 seq 是连续可见的最大序号，之后的变更下次查询时会再读一遍；
+        空缺超过 CHANGE_FEED_GAP_TIMEOUT_SECONDS 秒仍未出现时视为事务已回滚并跳过。
+
+        Args:
+            since_seq (int, optional): 上次查询返回的 seq，为空时返回完整列表
+
+        Returns:
+            tuple: (changes, error)，changes 为字典：
+                seq: 之前的变更都已读到的序号，下次查询时传入
+                reset: 为True时 rows 是完整的待处理订单列表，应替换已显示的全部订单
+                rows: 新增或状态变化的待处理订单，格式同 get_pending_orders
+                removed: 不再待处理（已处理、已取消或已删除）的订单ID列表
+                more: 为True时还有未读取的变更
+        """
+        try:
+            bounds = db.execute_pooled_query(
+                """
+                SELECT MIN(change_seq) AS first_seq, MAX(change_seq) AS last_seq,
+                       MAX(CASE WHEN changed_at < NOW() - INTERVAL %s SECOND
+                           THEN change_seq END) AS settled_seq
+                FROM OrderChanges
+                """,
+                (OrderService.CHANGE_FEED_GAP_TIMEOUT_SECONDS,), fetch_one=True
+            )
+            if bounds is None:
+                return None, "Failed to query order changes"
+            first_seq, last_seq = bounds['first_seq'], bounds['last_seq'] or 0
+
+            changes = None
+            if since_seq is not None and since_seq <= last_seq \
+                    and (first_seq is None or since_seq >= first_seq - 1):
+                changes = OrderService._read_order_changes(since_seq)
+                if changes is None:
+                    return None, "Failed to query order changes"
+
+            if changes is None:
+                # 从早已提交的序号开始推进，先读变更再读列表，期间提交的变更会在下次查询中再次返回
+                base_seq = bounds['settled_seq'] or (first_seq - 1 if first_seq else 0)
+                changes = OrderService._read_order_changes(base_seq)
+                if changes is None:
+                    return None, "Failed to query order changes"
+                rows, error = OrderService.get_pending_orders()
+                if error and not rows and error != "No pending orders found":
+                    return None, error
+                seq = OrderService._change_feed_watermark(base_seq, changes)
+                return {
+                    'seq': seq,
+                    'reset': True,
+                    'rows': rows,
+                    'removed': [],
+                    'more': len(changes) > OrderService.CHANGE_FEED_MAX_CHANGES and seq > base_seq,
+                }, None
+
+            # 只处理一页，其余的变更由 more 提示调用方接着读取
+            more = len(changes) > OrderService.CHANGE_FEED_MAX_CHANGES
+            changes = changes[:OrderService.CHANGE_FEED_MAX_CHANGES]
+            seq = OrderService._change_feed_watermark(since_seq, changes)
+            more = more and seq > since_seq
+            if not changes:
+                return {'seq': seq, 'reset': False, 'rows': [], 'removed': [], 'more': False}, None
+
+            order_ids = list(dict.fromkeys(change['order_id'] for change in changes))
+            placeholders = ", ".join(["%s"] * len(order_ids))
+            orders = db.execute_pooled_query(
+                f"SELECT * FROM PendingOrdersView WHERE order_id IN ({placeholders})",
+                tuple(order_ids), fetch_all=True
+            )
+            if orders is None:
+                return None, "Failed to query pending orders"
+
+            pending = {order['order_id'] for order in orders}
+            return {
+                'seq': seq,
+                'reset': False,
+                'rows': [OrderService._pending_order_row(order) for order in orders],
+                'removed': [order_id for order_id in order_ids if order_id not in pending],
+                'more': more,
+            }, None
+
+        except Exception as e:
+            return None, f"Error querying order changes: {str(e)}"
+
+    @staticmethod
+    def _read_order_changes(since_seq):
+        """按序号读取 since_seq 之后已提交的变更，最多比 CHANGE_FEED_MAX_CHANGES 多一条
+
+        settled 表示该变更写入已超过 CHANGE_FEED_GAP_TIMEOUT_SECONDS 秒。
+        """
+        return db.execute_pooled_query(
+            """
+            SELECT change_seq, order_id,
+                   changed_at < NOW() - INTERVAL %s SECOND AS settled
+            FROM OrderChanges
+            WHERE change_seq > %s
+            ORDER BY change_seq
+            LIMIT %s
+            """,
+            (OrderService.CHANGE_FEED_GAP_TIMEOUT_SECONDS, since_seq,
+             OrderService.CHANGE_FEED_MAX_CHANGES + 1),
+            fetch_all=True
+        )
+
+    @staticmethod
+    def _change_feed_watermark(since_seq, changes):
+        """从 since_seq 沿连续的序号推进，返回之前的变更都已读到的序号
+
+        遇到空缺时停下，除非空缺之后的变更已 settled：
+        分配了空缺序号的事务此时早该提交，视为已回滚。
+        """
+        seq = since_seq
+        for change in changes[:OrderService.CHANGE_FEED_MAX_CHANGES]:
+            if change['change_seq'] != seq + 1 and not change['settled']:
+                break
+            seq = change['change_seq']
+        return seq
+
+    @staticmethod
+    def _pending_order_row(order):
+        """PendingOrdersView 的一行转换为界面表格的一行"""
+        return [
+            order['order_id'],
+            order['train_number'],
+            order['train_type'],
+            order['departure_station'],
+            order['arrival_station'],
+            f"${float(order['price']):.2f}",
+            order['customer_name'],
+            order['customer_phone'],
+            order['operation_type'],
+            order['operation_time'].strftime('%Y-%m-%d %H:%M:%S'),
+            order['status']
+        ]
+
     @staticmethod
     def process_order(order_id, approve=True, salesperson_id=None):
         """处理订单（确认或拒绝）
         
+        订单状态更新、座位扣减和操作记录在同一个事务中完成：
+        状态更新以读取时的版本号为条件（compare-and-swap），订单在读取后被其他乘务员
+        或乘客修改时重新读取并按最新状态重新判断，因此同一订单不会被重复处理，也不需要悲观锁；
+        批准新订单时消费下单时的座位预留，预留已过期被释放的订单重新执行
+        带 seats > 0 条件的扣减，受影响行数不足即回滚，因此多名乘务员同时批准也不会超售；
+        拒绝新订单和批准退款时归还座位。
+        
         Args:
             order_id (str): 订单ID
             approve (bool): True为批准，False为拒绝
             salesperson_id (str): 处理订单的乘务员ID
         """
+        for _ in range(OrderService.MAX_VERSION_RETRIES):
+            result = OrderService._process_order_once(order_id, approve, salesperson_id)
+            if result is not None:
+                return result
+        return False, "Order was modified by another operation, please try again"
+
+    @staticmethod
+    def _process_order_once(order_id, approve, salesperson_id):
+        """读取订单并尝试处理一次，版本号冲突时返回None"""
         try:
-            # 检查订单状态和信息
+            # 检查订单状态和信息（在连接池上执行，可被多个线程同时调用）
             check_query = """
-            SELECT so.status, so.operation_type, so.price, 
+            SELECT so.order_id, so.version,
+                   so.status, so.operation_type, so.price, 
                    so.train_number, so.start_date, 
                    dep.station_name AS departure_station, 
                    arr.station_name AS arrival_station,
                    so.departure_station_id,
-                   so.arrival_station_id
+                   so.arrival_station_id,
+                   so.seat_number,
+                   so.dep_stop_order,
+                   so.arr_stop_order
             FROM SalesOrders so
             JOIN Stations dep ON so.departure_station_id = dep.station_id
             JOIN Stations arr ON so.arrival_station_id = arr.station_id 
             WHERE so.order_id = %s
             """
-            order = db.execute_query(check_query, (order_id,), fetch_one=True)
+            order = db.execute_pooled_query(check_query, (order_id,), fetch_one=True)
             
             if not order:
                 return False, "Order not found"
@@ -484,41 +1522,9 @@ class OrderService:
             # 确定新状态和操作类型
             original_status = order['status']
             operation_type = 'Approve' if approve else 'Reject'
-            
-            # 如果是批准新订单，需要检查余票
-            if approve and original_status == 'Ready':
-                # 检查所有经过站点是否有余票
-                check_seats_query = """
-                SELECT MIN(s.seats) as min_seats
-                FROM Stopovers s
-                WHERE s.train_number = %s
-                AND s.start_date = %s
-                AND s.stop_order >= (
-                    SELECT stop_order 
-                    FROM Stopovers s2 
-                    WHERE s2.train_number = %s
-                    AND s2.start_date = %s
-                    AND s2.station_id = %s
-                )
-                AND s.stop_order < (
-                    SELECT stop_order 
-                    FROM Stopovers s3 
-                    WHERE s3.train_number = %s
-                    AND s3.start_date = %s
-                    AND s3.station_id = %s
-                )
-                """
-                
-                seats_result = db.execute_query(
-                    check_seats_query, 
-                    (order['train_number'], order['start_date'],
-                     order['train_number'], order['start_date'], order['departure_station_id'],
-                     order['train_number'], order['start_date'], order['arrival_station_id']),
-                    fetch_one=True
-                )
-                
-                if not seats_result or seats_result['min_seats'] <= 0:
-                    return False, "No available seats for this route"
+
+            if original_status == 'Ready' and (order['dep_stop_order'] is None or order['arr_stop_order'] is None):
+                return False, "Route not found for this order"
     
             if original_status == 'Ready':
                 new_status = 'Success' if approve else 'Cancelled'
@@ -531,37 +1537,633 @@ class OrderService:
                 remarks = f"Order {'approved' if approve else 'rejected'} by salesperson"
             else:
                 remarks = f"Refund request {'approved' if approve else 'rejected'} by salesperson"
-            
-            # 更新订单状态
-            update_query = """
-            UPDATE SalesOrders 
-            SET status = %s
-            WHERE order_id = %s
-            """
-            db.execute_query(update_query, (new_status, order_id))
-            
-            # 记录操作
-            success = OrderService.record_operation(
-                order_id=order_id,
-                salesperson_id=salesperson_id,
-                operation_type=operation_type,
-                original_status=original_status,
-                new_status=new_status,
-                price=float(order['price']),
-                remarks=remarks
-            )
-            
-            if not success:
-                return False, "Operation recorded but failed to log the operation"
+
+            def apply(cursor):
+                # 以读取时的版本号为条件更新订单，并发处理同一订单时只有一个事务成功
+                OrderService._update_order_version(cursor, order, "status = %s", (new_status,))
+
+                seats_delta = 0
+                seat_number = order['seat_number']
+                if original_status == 'Ready':
+                    hold = OrderService._consume_hold(cursor, order_id)
+                    if approve and not hold:
+                        # 预留已过期被释放（或订单早于预留机制创建），重新扣减并分配座位
+                        OrderService._reserve_seats(
+                            cursor, order['train_number'], order['start_date'],
+                            order['dep_stop_order'], order['arr_stop_order']
+                        )
+                        seat_number = OrderService._assign_seat(
+                            cursor, order_id, order['train_number'], order['start_date'],
+                            order['dep_stop_order'], order['arr_stop_order']
+                        )
+                        seats_delta = -1
+                    elif not approve and hold:
+                        OrderService._release_seats(
+                            cursor, order['train_number'], order['start_date'],
+                            order['dep_stop_order'], order['arr_stop_order']
+                        )
+                        seat_number = hold['seat_number']
+                        seats_delta = 1
+                elif new_status == 'Refunded' and order['dep_stop_order'] is not None \
+                        and order['arr_stop_order'] is not None:
+                    # 只有退款批准才归还座位，其他状态变化不触及 Stopovers
+                    OrderService._release_seats(
+                        cursor, order['train_number'], order['start_date'],
+                        order['dep_stop_order'], order['arr_stop_order']
+                    )
+                    seats_delta = 1
+
+                OrderService.record_operation(
+                    order_id=order_id,
+                    salesperson_id=salesperson_id,
+                    operation_type=operation_type,
+                    original_status=original_status,
+                    new_status=new_status,
+                    price=float(order['price']),
+                    remarks=remarks,
+                    cursor=cursor
+                )
+                return seats_delta, seat_number
+
+            try:
+                seats_delta, seat_number = OrderService._run_transaction(
+                    apply, run=(order['train_number'], order['start_date'])
+                )
+            except OrderVersionConflict:
+                return None
+            except OrderConflictError as e:
+                return False, str(e)
+
+            # 余票发生变化，使相关查询缓存失效
+            if seats_delta and order['dep_stop_order'] is not None and order['arr_stop_order'] is not None:
+                OrderService._seats_changed(
+                    order['train_number'], order['start_date'],
+                    order['dep_stop_order'], order['arr_stop_order'], seats_delta,
+                    seat_number=seat_number
+                )
             
             return True, f"Order {new_status.lower()} successfully"
             
         except Exception as e:
             return False, f"Failed to process order: {str(e)}"
+
+    @staticmethod
+    def process_orders(order_ids, approve=True, salesperson_id=None, remarks=None, processed=None):
+        """批量处理订单（确认或拒绝），全部订单在同一个事务中完成
+
+        与 process_order 的规则相同，但按集合执行：所有订单用一次查询读取，
+        状态用一条以版本号为条件的 UPDATE 更新，座位预留一次消费，
+        需要重新扣减或归还的座位按 (运行, 出发站, 到达站) 汇总后按固定顺序每组执行一次条件扣减/归还，
+        操作记录用一条多行 INSERT 写入。任一组余票不足时整批回滚，批次中的订单和余票都不变；
+        读取后有订单被修改时重新读取整批并重试。
+        批次可以跨多个运行，BookingQueue.process_orders 同样整批排队执行，不按运行拆分。
+
+        Args:
+            order_ids (list): 订单ID列表
+            approve (bool): True为批准，False为拒绝
+            salesperson_id (str): 处理订单的乘务员ID
+            remarks (str, optional): 操作备注，为空时使用默认备注
+            processed (list, optional): 成功时追加实际改变了状态的订单ID（不含跳过的订单）
+
+        Returns:
+            tuple: (success, message)
+        """
+        order_ids = list(dict.fromkeys(order_ids))
+        if not order_ids:
+            return False, "No orders selected"
+
+        for _ in range(OrderService.MAX_VERSION_RETRIES):
+            result = OrderService._process_orders_once(order_ids, approve, salesperson_id, remarks, processed)
+            if result is not None:
+                return result
+        return False, "Orders were modified by another operation, please try again"
+
+    @staticmethod
+    def _process_orders_once(order_ids, approve, salesperson_id, remarks=None, processed=None):
+        """读取并尝试批量处理一次，版本号冲突时返回None"""
+        try:
+            placeholders = ", ".join(["%s"] * len(order_ids))
+            orders = db.execute_pooled_query(
+                f"""
+                SELECT so.order_id, so.version, so.status, so.train_number, so.start_date,
+                       so.seat_number, so.dep_stop_order, so.arr_stop_order
+                FROM SalesOrders so
+                WHERE so.order_id IN ({placeholders})
+                """,
+                tuple(order_ids), fetch_all=True
+            )
+            if orders is None:
+                return False, "Failed to load orders"
+
+            found = {order['order_id'] for order in orders}
+            skipped = [order_id for order_id in order_ids if order_id not in found]
+            processable = []
+            for order in orders:
+                if order['status'] not in ('Ready', 'RefundPending'):
+                    skipped.append(order['order_id'])
+                elif order['status'] == 'Ready' and (order['dep_stop_order'] is None or order['arr_stop_order'] is None):
+                    skipped.append(order['order_id'])
+                else:
+                    processable.append(order)
+            if not processable:
+                return False, "None of the selected orders can be processed in their current status"
+
+            operation_type = 'Approve' if approve else 'Reject'
+            for order in processable:
+                if order['status'] == 'Ready':
+                    order['new_status'] = 'Success' if approve else 'Cancelled'
+                    order['remarks'] = remarks or f"Order {'approved' if approve else 'rejected'} by salesperson"
+                else:
+                    order['new_status'] = 'Refunded' if approve else 'Success'
+                    order['remarks'] = remarks or f"Refund request {'approved' if approve else 'rejected'} by salesperson"
+
+            def route(order):
+                return (order['train_number'], order['start_date'], order['dep_stop_order'], order['arr_stop_order'])
+
+            def apply(cursor):
+                # 一条以版本号为条件的 UPDATE 更新全部订单，任一订单已被修改则整批重试
+                cases = " ".join(["WHEN %s THEN %s"] * len(processable))
+                keys = ", ".join(["(%s, %s, %s)"] * len(processable))
+                params = [value for order in processable for value in (order['order_id'], order['new_status'])]
+                params += [value for order in processable
+                           for value in (order['order_id'], order['start_date'], order['version'])]
+                cursor.execute(
+                    f"""
+                    UPDATE SalesOrders
+                    SET status = CASE order_id {cases} END, version = version + 1
+                    WHERE (order_id, start_date, version) IN ({keys})
+                    """,
+                    tuple(params)
+                )
+                if cursor.rowcount != len(processable):
+                    raise OrderVersionConflict("Order was modified by another operation")
+
+                # 一次消费所有新订单的座位预留
+                ready_ids = [order['order_id'] for order in processable if order['status'] == 'Ready']
+                held = set()
+                if ready_ids:
+                    ready_placeholders = ", ".join(["%s"] * len(ready_ids))
+                    cursor.execute(
+                        f"SELECT order_id FROM SeatHolds WHERE order_id IN ({ready_placeholders}) FOR UPDATE",
+                        tuple(ready_ids)
+                    )
+                    held = {row['order_id'] for row in cursor.fetchall()}
+                    if held:
+                        cursor.execute(
+                            f"DELETE FROM SeatHolds WHERE order_id IN ({', '.join(['%s'] * len(held))})",
+                            tuple(held)
+                        )
+
+                # 按行程汇总需要重新扣减（批准且预留已过期）和归还（拒绝且仍有预留）的座位
+                to_reserve = {}
+                to_release = {}
+                changes = []
+                for order in processable:
+                    if order['status'] == 'Ready':
+                        if approve and order['order_id'] not in held:
+                            to_reserve.setdefault(route(order), []).append(order['order_id'])
+                        elif not approve and order['order_id'] in held:
+                            to_release.setdefault(route(order), []).append(order)
+                    elif order['new_status'] == 'Refunded' and order['dep_stop_order'] is not None \
+                            and order['arr_stop_order'] is not None:
+                        to_release.setdefault(route(order), []).append(order)
+
+                # 按固定顺序加锁，避免与其他批量事务死锁
+                for key in sorted(to_reserve, key=str):
+                    OrderService._reserve_seats(cursor, *key, count=len(to_reserve[key]))
+                    OrderService._assign_seats(cursor, to_reserve[key], *key)
+                    changes.append(key + (-len(to_reserve[key]), None))
+                for key in sorted(to_release, key=str):
+                    OrderService._release_seats(cursor, *key, count=len(to_release[key]))
+                    changes.extend(key + (1, order['seat_number']) for order in to_release[key])
+
+                # 一条多行 INSERT 写入全部操作记录
+                values = ", ".join(["(%s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s)"] * len(processable))
+                params = [value for order in processable for value in (
+                    order['order_id'], salesperson_id, operation_type,
+                    order['status'], order['new_status'], order['remarks']
+                )]
+                cursor.execute(
+                    f"""
+                    INSERT INTO OrderOperations (
+                        order_id, salesperson_id, operation_type,
+                        original_status, new_status, operation_time, remarks
+                    ) VALUES {values}
+                    """,
+                    tuple(params)
+                )
+                return changes
+
+            # 前面的组可能已在内存中分配座位，每次失败（包括死锁重试之前）都丢弃批次涉及的所有运行的分配器
+            runs = {(order['train_number'], order['start_date']) for order in processable}
+            try:
+                changes = OrderService._run_transaction(apply, runs=runs)
+            except OrderVersionConflict:
+                return None
+            except OrderConflictError as e:
+                return False, str(e)
+
+            for train_number, start_date, dep_stop_order, arr_stop_order, delta, seat_number in changes:
+                if dep_stop_order is not None and arr_stop_order is not None:
+                    OrderService._seats_changed(
+                        train_number, start_date, dep_stop_order, arr_stop_order, delta,
+                        seat_number=seat_number
+                    )
+
+            if processed is not None:
+                processed.extend(order['order_id'] for order in processable)
+
+            message = f"{len(processable)} orders {'approved' if approve else 'rejected'} successfully"
+            if skipped:
+                message += f"\nSkipped {len(skipped)} orders that cannot be processed: {', '.join(map(str, skipped))}"
+            return True, message
+
+        except Exception as e:
+            return False, f"Failed to process orders: {str(e)}"
     
+    @staticmethod
+    def release_expired_holds(batch_size=500):
+        """释放一批已过期的座位预留
+
+        过期预留按 expires_at 顺序取出并加锁（SKIP LOCKED 跳过正被审批或取消的预留），
+        同一运行同一区间的预留合并为一次座位归还。订单本身保持 Ready 状态并清除座位号，
+        审批时会重新尝试扣减和分配座位。
+
+        Args:
+            batch_size (int): 每批最多释放的预留数
+
+        Returns:
+            int: 本批释放的预留数
+        """
+        from collections import Counter
+
+        def release(cursor):
+            cursor.execute(
+                """
+                SELECT h.hold_id, h.order_id, h.train_number, h.start_date,
+                       h.dep_stop_order, h.arr_stop_order, so.seat_number
+                FROM SeatHolds h
+                JOIN SalesOrders so ON so.order_id = h.order_id
+                WHERE h.expires_at <= NOW()
+                ORDER BY h.expires_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (batch_size,)
+            )
+            holds = cursor.fetchall()
+            if not holds:
+                return []
+
+            groups = Counter(
+                (hold['train_number'], hold['start_date'], hold['dep_stop_order'], hold['arr_stop_order'])
+                for hold in holds
+            )
+            # 按固定顺序更新 Stopovers，避免与其他批次互相死锁
+            for (train_number, start_date, dep_order, arr_order), count in sorted(groups.items()):
+                OrderService._release_seats(cursor, train_number, start_date, dep_order, arr_order, count)
+
+            placeholders = ", ".join(["%s"] * len(holds))
+            cursor.execute(
+                "UPDATE SalesOrders SET seat_number = NULL, version = version + 1 WHERE order_id IN (" + placeholders + ")",
+                tuple(hold['order_id'] for hold in holds)
+            )
+            cursor.execute(
+                "DELETE FROM SeatHolds WHERE hold_id IN (" + placeholders + ")",
+                tuple(hold['hold_id'] for hold in holds)
+            )
+            return holds
+
+        holds = OrderService._run_transaction(release)
+        for hold in holds:
+            OrderService._seats_changed(
+                hold['train_number'], hold['start_date'],
+                hold['dep_stop_order'], hold['arr_stop_order'], 1,
+                seat_number=hold['seat_number']
+            )
+        return len(holds)
+
+    @staticmethod
+    def _run_transaction(work, run=None, runs=None):
+        """在连接池连接上以事务执行 work(cursor) 并返回其结果
+
+        死锁（1213）或锁等待超时（1205）时整个事务已回滚，最多重试 MAX_TRANSACTION_RETRIES 次。
+        事务中可能已在内存中分配座位（批量审批中前面的组已分配、后面的组余票不足），
+        因此除幂等重放外的每次失败后（包括重试之前）都丢弃 run=(train_number, start_date)
+        或 runs 中所有运行的座位分配器，下次使用时按已提交的数据重新加载。
+        """
+        runs = set(runs or ())
+        if run:
+            runs.add(run)
+        for attempt in range(OrderService.MAX_TRANSACTION_RETRIES):
+            try:
+                with db.transaction() as cursor:
+                    return work(cursor)
+            except Exception as e:
+                # IdempotentReplay 在分配座位之前抛出，内存状态无需回退
+                if isinstance(e, IdempotentReplay):
+                    raise
+                for failed_run in runs:
+                    seat_allocators.invalidate_run(*failed_run)
+                if isinstance(e, Error) and e.errno in (1205, 1213) \
+                        and attempt < OrderService.MAX_TRANSACTION_RETRIES - 1:
+                    continue
+                raise
+
+    @staticmethod
+    def _idempotent_result(idempotency_key, operation):
+        """查询幂等键的已完成结果（不加锁的快速路径）
+
+        Returns:
+            tuple: 已有结果时返回 (success, message)，否则返回None
+        """
+        row = db.execute_pooled_query(
+            """
+            SELECT operation, message FROM IdempotencyKeys
+            WHERE idempotency_key = %s AND expires_at > NOW()
+            """,
+            (idempotency_key,), fetch_one=True
+        )
+        if not row or row['message'] is None:
+            return None
+        if row['operation'] != operation:
+            return False, "Idempotency key was already used for a different request"
+        return True, row['message']
+
+    @staticmethod
+    def _claim_idempotency_key(cursor, idempotency_key, operation):
+        """在事务开始时登记幂等键
+
+        主键冲突说明同一个键的请求已经提交（并发的相同请求会在插入时等待先到的事务结束），
+        此时读取首次执行的结果并抛出 IdempotentReplay，使本次事务回滚而不重复写入。
+        键与写入在同一个事务中提交，首次执行失败回滚时键也不会保留，重试会重新执行。
+        """
+        if len(idempotency_key) > 64:
+            raise OrderConflictError("Idempotency key must be at most 64 characters")
+        cursor.execute(
+            "DELETE FROM IdempotencyKeys WHERE idempotency_key = %s AND expires_at <= NOW()",
+            (idempotency_key,)
+        )
+        try:
+            cursor.execute(
+                """
+                INSERT INTO IdempotencyKeys (idempotency_key, operation, expires_at)
+                VALUES (%s, %s, NOW() + INTERVAL %s HOUR)
+                """,
+                (idempotency_key, operation, OrderService.IDEMPOTENCY_KEY_TTL_HOURS)
+            )
+        except Error as e:
+            if e.errno != 1062:  # 1062 is MySQL error code for duplicate entry
+                raise
+            cursor.execute(
+                "SELECT operation, message FROM IdempotencyKeys WHERE idempotency_key = %s",
+                (idempotency_key,)
+            )
+            row = cursor.fetchone()
+            if row['operation'] != operation:
+                raise IdempotentReplay((False, "Idempotency key was already used for a different request"))
+            raise IdempotentReplay((True, row['message']))
+
+    @staticmethod
+    def _complete_idempotency_key(cursor, idempotency_key, message):
+        """在同一个事务中保存首次执行的结果"""
+        cursor.execute(
+            "UPDATE IdempotencyKeys SET message = %s WHERE idempotency_key = %s",
+            (message, idempotency_key)
+        )
+
+    @staticmethod
+    def _update_order_version(cursor, order, assignments, params=()):
+        """以读取时的版本号为条件更新订单（compare-and-swap），同时递增版本号
+
+        Args:
+            order (dict): 读取时的订单，需包含 order_id、start_date 和 version
+            assignments (str): SET 子句，如 "status = %s"
+            params (tuple): SET 子句的参数
+
+        Raises:
+            OrderVersionConflict: 订单在读取之后已被修改
+        """
+        cursor.execute(
+            f"""
+            UPDATE SalesOrders
+            SET {assignments}, version = version + 1
+            WHERE order_id = %s AND start_date = %s AND version = %s
+            """,
+            tuple(params) + (order['order_id'], order['start_date'], order['version'])
+        )
+        if cursor.rowcount != 1:
+            raise OrderVersionConflict("Order was modified by another operation")
+
+    @staticmethod
+    def _reserve_seats(cursor, train_number, start_date, dep_stop_order, arr_stop_order, count=1):
+        """在事务中为 count 张票扣减所经区间的余票
+
+        只按 stop_order 顺序锁定 [dep_stop_order, arr_stop_order) 内的经停记录，
+        不重叠的行程可以并发扣减，后到的事务看到的是已提交的最新余票；任一区间余票不足时抛出
+        OrderConflictError。stop_order 在删除中间站后不再连续，因此与锁定时数到的实际区间数比较，
+        而不是与 arr_stop_order - dep_stop_order 比较。
+        """
+        cursor.execute(
+            """
+            SELECT COUNT(*) AS segments
+            FROM Stopovers
+            WHERE train_number = %s
+            AND start_date = %s
+            AND stop_order >= %s
+            AND stop_order < %s
+            FOR UPDATE
+            """,
+            (train_number, start_date, dep_stop_order, arr_stop_order)
+        )
+        segments = cursor.fetchone()['segments']
+        if not segments:
+            raise OrderConflictError("Route not found for this order")
+        cursor.execute(
+            """
+            UPDATE Stopovers
+            SET seats = seats - %s
+            WHERE train_number = %s
+            AND start_date = %s
+            AND stop_order >= %s
+            AND stop_order < %s
+            AND seats >= %s
+            """,
+            (count, train_number, start_date, dep_stop_order, arr_stop_order, count)
+        )
+        if cursor.rowcount != segments:
+            raise OrderConflictError("No available seats for this route")
+
+    @staticmethod
+    def _release_seats(cursor, train_number, start_date, dep_stop_order, arr_stop_order, count=1):
+        """在事务中归还所经区间的 count 个座位"""
+        cursor.execute(
+            """
+            UPDATE Stopovers
+            SET seats = seats + %s
+            WHERE train_number = %s
+            AND start_date = %s
+            AND stop_order >= %s
+            AND stop_order < %s
+            """,
+            (count, train_number, start_date, dep_stop_order, arr_stop_order)
+        )
+
+    @staticmethod
+    def _consume_hold(cursor, order_id):
+        """在事务中删除订单的座位预留
+
+        Returns:
+            dict: 被删除的预留记录，没有有效预留（已过期被释放）时返回None
+        """
+        cursor.execute(
+            """
+            SELECT h.train_number, h.start_date, h.dep_stop_order, h.arr_stop_order, so.seat_number
+            FROM SeatHolds h
+            JOIN SalesOrders so ON so.order_id = h.order_id
+            WHERE h.order_id = %s
+            FOR UPDATE
+            """,
+            (order_id,)
+        )
+        hold = cursor.fetchone()
+        if hold:
+            cursor.execute("DELETE FROM SeatHolds WHERE order_id = %s", (order_id,))
+        return hold
+
+    @staticmethod
+    def _assign_seat(cursor, order_id, train_number, start_date, dep_stop_order, arr_stop_order):
+        """在事务中为订单分配座位号并写入 SalesOrders.seat_number
+
+        余票计数保证每个区间都有空位，但不保证同一个座位在整段行程上空闲，
+        此时抛出 OrderConflictError 使整个事务回滚。
+
+        Returns:
+            int: 座位号
+        """
+        return OrderService._assign_seats(
+            cursor, [order_id], train_number, start_date, dep_stop_order, arr_stop_order
+        )[0]
+
+    @staticmethod
+    def _assign_seats(cursor, order_ids, train_number, start_date, dep_stop_order, arr_stop_order):
+        """在事务中为同一行程的多个订单分配座位号，并用一条 UPDATE 写入
+
+        数据库是座位占用的唯一依据：SalesOrders 的触发器把每个订单的座位按区间写入 SeatAssignments，
+        其主键保证同一座位在同一区间只属于一个订单。缓存的分配器选出的座位已被其他进程占用时
+        UPDATE 因主键冲突（1062）整条回滚，缓存中没有空座（其他进程可能已释放座位）时同样，
+        此时按数据库重新加载分配器后再分配，最多尝试 SEAT_ASSIGNMENT_ATTEMPTS 次。
+        任一订单分配失败时先归还本次已分配的座位再抛出 OrderConflictError，
+        保证该异常抛出时分配器的内存状态与数据库一致。
+
+        Returns:
+            list: 与 order_ids 对应的座位号
+        """
+        allocator = seat_allocators.get(
+            train_number, start_date,
+            lambda: OrderService._load_seat_allocator(cursor, train_number, start_date)
+        )
+        if allocator is None:
+            raise OrderConflictError("Route not found for this order")
+
+        cases = " ".join(["WHEN %s THEN %s"] * len(order_ids))
+        placeholders = ", ".join(["%s"] * len(order_ids))
+        for attempt in range(OrderService.SEAT_ASSIGNMENT_ATTEMPTS):
+            try:
+                seat_numbers = OrderService._allocate_seats(allocator, len(order_ids), dep_stop_order, arr_stop_order)
+                params = [value for pair in zip(order_ids, seat_numbers) for value in pair]
+                cursor.execute(
+                    f"UPDATE SalesOrders SET seat_number = CASE order_id {cases} END "
+                    f"WHERE order_id IN ({placeholders}) AND start_date = %s",
+                    tuple(params) + tuple(order_ids) + (start_date,)
+                )
+                return seat_numbers
+            except OrderConflictError:
+                if attempt == OrderService.SEAT_ASSIGNMENT_ATTEMPTS - 1:
+                    raise
+            except Error as e:
+                if e.errno != 1062 or attempt == OrderService.SEAT_ASSIGNMENT_ATTEMPTS - 1:
+                    raise
+            allocator = OrderService._load_seat_allocator(cursor, train_number, start_date)
+            if allocator is None:
+                raise OrderConflictError("Route not found for this order")
+            seat_allocators.put(train_number, start_date, allocator)
+
+    @staticmethod
+    def _allocate_seats(allocator, count, dep_stop_order, arr_stop_order):
+        """从分配器中分配 count 个座位，不足时归还已分配的座位并抛出 OrderConflictError"""
+        seat_numbers = []
+        for _ in range(count):
+            seat_number = allocator.allocate(dep_stop_order, arr_stop_order)
+            if seat_number is None:
+                for allocated in seat_numbers:
+                    allocator.release(allocated, dep_stop_order, arr_stop_order)
+                raise OrderConflictError("No single seat is free for the whole route")
+            seat_numbers.append(seat_number)
+        return seat_numbers
+
+    @staticmethod
+    def _load_seat_allocator(cursor, train_number, start_date):
+        """在调用方的事务中根据订单构建一次运行的座位分配器
+
+        使用事务自身的游标，不再占用第二个池连接；查询出错时直接抛出异常使事务回滚，
+        不会被当作运行不存在。座位占用以加锁读取，得到其他进程最新提交的座位。
+
+        Returns:
+            SeatAllocator: 运行不存在时返回None
+        """
+        cursor.execute(
+            """
+            SELECT t.total_seats, s.stop_order
+            FROM Stopovers s
+            JOIN Trains t ON s.train_number = t.train_number
+            WHERE s.train_number = %s AND s.start_date = %s
+            ORDER BY s.stop_order
+            """,
+            (train_number, start_date)
+        )
+        stops = cursor.fetchall()
+        if not stops:
+            return None
+
+        cursor.execute(
+            """
+            SELECT so.seat_number, so.dep_stop_order, so.arr_stop_order
+            FROM SalesOrders so
+            WHERE so.train_number = %s
+            AND so.start_date = %s
+            AND so.seat_number IS NOT NULL
+            AND so.dep_stop_order IS NOT NULL
+            AND so.status IN ('Ready', 'Success', 'RefundPending')
+            FOR SHARE
+            """,
+            (train_number, start_date)
+        )
+        assignments = cursor.fetchall()
+
+        # 区间数和 stop_order 到区间下标的映射取自实际的经停记录，删除中间站后 stop_order 可能不连续
+        allocator = SeatAllocator(stops[0]['total_seats'], len(stops) - 1,
+                                  [stop['stop_order'] for stop in stops])
+        for row in assignments:
+            allocator.occupy(row['seat_number'], row['dep_stop_order'], row['arr_stop_order'])
+        return allocator
+
+    @staticmethod
+    def _seats_changed(train_number, start_date, dep_stop_order, arr_stop_order, delta, seat_number=None):
+        """余票变化提交后，使查询缓存失效并更新全线余票矩阵，归还座位时同时释放座位号"""
+        search_cache.invalidate_run(train_number, start_date)
+        FleetService.apply_booking(train_number, start_date, dep_stop_order, arr_stop_order, delta)
+        if delta > 0 and seat_number:
+            allocator = seat_allocators.peek(train_number, start_date)
+            if allocator is not None:
+                try:
+                    allocator.release(seat_number, dep_stop_order, arr_stop_order)
+                except ValueError:
+                    seat_allocators.invalidate_run(train_number, start_date)
+
     @staticmethod
     def record_operation(order_id, salesperson_id, operation_type, 
-                        original_status, new_status, price=None, remarks=None):
+                        original_status, new_status, price=None, remarks=None, cursor=None):
         """记录订单操作历史
         
         Args:
@@ -572,10 +2174,13 @@ class OrderService:
             new_status (str): 新状态
             price (decimal, optional): 不再使用，保留参数以兼容旧代码
             remarks (str, optional): 备注说明
+            cursor (optional): 事务游标，提供时在该事务中写入，出错时抛出异常以回滚整个事务
 
         Returns:
             bool: 操作是否成功
         """
+        params = (order_id, salesperson_id, operation_type, 
+                  original_status, new_status, remarks)
         try:
             query = """
                 INSERT INTO OrderOperations (
@@ -590,13 +2195,14 @@ class OrderService:
                     %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s
                 )
             """
-            db.execute_query(
-                query,
-                (order_id, salesperson_id, operation_type, 
-                original_status, new_status, remarks)
-            )
+            if cursor is not None:
+                cursor.execute(query, params)
+            else:
+                db.execute_query(query, params)
             return True
         except Exception as e:
+            if cursor is not None:
+                raise
             print(f"Error recording operation: {e}")
             return False
 
@@ -672,3 +2278,99 @@ class SalespersonService:
             
         except Exception as e:
             return None, str(e)
+
+class FleetService:
+    """全线余票统计服务，基于 NumPy 余票矩阵（core.fleet_availability）"""
+
+    _matrix = None
+
+    @staticmethod
+    def get_matrix(reload=False):
+        """获取余票矩阵，首次使用时一次性从 Stopovers 批量加载
+
+        numpy 仅在此处按需导入，未安装时不影响其他功能。
+        """
+        if FleetService._matrix is None or reload:
+            from core.fleet_availability import FleetAvailabilityMatrix
+            FleetService._matrix = FleetAvailabilityMatrix.load()
+        return FleetService._matrix
+
+    @staticmethod
+    def invalidate():
+        """丢弃已加载的矩阵（列车运行增删后调用），下次使用时重新加载"""
+        FleetService._matrix = None
+
+    @staticmethod
+    def apply_booking(train_number, start_date, dep_stop_order, arr_stop_order, delta):
+        """订单批准/退票后增量更新矩阵；矩阵尚未加载时无需处理"""
+        matrix = FleetService._matrix
+        if matrix is None:
+            return
+        if not matrix.apply_booking(train_number, start_date, dep_stop_order, arr_stop_order, delta):
+            # 矩阵中没有该运行（加载后新增的列车），下次使用时重新加载
+            FleetService.invalidate()
+
+    @staticmethod
+    def get_load_report(threshold=None, reload=False):
+        """获取各列车运行的上座率概况
+
+        Args:
+            threshold (int, optional): 仅返回任一区间余票少于该值的运行
+            reload (bool): 是否重新从数据库加载矩阵
+
+        Returns:
+            tuple: (data, error_message)
+        """
+        try:
+            matrix = FleetService.get_matrix(reload)
+            summary = matrix.load_summary()
+            if threshold is not None:
+                low = {(train_number, start_date) for train_number, start_date, _ in matrix.runs_below(threshold)}
+                summary = [row for row in summary if (row[0], row[1]) in low]
+
+            data = []
+            for train_number, start_date, segments, min_seats, max_load, avg_load in summary:
+                data.append([
+                    train_number,
+                    start_date.strftime('%Y-%m-%d'),
+                    segments,
+                    min_seats,
+                    f"{max_load * 100:.1f}%" if segments else '-',
+                    f"{avg_load * 100:.1f}%" if segments else '-'
+                ])
+            return data, None
+
+        except ImportError:
+            return None, "NumPy is required for fleet availability reports"
+        except Exception as e:
+            return None, str(e)
+
+    @staticmethod
+    def get_segment_load(train_number, start_date):
+        """获取单个列车运行各区间的余票和上座率
+
+        Returns:
+            tuple: (data, error_message)，每行为 [区间序号, 余票, 上座率]
+        """
+        import datetime
+        try:
+            matrix = FleetService.get_matrix()
+            row = matrix.run_index.get((train_number, datetime.datetime.strptime(start_date, '%Y-%m-%d').date()))
+            if row is None:
+                return None, "Train run not found"
+
+            factor = matrix.load_factor_by_segment()[row]
+            data = []
+            for segment in range(matrix.valid.shape[1]):
+                if matrix.valid[row, segment]:
+                    data.append([
+                        f"{segment + 1} -> {segment + 2}",
+                        int(matrix.seats[row, segment]),
+                        f"{factor[segment] * 100:.1f}%"
+                    ])
+            return data, None
+
+        except ImportError:
+            return None, "NumPy is required for fleet availability reports"
+        except Exception as e:
+            return None, str(e)
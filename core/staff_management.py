@@ -3,7 +3,9 @@ from tkinter import ttk, Label, Entry, Button, Frame, BOTH, LEFT, X
 import datetime
 
 from db.models import Salesperson
-from core.services import SalespersonService, OrderService
+from core.services import SalespersonService, OrderService, FleetService
+from core.booking_queue import booking_queue
+from core.auto_approval import auto_approval
 
 class StaffManagementInterface:
     """员工管理界面类，处理员工登录和操作"""
@@ -162,6 +164,29 @@ class StaffManagementInterface:
             Button(self.parent, text="Staff Management", 
                 command=lambda: self.show_staff_management(staff_info), 
                 width=30).pack(pady=5)
+
+            Button(self.parent, text="Fleet Load Report", 
+                command=self.show_fleet_load_report, 
+                width=30).pack(pady=5)
+
+            Button(self.parent, text="Booking Queue Stats", 
+                command=self.show_booking_queue_stats, 
+                width=30).pack(pady=5)
+
+            def toggle_auto_approval():
+                if auto_approval.running:
+                    auto_approval.stop()
+                else:
+                    auto_approval.start()
+                auto_approval_btn.config(text=auto_approval_text())
+
+            def auto_approval_text():
+                state = "On" if auto_approval.running else "Off"
+                return f"Auto Approval: {state}"
+
+            auto_approval_btn = Button(self.parent, text=auto_approval_text(), 
+                command=toggle_auto_approval, width=30)
+            auto_approval_btn.pack(pady=5)
         
         Label(self.parent, text="Pending Orders", 
             font=("Arial", 12)).pack(pady=5)
@@ -175,6 +200,8 @@ class StaffManagementInterface:
                 is_staff_view=True,
                 staff_info=staff_info,
                 window_size="1200x400",
+                get_changes_func=OrderService.get_pending_order_changes,
+                poll_interval=5000,
             )
         
         Button(self.parent, text="View Pending Orders", 
@@ -226,18 +253,89 @@ class StaffManagementInterface:
         Button(report_window, text="Cancel", 
             command=report_window.destroy).pack(pady=5)
     
+    def show_fleet_load_report(self):
+        """显示全线各列车运行的余票和上座率"""
+        report_window = self.utils.create_modal_window("Fleet Load Report", "300x250")
+        Label(report_window, text="Fleet Load Report", font=("Arial", 14)).pack(pady=10)
+
+        # 余票阈值输入
+        Label(report_window, text="Seats below (optional):").pack()
+        threshold_entry = Entry(report_window)
+        threshold_entry.pack(pady=5)
+
+        reload_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(report_window, text="Reload from database", 
+                        variable=reload_var).pack(pady=5)
+
+        def view_report():
+            threshold = threshold_entry.get().strip()
+            if threshold and not threshold.isdigit():
+                self.utils.show_error("Error", "Threshold must be a non-negative integer")
+                return
+
+            reload = reload_var.get()
+            report_window.destroy()
+            self.display_table(
+                lambda: FleetService.get_load_report(int(threshold) if threshold else None, reload),
+                ["Train No", "Start Date", "Segments", "Min Seats", 
+                "Max Load", "Avg Load"],
+                is_staff_view=False
+            )
+
+        Button(report_window, text="View Report", 
+            command=view_report).pack(pady=10)
+        Button(report_window, text="Cancel", 
+            command=report_window.destroy).pack(pady=5)
+
+    def show_booking_queue_stats(self):
+        """显示订票队列各分片的队列深度和延迟"""
+        def get_stats():
+            rows = [
+                [stats['shard'], stats['depth'], stats['completed'], stats['failed'],
+                 f"{stats['avg_wait_ms']:.1f}", f"{stats['max_wait_ms']:.1f}",
+                 f"{stats['avg_service_ms']:.1f}", f"{stats['max_service_ms']:.1f}",
+                 f"{stats['p95_latency_ms']:.1f}"]
+                for stats in booking_queue.stats()
+            ]
+            return rows, None
+
+        self.display_table(
+            get_stats,
+            ["Shard", "Depth", "Completed", "Failed", "Avg Wait (ms)", "Max Wait (ms)",
+            "Avg Service (ms)", "Max Service (ms)", "P95 Latency (ms)"],
+            is_staff_view=False,
+            window_size="1000x300",
+        )
+
     def process_order(self, order_id, staff_id, approve=True, refresh_callback=None):
         """处理订单（批准或拒绝）"""
         action = "approve" if approve else "reject"
         if self.utils.show_confirmation("Confirm Action", 
                                       f"Are you sure you want to {action} this order?"):
-            success, message = OrderService.process_order(order_id, approve, staff_id)
-            if success:
-                self.utils.show_message("Success", message)
-                if refresh_callback:
-                    refresh_callback()  # 刷新订单列表
-            else:
-                self.utils.show_error("Error", message)
+            self.utils.when_done(
+                booking_queue.process_order(order_id, approve, staff_id),
+                lambda result: self._on_orders_processed(result, refresh_callback)
+            )
+
+    def process_orders(self, order_ids, staff_id, approve=True, refresh_callback=None):
+        """批量处理多个选中的订单（批准或拒绝）"""
+        action = "approve" if approve else "reject"
+        if self.utils.show_confirmation("Confirm Action", 
+                                      f"Are you sure you want to {action} {len(order_ids)} orders?"):
+            self.utils.when_done(
+                booking_queue.process_orders(order_ids, approve, staff_id),
+                lambda result: self._on_orders_processed(result, refresh_callback)
+            )
+
+    def _on_orders_processed(self, result, refresh_callback):
+        """订单处理完成后在主线程中显示结果并刷新订单列表"""
+        success, message = result
+        if success:
+            self.utils.show_message("Success", message)
+            if refresh_callback:
+                refresh_callback()  # 刷新订单列表
+        else:
+            self.utils.show_error("Error", message)
     
     def show_staff_management(self, manager_info):
         """显示员工管理界面"""
@@ -1,6 +1,9 @@
 import tkinter as tk
-from tkinter import Label, Entry, Button
-from core.services import TicketService, OrderService
+from tkinter import ttk, Label, Entry, Button
+import datetime
+import uuid
+from core.services import TicketService, StationService
+from core.booking_queue import booking_queue
 
 class TicketSearchInterface:
     """票务查询界面类，处理列车查询和订票"""
@@ -24,36 +27,56 @@ class TicketSearchInterface:
         self.utils.clear_frame(self.parent)
         Label(self.parent, text="Search Trains", font=("Arial", 14)).pack(pady=10)
 
-        # 出发站
+        # 出发站（支持站名、代码、拼音首字母自动补全）
         Label(self.parent, text="Departure Station:").pack()
-        dep_station_entry = Entry(self.parent)
-        dep_station_entry.insert(0, "北京")
-        dep_station_entry.pack(pady=5)
+        dep_station_entry = self.create_station_combobox("北京")
 
         # 到达站
         Label(self.parent, text="Arrival Station:").pack()
-        arr_station_entry = Entry(self.parent)
-        arr_station_entry.insert(0, "上海")
-        arr_station_entry.pack(pady=5)
+        arr_station_entry = self.create_station_combobox("上海")
 
         # 出发日期
         Label(self.parent, text="Departure Date (YYYY-MM-DD):").pack()
         date_entry = Entry(self.parent)
         date_entry.pack(pady=5)
+
+        # 排序方式和返回数量
+        rank_frame = tk.Frame(self.parent)
+        rank_frame.pack(pady=5)
+        Label(rank_frame, text="Sort by:").pack(side=tk.LEFT)
+        sort_combobox = ttk.Combobox(rank_frame, values=list(TicketService.SORT_MODES),
+                                     state="readonly", width=10)
+        sort_combobox.set("departure")
+        sort_combobox.pack(side=tk.LEFT, padx=5)
+        Label(rank_frame, text="Top K:").pack(side=tk.LEFT)
+        limit_entry = Entry(rank_frame, width=5)
+        limit_entry.pack(side=tk.LEFT, padx=5)
         
         def search_trains():
             dep_station = dep_station_entry.get()
             arr_station = arr_station_entry.get()
             departure_date = date_entry.get()
+            sort_by = sort_combobox.get()
+            limit = limit_entry.get().strip()
+
+            if not self.validate_stations(dep_station, arr_station):
+                return
 
             # 验证日期格式
             if not self.utils.validate_date(departure_date):
                 self.utils.show_error("Error", "Invalid date format. Please use YYYY-MM-DD format")
                 return
+
+            if limit and (not limit.isdigit() or int(limit) <= 0):
+                self.utils.show_error("Error", "Top K must be a positive integer")
+                return
             
+            # 未指定日期时按日期分区并行查询
             self.display_table(
                 lambda: TicketService.search_available_tickets(
-                    dep_station, arr_station, departure_date
+                    dep_station, arr_station, departure_date,
+                    sort_by=sort_by, limit=int(limit) if limit else None,
+                    parallel=not departure_date
                 ),
                 ["Train No", "Start Date", "From", "Departure Time", "To", "Arrival Time", 
                 "Price", "Seats", "Type"],
@@ -64,14 +87,79 @@ class TicketSearchInterface:
         Button(self.parent, text="Search", 
             command=search_trains).pack(pady=10)
 
+        # 日历视图：查询连续多天的余票概况
+        Label(self.parent, text="Days (calendar view):").pack()
+        days_entry = Entry(self.parent)
+        days_entry.insert(0, "7")
+        days_entry.pack(pady=5)
+
+        def show_calendar():
+            dep_station = dep_station_entry.get()
+            arr_station = arr_station_entry.get()
+            start_date = date_entry.get().strip() or datetime.date.today().strftime('%Y-%m-%d')
+            days = days_entry.get().strip()
+
+            if not self.validate_stations(dep_station, arr_station):
+                return
+
+            if not self.utils.validate_date(start_date):
+                self.utils.show_error("Error", "Invalid date format. Please use YYYY-MM-DD format")
+                return
+
+            if not days.isdigit() or int(days) <= 0:
+                self.utils.show_error("Error", "Days must be a positive integer")
+                return
+
+            self.display_table(
+                lambda: TicketService.search_calendar(
+                    dep_station, arr_station, start_date, int(days)
+                ),
+                ["Date", "Available Trains", "Train Numbers", "Min Price",
+                "Max Seats", "Earliest Departure"],
+                window_size="900x400",
+            )
+
+        Button(self.parent, text="Calendar View", 
+            command=show_calendar).pack(pady=5)
+
         Button(self.parent, text="Back to Main Menu", 
             command=self.show_main_menu).pack(pady=20)
     
+    def create_station_combobox(self, default_value):
+        """创建带自动补全的车站输入框"""
+        combobox = ttk.Combobox(self.parent)
+        combobox.insert(0, default_value)
+        combobox.pack(pady=5)
+
+        def on_key_release(event):
+            # 方向键和回车用于在下拉列表中选择，不刷新候选
+            if event.keysym in ("Up", "Down", "Return", "Escape"):
+                return
+            combobox['values'] = StationService.suggest_stations(combobox.get())
+
+        combobox.bind("<KeyRelease>", on_key_release)
+        return combobox
+
+    def validate_stations(self, dep_station, arr_station):
+        """在查询前通过车站索引校验站名，避免无效站名访问数据库"""
+        for label, text in (("Departure", dep_station), ("Arrival", arr_station)):
+            if StationService.resolve_station(text):
+                continue
+            suggestions = StationService.suggest_stations(text, limit=5)
+            message = f"{label} station '{text}' not found."
+            if suggestions:
+                message += f" Did you mean: {', '.join(suggestions)}?"
+            if not StationService.pinyin_search_available():
+                message += " Pinyin search is unavailable because pypinyin is not installed."
+            self.utils.show_error("Error", message)
+            return False
+        return True
+    
     def create_booking_window(self, train_info, name, id_card):
         """创建订票窗口"""
         booking_window = self.utils.create_modal_window(
             "Book Ticket",
-            "500x350"
+            "500x480"
         )
         
         # 显示选中的车次信息 - 修正索引以匹配 TicketService.search_available_tickets 返回的数据结构
@@ -80,29 +168,70 @@ class TicketSearchInterface:
         Label(booking_window, text=f"From: {train_info[2]} -> To: {train_info[4]}", font=("Arial", 12)).pack(pady=5)
         Label(booking_window, text=f"Departure: {train_info[3]} -> Arrival: {train_info[5]}", font=("Arial", 12)).pack(pady=5)
         Label(booking_window, text=f"Price: ¥{train_info[6]}", font=("Arial", 12)).pack(pady=5)
+
+        # 同行乘客（团体订票），每行一位："姓名, 身份证号"
+        Label(booking_window, text="Travelling with (one 'Name, ID Card' per line, optional):").pack(pady=5)
+        companions_text = tk.Text(booking_window, height=4, width=50)
+        companions_text.pack(pady=5)
+
+        # 同一个订票窗口内的重复提交（如超时后重试）使用同一个幂等键，不会重复下单
+        idempotency_key = uuid.uuid4().hex
         
         def confirm_booking():
             if not name or not id_card:
                 self.utils.show_error("Error", "Please fill in all fields")
                 return
-                
-            success, message = OrderService.create_order(
-                train_info[0],  # train_number
-                train_info[1],  # start_date 
-                train_info[2],  # departure_station
-                train_info[4],  # arrival_station
-                train_info[6],  # price
-                name,
-                id_card
-            )
-            
+
+            companions = []
+            for line in companions_text.get("1.0", tk.END).splitlines():
+                if not line.strip():
+                    continue
+                parts = [part.strip() for part in line.split(",")]
+                if len(parts) != 2 or not all(parts):
+                    self.utils.show_error("Error", f"Invalid passenger line: {line.strip()}")
+                    return
+                companions.append(tuple(parts))
+
+            # 按列车运行排队，同一运行的订票请求串行执行；等待结果时不阻塞界面
+            if companions:
+                future = booking_queue.create_group_order(
+                    train_info[0],  # train_number
+                    train_info[1],  # start_date
+                    train_info[2],  # departure_station
+                    train_info[4],  # arrival_station
+                    train_info[6],  # price
+                    [(name, id_card)] + companions,
+                    idempotency_key=idempotency_key
+                )
+            else:
+                future = booking_queue.create_order(
+                    train_info[0],  # train_number
+                    train_info[1],  # start_date 
+                    train_info[2],  # departure_station
+                    train_info[4],  # arrival_station
+                    train_info[6],  # price
+                    name,
+                    id_card,
+                    idempotency_key=idempotency_key
+                )
+            confirm_button['state'] = 'disabled'
+            self.utils.when_done(future, on_booked)
+
+        def on_booked(result):
+            # 等待期间订票窗口可能已被关闭，结果仍然显示
+            success, message = result
+            window_open = booking_window.winfo_exists()
             if success:
+                if window_open:
+                    booking_window.destroy()
                 self.utils.show_message("Success", message)
-                booking_window.destroy()
             else:
+                if window_open:
+                    confirm_button['state'] = 'normal'
                 self.utils.show_error("Error", message)
         
-        Button(booking_window, text="Confirm Booking", 
-            command=confirm_booking).pack(pady=20)
+        confirm_button = Button(booking_window, text="Confirm Booking", 
+            command=confirm_booking)
+        confirm_button.pack(pady=20)
         Button(booking_window, text="Cancel", 
             command=booking_window.destroy).pack(pady=5)
\ No newline at end of file
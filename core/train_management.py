@@ -3,7 +3,7 @@ from tkinter import ttk, Label, Entry, Button, Frame, BOTH, LEFT, X
 import datetime
 
 from db.models import Train, Station, Price
-from core.services import TrainService, SalespersonService
+from core.services import TrainService, SalespersonService, FleetService
 
 class TrainManagementInterface:
     """列车管理界面类，封装列车管理相关功能"""
@@ -212,6 +212,7 @@ class TrainManagementInterface:
                     # 删除列车
                     success = Train.delete({"train_number": train_number})
                     if success:
+                        FleetService.invalidate()
                         tree.delete(item)
                         self.utils['show_message']("Success", f"Train {train_number} has been deleted")
                     else:
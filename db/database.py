@@ -1,13 +1,25 @@
 # database.py
 
+import threading
+import time
+from contextlib import contextmanager
+
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
+from mysql.connector.errors import PoolError
 # Using a relative import here to avoid potential circular imports
 from .db_config import DB_CONFIG
 
+# 连接池大小，供并行查询使用；主连接 self.connection 不属于连接池
+POOL_SIZE = 5
+# 连接池耗尽时等待空闲连接的最长时间（秒）
+POOL_WAIT_TIMEOUT = 5
+
 class Database:
     def __init__(self):
         self.connection = None
+        self.pool = None
+        self._pool_lock = threading.Lock()
         self.connect()
 
     def connect(self):
@@ -19,6 +31,87 @@ class Database:
             print(f"Error connecting to MySQL database: {e}")
             self.connection = None # Ensure connection is None if failed
 
+    def get_pool(self):
+        """获取连接池，首次使用时创建
+        
+        主连接不是线程安全的，需要在多个线程中并发查询时应从连接池获取连接。
+        """
+        with self._pool_lock:
+            if self.pool is None:
+                self.pool = pooling.MySQLConnectionPool(
+                    pool_name="train_ticket_pool",
+                    pool_size=POOL_SIZE,
+                    **DB_CONFIG
+                )
+        return self.pool
+
+    def get_pooled_connection(self):
+        """从连接池获取连接，连接池耗尽时等待其他线程归还
+        
+        Raises:
+            Error: 创建连接失败，或等待超过 POOL_WAIT_TIMEOUT 秒
+        """
+        deadline = time.monotonic() + POOL_WAIT_TIMEOUT
+        while True:
+            try:
+                return self.get_pool().get_connection()
+            except PoolError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.01)
+
+    @contextmanager
+    def transaction(self):
+        """在连接池的连接上执行一个事务
+        
+        用法:
+            with db.transaction() as cursor:
+                cursor.execute(...)
+        
+        正常退出时提交，发生任何异常时回滚并重新抛出。
+        """
+        connection = self.get_pooled_connection()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            connection.start_transaction()
+            yield cursor
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()  # 归还到连接池
+
+    def execute_pooled_query(self, query, params=None, fetch_one=False, fetch_all=False):
+        """在连接池的连接上执行查询，可在多个线程中同时调用
+        
+        参数和返回值与 execute_query 相同。
+        """
+        try:
+            connection = self.get_pooled_connection()
+        except Error as e:
+            print(f"Error getting pooled connection: {e}")
+            return None
+
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params)
+            if fetch_one:
+                return cursor.fetchone()
+            elif fetch_all:
+                return cursor.fetchall()
+            else:
+                connection.commit()
+                return cursor.rowcount
+        except Error as e:
+            connection.rollback()
+            print(f"Database query error: {e}")
+            return None
+        finally:
+            cursor.close()
+            connection.close()  # 归还到连接池
+
     def close(self):
         if self.connection and self.connection.is_connected():
             self.connection.close()
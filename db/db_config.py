@@ -6,4 +6,7 @@ DB_CONFIG = {
     'password': '123456', # <<< IMPORTANT: Change this
     'database': 'train_ticket_system', # <<< IMPORTANT: Change this if your DB name is different
     'port': 3306 # Default MySQL port
-}
\ No newline at end of file
+}
+
+# Salesperson the auto approval engine acts as; its password is not a valid hash, so it cannot log in
+SYSTEM_SALESPERSON_ID = "SYSTEM"
@@ -0,0 +1,1133 @@
+# db_migrations.py
+
+import mysql.connector
+from mysql.connector import Error
+from db.db_config import DB_CONFIG, SYSTEM_SALESPERSON_ID
+
+# 可以安全忽略的错误码，保证迁移可重复执行：
+# 1050 表已存在, 1060 列已存在, 1061 索引已存在, 1091 索引/列不存在
+IGNORABLE_ERRORS = (1050, 1060, 1061, 1091)
+
+# 0007 迁移分区的表：(表名, 分区列, 主键列)
+PARTITIONED_TABLES_0007 = [
+    ('Stopovers', 'start_date', ('stopover_id', 'start_date')),
+    ('SalesOrders', 'start_date', ('order_id', 'start_date')),
+    ('OrderOperations', 'operation_time', ('operation_id', 'operation_time')),
+]
+
+def partition_tables(cursor):
+    """将 PARTITIONED_TABLES_0007 中的表改为按月范围分区
+
+    分区表不支持外键，因此先删除这些表上及指向这些表的外键（级联删除改由触发器完成），
+    主键改为包含分区列的复合主键，再按现有数据最早的月份到当前月份建立月分区，
+    之后的月份由 sp_maintain_partitions 从 pmax 中拆分。已分区的表直接跳过。
+    """
+    import datetime
+
+    tables = [table for table, _, _ in PARTITIONED_TABLES_0007]
+    placeholders = ", ".join(["%s"] * len(tables))
+    cursor.execute(f"""
+        SELECT DISTINCT TABLE_NAME, CONSTRAINT_NAME
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE()
+        AND REFERENCED_TABLE_NAME IS NOT NULL
+        AND (TABLE_NAME IN ({placeholders}) OR REFERENCED_TABLE_NAME IN ({placeholders}))
+    """, tables + tables)
+    for table, constraint in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE `{table}` DROP FOREIGN KEY `{constraint}`")
+
+    this_month = datetime.date.today().replace(day=1)
+    for table, column, primary_key in PARTITIONED_TABLES_0007:
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        """, (table,))
+        if cursor.fetchone()[0]:
+            continue
+
+        key_columns = ", ".join(f"`{name}`" for name in primary_key)
+        cursor.execute(f"ALTER TABLE `{table}` DROP PRIMARY KEY, ADD PRIMARY KEY ({key_columns})")
+
+        cursor.execute(f"SELECT MIN(`{column}`) FROM `{table}`")
+        oldest = cursor.fetchone()[0]
+        month = oldest.replace(day=1) if oldest else this_month
+        if isinstance(month, datetime.datetime):
+            month = month.date()
+        month = min(month, this_month)
+
+        partitions = []
+        while month <= this_month:
+            next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+            partitions.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{next_month}')")
+            month = next_month
+        partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+        cursor.execute(
+            f"ALTER TABLE `{table}` PARTITION BY RANGE COLUMNS (`{column}`) ({', '.join(partitions)})"
+        )
+
+def create_system_salesperson(cursor):
+    """创建（或保留已有的）自动审批引擎使用的系统乘务员记录
+
+    密码字段不是有效的哈希值，因此无法登录。
+    """
+    cursor.execute(
+        """
+        INSERT IGNORE INTO `Salespersons`
+            (`salesperson_id`, `salesperson_name`, `contact_number`, `email`, `password`, `role`)
+        VALUES (%s, 'Auto Approval', '-', 'system@localhost', '!', 'Salesperson')
+        """,
+        (SYSTEM_SALESPERSON_ID,)
+    )
+
+def backfill_order_stop_orders(cursor):
+    """根据 Stopovers 填写尚未记录出发站、到达站顺序的订单"""
+    cursor.execute(
+        """
+        UPDATE `SalesOrders` so
+        JOIN `Stopovers` dep ON dep.train_number = so.train_number
+            AND dep.start_date = so.start_date
+            AND dep.station_id = so.departure_station_id
+        JOIN `Stopovers` arr ON arr.train_number = so.train_number
+            AND arr.start_date = so.start_date
+            AND arr.station_id = so.arrival_station_id
+        SET so.dep_stop_order = dep.stop_order, so.arr_stop_order = arr.stop_order
+        WHERE so.dep_stop_order IS NULL
+        """
+    )
+
+# 迁移列表：(版本号, 说明, 步骤列表)，按顺序执行，已执行的版本记录在 SchemaMigrations 表中。
+# 步骤可以是SQL语句，也可以是接收游标的函数（用于需要读取现有数据或结构的步骤）。
+# 表、触发器、存储过程和事件的定义按迁移编写时的版本写在步骤中，不引用 db_setup 的当前定义，
+# 同一个迁移无论何时执行结果都相同；之后修改 db_setup 中的定义时需要新增迁移写入新的定义。
+MIGRATIONS = [
+    (
+        "0001_search_composite_indexes",
+        "Composite indexes for ticket search",
+        [
+            "CREATE INDEX idx_stopovers_station_date ON `Stopovers` (`station_id`, `start_date`, `train_number`, `stop_order`)",
+            "CREATE INDEX idx_stopovers_station_departure ON `Stopovers` (`station_id`, `departure_time`, `train_number`, `start_date`, `stop_order`)",
+            "CREATE INDEX idx_stopovers_run_order ON `Stopovers` (`train_number`, `start_date`, `stop_order`, `seats`)",
+            # 已被 idx_stopovers_station_date 的前缀覆盖
+            "DROP INDEX idx_stopovers_station_id ON `Stopovers`"
+        ]
+    ),
+    (
+        "0002_od_availability",
+        "Materialized origin-destination availability",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS `OdAvailability` (
+                `train_number` VARCHAR(10) NOT NULL,
+                `start_date` DATE NOT NULL,
+                `departure_station_id` INT NOT NULL,
+                `arrival_station_id` INT NOT NULL,
+                `dep_stop_order` INT NOT NULL,
+                `arr_stop_order` INT NOT NULL,
+                `departure_time` DATETIME NULL,
+                `arrival_time` DATETIME NULL,
+                `price` DECIMAL(10, 2) NOT NULL,
+                `min_seats` INT NOT NULL,
+                PRIMARY KEY (`train_number`, `start_date`, `departure_station_id`, `arrival_station_id`),
+                INDEX `idx_od_lookup` (`departure_station_id`, `arrival_station_id`, `departure_time`),
+                FOREIGN KEY (`train_number`) REFERENCES `Trains`(`train_number`) ON DELETE CASCADE
+            );
+            """,
+            """
+            DROP PROCEDURE IF EXISTS sp_insert_od_pair;
+            """,
+            """
+            CREATE PROCEDURE sp_insert_od_pair(
+                IN p_train_number VARCHAR(10),
+                IN p_departure_station_id INT,
+                IN p_arrival_station_id INT,
+                IN p_price DECIMAL(10, 2)
+            )
+            BEGIN
+                -- Materialize one priced station pair for every run of the train
+                INSERT INTO OdAvailability (
+                    train_number, start_date,
+                    departure_station_id, arrival_station_id,
+                    dep_stop_order, arr_stop_order,
+                    departure_time, arrival_time,
+                    price, min_seats
+                )
+                SELECT 
+                    s1.train_number,
+                    s1.start_date,
+                    s1.station_id,
+                    s2.station_id,
+                    s1.stop_order,
+                    s2.stop_order,
+                    s1.departure_time,
+                    s2.arrival_time,
+                    p_price,
+                    (
+                        SELECT MIN(s3.seats)
+                        FROM Stopovers s3
+                        WHERE s3.train_number = s1.train_number
+                        AND s3.start_date = s1.start_date
+                        AND s3.stop_order >= s1.stop_order
+                        AND s3.stop_order < s2.stop_order
+                    )
+                FROM 
+                    Stopovers s1
+                    JOIN Stopovers s2 ON s1.train_number = s2.train_number AND s1.start_date = s2.start_date
+                WHERE 
+                    s1.train_number = p_train_number
+                    AND s1.station_id = p_departure_station_id
+                    AND s2.station_id = p_arrival_station_id
+                    AND s1.stop_order < s2.stop_order
+                ON DUPLICATE KEY UPDATE
+                    price = VALUES(price),
+                    min_seats = VALUES(min_seats);
+            END;
+            """,
+            """
+            DROP PROCEDURE IF EXISTS sp_refresh_od_availability;
+            """,
+            """
+            CREATE PROCEDURE sp_refresh_od_availability(IN p_train_number VARCHAR(10))
+            BEGIN
+                -- Full rebuild (one train, or every train when NULL), used for backfills
+                -- and after bulk Stopovers loads
+                DELETE FROM OdAvailability
+                WHERE p_train_number IS NULL OR train_number = p_train_number;
+
+                INSERT INTO OdAvailability (
+                    train_number, start_date,
+                    departure_station_id, arrival_station_id,
+                    dep_stop_order, arr_stop_order,
+                    departure_time, arrival_time,
+                    price, min_seats
+                )
+                SELECT 
+                    s1.train_number,
+                    s1.start_date,
+                    s1.station_id,
+                    s2.station_id,
+                    s1.stop_order,
+                    s2.stop_order,
+                    s1.departure_time,
+                    s2.arrival_time,
+                    p.price,
+                    MIN(s3.seats)
+                FROM 
+                    Stopovers s1
+                    JOIN Stopovers s2 ON s1.train_number = s2.train_number AND s1.start_date = s2.start_date
+                    JOIN Stopovers s3 ON s1.train_number = s3.train_number AND s1.start_date = s3.start_date
+                    JOIN Prices p ON s1.train_number = p.train_number 
+                        AND s1.station_id = p.departure_station_id
+                        AND s2.station_id = p.arrival_station_id
+                WHERE 
+                    (p_train_number IS NULL OR s1.train_number = p_train_number)
+                    AND s1.stop_order < s2.stop_order
+                    AND s3.stop_order >= s1.stop_order
+                    AND s3.stop_order < s2.stop_order
+                GROUP BY
+                    s1.train_number, s1.start_date, s1.station_id, s2.station_id,
+                    s1.stop_order, s2.stop_order, s1.departure_time, s2.arrival_time, p.price;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS after_stopover_seats_update;
+            """,
+            """
+            CREATE TRIGGER after_stopover_seats_update
+            AFTER UPDATE ON `Stopovers`
+            FOR EACH ROW
+            BEGIN
+                -- Keep OdAvailability.min_seats in step with the segment that changed
+                IF NEW.seats < OLD.seats THEN
+                    UPDATE OdAvailability od
+                    SET od.min_seats = LEAST(od.min_seats, NEW.seats)
+                    WHERE od.train_number = NEW.train_number
+                    AND od.start_date = NEW.start_date
+                    AND od.dep_stop_order <= NEW.stop_order
+                    AND od.arr_stop_order > NEW.stop_order;
+                ELSEIF NEW.seats > OLD.seats THEN
+                    -- Only pairs whose minimum was this segment can change
+                    UPDATE OdAvailability od
+                    SET od.min_seats = (
+                        SELECT MIN(s.seats)
+                        FROM Stopovers s
+                        WHERE s.train_number = od.train_number
+                        AND s.start_date = od.start_date
+                        AND s.stop_order >= od.dep_stop_order
+                        AND s.stop_order < od.arr_stop_order
+                    )
+                    WHERE od.train_number = NEW.train_number
+                    AND od.start_date = NEW.start_date
+                    AND od.dep_stop_order <= NEW.stop_order
+                    AND od.arr_stop_order > NEW.stop_order
+                    AND od.min_seats = OLD.seats;
+                END IF;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS after_price_insert;
+            """,
+            """
+            CREATE TRIGGER after_price_insert
+            AFTER INSERT ON `Prices`
+            FOR EACH ROW
+            BEGIN
+                CALL sp_insert_od_pair(NEW.train_number, NEW.departure_station_id,
+                                       NEW.arrival_station_id, NEW.price);
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS after_price_update;
+            """,
+            """
+            CREATE TRIGGER after_price_update
+            AFTER UPDATE ON `Prices`
+            FOR EACH ROW
+            BEGIN
+                IF NEW.train_number = OLD.train_number
+                    AND NEW.departure_station_id = OLD.departure_station_id
+                    AND NEW.arrival_station_id = OLD.arrival_station_id THEN
+                    UPDATE OdAvailability
+                    SET price = NEW.price
+                    WHERE train_number = NEW.train_number
+                    AND departure_station_id = NEW.departure_station_id
+                    AND arrival_station_id = NEW.arrival_station_id;
+                ELSE
+                    DELETE FROM OdAvailability
+                    WHERE train_number = OLD.train_number
+                    AND departure_station_id = OLD.departure_station_id
+                    AND arrival_station_id = OLD.arrival_station_id;
+
+                    CALL sp_insert_od_pair(NEW.train_number, NEW.departure_station_id,
+                                           NEW.arrival_station_id, NEW.price);
+                END IF;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS after_price_delete;
+            """,
+            """
+            CREATE TRIGGER after_price_delete
+            AFTER DELETE ON `Prices`
+            FOR EACH ROW
+            BEGIN
+                DELETE FROM OdAvailability
+                WHERE train_number = OLD.train_number
+                AND departure_station_id = OLD.departure_station_id
+                AND arrival_station_id = OLD.arrival_station_id;
+            END;
+            """,
+            "CALL sp_refresh_od_availability(NULL)"
+        ]
+    ),
+    (
+        "0003_station_board_index",
+        "Arrival board index; departure board uses idx_stopovers_station_departure",
+        [
+            "CREATE INDEX idx_stopovers_station_arrival ON `Stopovers` (`station_id`, `arrival_time`)"
+        ]
+    ),
+    (
+        "0004_atomic_order_approval",
+        "Seat decrement moves from after_order_success into the approval transaction",
+        [
+            "DROP TRIGGER IF EXISTS after_order_success"
+        ]
+    ),
+    (
+        "0005_seat_holds",
+        "Time-limited seat holds created at booking",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS `SeatHolds` (
+                `hold_id` BIGINT PRIMARY KEY AUTO_INCREMENT,
+                `order_id` VARCHAR(20) NOT NULL UNIQUE,
+                `train_number` VARCHAR(10) NOT NULL,
+                `start_date` DATE NOT NULL,
+                `dep_stop_order` INT NOT NULL,
+                `arr_stop_order` INT NOT NULL,
+                `expires_at` DATETIME NOT NULL,
+                INDEX `idx_seat_holds_expires` (`expires_at`),
+                FOREIGN KEY (`order_id`) REFERENCES `SalesOrders`(`order_id`) ON DELETE CASCADE
+            );
+            """
+        ]
+    ),
+    (
+        "0006_seat_numbers",
+        "Seat number assigned by the per-seat segment allocator",
+        [
+            "ALTER TABLE `SalesOrders` ADD COLUMN `seat_number` INT NULL AFTER `status`"
+        ]
+    ),
+    (
+        "0007_monthly_partitions",
+        "Range-partition Stopovers, SalesOrders and OrderOperations by month; cascades move to triggers",
+        [
+            partition_tables,
+            "CREATE INDEX idx_orders_customer ON `SalesOrders` (`customer_id`)",
+            "CREATE INDEX idx_orders_departure_station ON `SalesOrders` (`departure_station_id`)",
+            "CREATE INDEX idx_orders_arrival_station ON `SalesOrders` (`arrival_station_id`)",
+            "CREATE INDEX idx_order_operations_order ON `OrderOperations` (`order_id`)",
+            "CREATE INDEX idx_order_operations_salesperson ON `OrderOperations` (`salesperson_id`, `operation_time`)",
+            """
+            DROP TRIGGER IF EXISTS before_train_delete;
+            """,
+            """
+            CREATE TRIGGER before_train_delete
+            BEFORE DELETE ON `Trains`
+            FOR EACH ROW
+            BEGIN
+                -- Update all orders for this train that are Success or RefundPending to Refunded
+                -- Only affect future trips (start_date greater than current date)
+                UPDATE SalesOrders
+                SET status = 'Refunded', operation_type = 'Refund'
+                WHERE train_number = OLD.train_number
+                AND status IN ('Success', 'RefundPending')
+                AND start_date > CURDATE();
+
+                -- Partitioned tables have no foreign keys, so the former ON DELETE CASCADE is done here
+                DELETE FROM SalesOrders WHERE train_number = OLD.train_number;
+                DELETE FROM Stopovers WHERE train_number = OLD.train_number;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS before_order_delete;
+            """,
+            """
+            CREATE TRIGGER before_order_delete
+            BEFORE DELETE ON `SalesOrders`
+            FOR EACH ROW
+            BEGIN
+                DELETE FROM OrderOperations WHERE order_id = OLD.order_id;
+                DELETE FROM SeatHolds WHERE order_id = OLD.order_id;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS before_station_delete;
+            """,
+            """
+            CREATE TRIGGER before_station_delete
+            BEFORE DELETE ON `Stations`
+            FOR EACH ROW
+            BEGIN
+                -- Stopovers.station_id used to be a restricting foreign key
+                IF EXISTS (SELECT 1 FROM Stopovers WHERE station_id = OLD.station_id) THEN
+                    SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Station is still used by stopovers';
+                END IF;
+
+                DELETE FROM SalesOrders
+                WHERE departure_station_id = OLD.station_id
+                OR arrival_station_id = OLD.station_id;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS before_customer_delete;
+            """,
+            """
+            CREATE TRIGGER before_customer_delete
+            BEFORE DELETE ON `Customers`
+            FOR EACH ROW
+            BEGIN
+                DELETE FROM SalesOrders WHERE customer_id = OLD.id_card;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS before_salesperson_delete;
+            """,
+            """
+            CREATE TRIGGER before_salesperson_delete
+            BEFORE DELETE ON `Salespersons`
+            FOR EACH ROW
+            BEGIN
+                DELETE FROM OrderOperations WHERE salesperson_id = OLD.salesperson_id;
+            END;
+            """,
+            """
+            DROP PROCEDURE IF EXISTS sp_daily_sales_report;
+            """,
+            """
+            CREATE PROCEDURE sp_daily_sales_report(IN report_date DATE)
+            BEGIN
+                SELECT 
+                    s.salesperson_id,
+                    s.salesperson_name,
+                    COUNT(DISTINCT o.order_id) as total_orders,
+                    SUM(CASE 
+                        WHEN o.operation_type = 'Booking' AND o.status = 'Success' 
+                        THEN o.price 
+                        ELSE 0 
+                    END) as booking_revenue,
+                    SUM(CASE 
+                        WHEN o.operation_type = 'Refund' AND o.status = 'Refunded' 
+                        THEN o.price 
+                        ELSE 0 
+                    END) as refund_amount
+                FROM 
+                    Salespersons s
+                    LEFT JOIN OrderOperations op ON s.salesperson_id = op.salesperson_id
+                    LEFT JOIN SalesOrders o ON op.order_id = o.order_id
+                WHERE 
+                    op.operation_time >= report_date
+                    AND op.operation_time < report_date + INTERVAL 1 DAY
+                    AND op.operation_type = 'Approve'
+                    AND o.status IN ('Success', 'Refunded')
+                GROUP BY 
+                    s.salesperson_id, s.salesperson_name
+                ORDER BY 
+                    (booking_revenue + refund_amount) DESC;
+            END;
+            """,
+            """
+            DROP PROCEDURE IF EXISTS sp_daily_staff_report;
+            """,
+            """
+            CREATE PROCEDURE sp_daily_staff_report(
+                IN report_date DATE,
+                IN staff_id VARCHAR(10)
+            )
+            BEGIN
+                SELECT 
+                    s.salesperson_id,
+                    s.salesperson_name,
+                    COUNT(DISTINCT o.order_id) as total_orders,
+                    SUM(CASE 
+                        WHEN o.operation_type = 'Booking' AND o.status = 'Success' 
+                        THEN o.price 
+                        ELSE 0 
+                    END) as booking_revenue,
+                    SUM(CASE 
+                        WHEN o.operation_type = 'Refund' AND o.status = 'Refunded' 
+                        THEN o.price 
+                        ELSE 0 
+                    END) as refund_amount
+                FROM 
+                    Salespersons s
+                    LEFT JOIN OrderOperations op ON s.salesperson_id = op.salesperson_id
+                    LEFT JOIN SalesOrders o ON op.order_id = o.order_id
+                WHERE 
+                    op.operation_time >= report_date
+                    AND op.operation_time < report_date + INTERVAL 1 DAY
+                    AND op.operation_type = 'Approve'
+                    AND o.status IN ('Success', 'Refunded')
+                    AND s.salesperson_id = staff_id
+                GROUP BY 
+                    s.salesperson_id, s.salesperson_name;
+            END;
+            """,
+            """
+            DROP PROCEDURE IF EXISTS sp_maintain_table_partitions;
+            """,
+            """
+            CREATE PROCEDURE sp_maintain_table_partitions(
+                IN p_table VARCHAR(64),
+                IN p_months_ahead INT,
+                IN p_retention_months INT
+            )
+            BEGIN
+                -- Monthly partitions are named pYYYYMM and hold rows before the first day of the next month;
+                -- pmax catches everything beyond the last monthly partition
+                DECLARE v_last VARCHAR(64);
+                DECLARE v_month DATE;
+                DECLARE v_until DATE;
+                DECLARE v_cutoff VARCHAR(64);
+
+                SELECT MAX(PARTITION_NAME) INTO v_last
+                FROM information_schema.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = p_table
+                AND PARTITION_NAME <> 'pmax';
+
+                IF v_last IS NULL THEN
+                    SET v_month = CAST(DATE_FORMAT(CURDATE(), '%Y-%m-01') AS DATE);
+                ELSE
+                    SET v_month = STR_TO_DATE(CONCAT(SUBSTRING(v_last, 2), '01'), '%Y%m%d') + INTERVAL 1 MONTH;
+                END IF;
+                SET v_until = CAST(DATE_FORMAT(CURDATE(), '%Y-%m-01') AS DATE) + INTERVAL p_months_ahead MONTH;
+
+                -- Split new months off pmax
+                WHILE v_month <= v_until DO
+                    SET @partition_sql = CONCAT(
+                        'ALTER TABLE `', p_table, '` REORGANIZE PARTITION pmax INTO (',
+                        'PARTITION p', DATE_FORMAT(v_month, '%Y%m'),
+                        ' VALUES LESS THAN (''', v_month + INTERVAL 1 MONTH, '''), ',
+                        'PARTITION pmax VALUES LESS THAN (MAXVALUE))'
+                    );
+                    PREPARE stmt FROM @partition_sql;
+                    EXECUTE stmt;
+                    DEALLOCATE PREPARE stmt;
+                    SET v_month = v_month + INTERVAL 1 MONTH;
+                END WHILE;
+
+                -- Drop months older than the retention window
+                IF p_retention_months IS NOT NULL THEN
+                    SET v_cutoff = CONCAT('p', DATE_FORMAT(CURDATE() - INTERVAL p_retention_months MONTH, '%Y%m'));
+                    SET v_last = NULL;
+                    SELECT MIN(PARTITION_NAME) INTO v_last
+                    FROM information_schema.PARTITIONS
+                    WHERE TABLE_SCHEMA = DATABASE()
+                    AND TABLE_NAME = p_table
+                    AND PARTITION_NAME <> 'pmax'
+                    AND PARTITION_NAME < v_cutoff;
+
+                    WHILE v_last IS NOT NULL DO
+                        SET @partition_sql = CONCAT('ALTER TABLE `', p_table, '` DROP PARTITION ', v_last);
+                        PREPARE stmt FROM @partition_sql;
+                        EXECUTE stmt;
+                        DEALLOCATE PREPARE stmt;
+
+                        SET v_last = NULL;
+                        SELECT MIN(PARTITION_NAME) INTO v_last
+                        FROM information_schema.PARTITIONS
+                        WHERE TABLE_SCHEMA = DATABASE()
+                        AND TABLE_NAME = p_table
+                        AND PARTITION_NAME <> 'pmax'
+                        AND PARTITION_NAME < v_cutoff;
+                    END WHILE;
+                END IF;
+            END;
+            """,
+            """
+            DROP PROCEDURE IF EXISTS sp_maintain_partitions;
+            """,
+            """
+            CREATE PROCEDURE sp_maintain_partitions(
+                IN p_months_ahead INT,
+                IN p_retention_months INT
+            )
+            BEGIN
+                CALL sp_maintain_table_partitions('Stopovers', p_months_ahead, p_retention_months);
+                CALL sp_maintain_table_partitions('SalesOrders', p_months_ahead, p_retention_months);
+                CALL sp_maintain_table_partitions('OrderOperations', p_months_ahead, p_retention_months);
+
+                -- Dropping partitions skips the delete triggers, so clean up rows derived from the dropped runs
+                IF p_retention_months IS NOT NULL THEN
+                    DELETE FROM OdAvailability
+                    WHERE start_date < CAST(DATE_FORMAT(CURDATE() - INTERVAL p_retention_months MONTH, '%Y-%m-01') AS DATE);
+                    DELETE FROM SeatHolds
+                    WHERE start_date < CAST(DATE_FORMAT(CURDATE() - INTERVAL p_retention_months MONTH, '%Y-%m-01') AS DATE);
+                END IF;
+            END;
+            """,
+            """
+            DROP EVENT IF EXISTS ev_maintain_partitions;
+            """,
+            """
+            CREATE EVENT ev_maintain_partitions
+            ON SCHEDULE EVERY 1 DAY
+            STARTS CURRENT_DATE + INTERVAL 1 DAY + INTERVAL 3 HOUR
+            DO CALL sp_maintain_partitions(3, 24);
+            """,
+            "CALL sp_maintain_partitions(3, NULL)"
+        ]
+    ),
+    (
+        "0008_order_version",
+        "Version column for compare-and-swap order status updates",
+        [
+            "ALTER TABLE `SalesOrders` ADD COLUMN `version` INT NOT NULL DEFAULT 0 AFTER `seat_number`"
+        ]
+    ),
+    (
+        "0009_idempotency_keys",
+        "Client idempotency keys for booking and refund requests, purged hourly after expiry",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS `IdempotencyKeys` (
+                `idempotency_key` VARCHAR(64) PRIMARY KEY,
+                `operation` VARCHAR(20) NOT NULL,
+                `message` TEXT NULL,
+                `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                `expires_at` DATETIME NOT NULL,
+                INDEX `idx_idempotency_expires` (`expires_at`)
+            );
+            """,
+            """
+            DROP EVENT IF EXISTS ev_purge_idempotency_keys;
+            """,
+            """
+            CREATE EVENT ev_purge_idempotency_keys
+            ON SCHEDULE EVERY 1 HOUR
+            DO DELETE FROM IdempotencyKeys WHERE expires_at <= NOW();
+            """
+        ]
+    ),
+    (
+        "0010_system_salesperson",
+        "System salesperson used by the automatic approval engine",
+        [
+            create_system_salesperson
+        ]
+    ),
+    (
+        "0011_refund_inventory_in_app",
+        "Refund seat return moves from after_order_refund into the approval transaction",
+        [
+            "DROP TRIGGER IF EXISTS after_order_refund",
+            """
+            DROP TRIGGER IF EXISTS before_train_delete;
+            """,
+            """
+            CREATE TRIGGER before_train_delete
+            BEFORE DELETE ON `Trains`
+            FOR EACH ROW
+            BEGIN
+                -- Partitioned tables have no foreign keys, so the former ON DELETE CASCADE is done here.
+                -- The orders are deleted with the train, so they are not marked Refunded first.
+                DELETE FROM SalesOrders WHERE train_number = OLD.train_number;
+                DELETE FROM Stopovers WHERE train_number = OLD.train_number;
+            END;
+            """
+        ]
+    ),
+    (
+        "0012_order_stop_orders",
+        "Store departure and arrival stop_order on SalesOrders instead of looking them up in Stopovers",
+        [
+            "ALTER TABLE `SalesOrders` ADD COLUMN `dep_stop_order` INT NULL AFTER `arrival_station_id`",
+            "ALTER TABLE `SalesOrders` ADD COLUMN `arr_stop_order` INT NULL AFTER `dep_stop_order`",
+            backfill_order_stop_orders,
+            "CREATE INDEX idx_orders_run_segment ON `SalesOrders` (`train_number`, `start_date`, `dep_stop_order`, `arr_stop_order`)"
+        ]
+    ),
+    (
+        "0013_order_history_index",
+        "Composite (customer_id, operation_time) index for keyset-paginated passenger order history",
+        [
+            "CREATE INDEX idx_orders_customer_time ON `SalesOrders` (`customer_id`, `operation_time`)",
+            "DROP INDEX idx_orders_customer ON `SalesOrders`"
+        ]
+    ),
+    (
+        "0014_order_changes_feed",
+        "OrderChanges sequence filled by SalesOrders triggers and a status-leading index for pending orders",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS `OrderChanges` (
+                `change_seq` BIGINT PRIMARY KEY AUTO_INCREMENT,
+                `order_id` VARCHAR(20) NOT NULL,
+                `status` ENUM('Ready', 'Success', 'Cancelled', 'RefundPending', 'Refunded') NULL,
+                `changed_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                INDEX `idx_order_changes_time` (`changed_at`)
+            );
+            """,
+            "CREATE INDEX idx_orders_status_time ON `SalesOrders` (`status`, `operation_time`)",
+            """
+            DROP TRIGGER IF EXISTS after_order_insert;
+            """,
+            """
+            CREATE TRIGGER after_order_insert
+            AFTER INSERT ON `SalesOrders`
+            FOR EACH ROW
+            BEGIN
+                INSERT INTO OrderChanges (order_id, status) VALUES (NEW.order_id, NEW.status);
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS after_order_status_update;
+            """,
+            """
+            CREATE TRIGGER after_order_status_update
+            AFTER UPDATE ON `SalesOrders`
+            FOR EACH ROW
+            BEGIN
+                IF NEW.status <> OLD.status THEN
+                    INSERT INTO OrderChanges (order_id, status) VALUES (NEW.order_id, NEW.status);
+                END IF;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS before_order_delete;
+            """,
+            """
+            CREATE TRIGGER before_order_delete
+            BEFORE DELETE ON `SalesOrders`
+            FOR EACH ROW
+            BEGIN
+                DELETE FROM OrderOperations WHERE order_id = OLD.order_id;
+                DELETE FROM SeatHolds WHERE order_id = OLD.order_id;
+                INSERT INTO OrderChanges (order_id, status) VALUES (OLD.order_id, NULL);
+            END;
+            """,
+            """
+            DROP EVENT IF EXISTS ev_purge_order_changes;
+            """,
+            """
+            CREATE EVENT ev_purge_order_changes
+            ON SCHEDULE EVERY 1 DAY
+            STARTS CURRENT_DATE + INTERVAL 1 DAY + INTERVAL 4 HOUR
+            DO DELETE FROM OrderChanges WHERE changed_at < NOW() - INTERVAL 7 DAY;
+            """
+        ]
+    ),
+    (
+        "0015_od_availability_schedule_triggers",
+        "Rebuild a run's OdAvailability when its Stopovers are inserted, deleted or rescheduled",
+        [
+            """
+            DROP PROCEDURE IF EXISTS sp_refresh_od_run;
+            """,
+            """
+            CREATE PROCEDURE sp_refresh_od_run(IN p_train_number VARCHAR(10), IN p_start_date DATE)
+            BEGIN
+                -- Rebuild the priced pairs of one run, called by the Stopovers insert/delete/update
+                -- triggers when a run's stops or times change
+                DELETE FROM OdAvailability
+                WHERE train_number = p_train_number AND start_date = p_start_date;
+
+                INSERT INTO OdAvailability (
+                    train_number, start_date,
+                    departure_station_id, arrival_station_id,
+                    dep_stop_order, arr_stop_order,
+                    departure_time, arrival_time,
+                    price, min_seats
+                )
+                SELECT 
+                    s1.train_number,
+                    s1.start_date,
+                    s1.station_id,
+                    s2.station_id,
+                    s1.stop_order,
+                    s2.stop_order,
+                    s1.departure_time,
+                    s2.arrival_time,
+                    p.price,
+                    MIN(s3.seats)
+                FROM 
+                    Stopovers s1
+                    JOIN Stopovers s2 ON s1.train_number = s2.train_number AND s1.start_date = s2.start_date
+                    JOIN Stopovers s3 ON s1.train_number = s3.train_number AND s1.start_date = s3.start_date
+                    JOIN Prices p ON s1.train_number = p.train_number 
+                        AND s1.station_id = p.departure_station_id
+                        AND s2.station_id = p.arrival_station_id
+                WHERE 
+                    s1.train_number = p_train_number
+                    AND s1.start_date = p_start_date
+                    AND s1.stop_order < s2.stop_order
+                    AND s3.stop_order >= s1.stop_order
+                    AND s3.stop_order < s2.stop_order
+                GROUP BY
+                    s1.train_number, s1.start_date, s1.station_id, s2.station_id,
+                    s1.stop_order, s2.stop_order, s1.departure_time, s2.arrival_time, p.price;
+            END;
+            """,
+            "DROP TRIGGER IF EXISTS after_stopover_seats_update",
+            """
+            DROP TRIGGER IF EXISTS after_stopover_update;
+            """,
+            """
+            CREATE TRIGGER after_stopover_update
+            AFTER UPDATE ON `Stopovers`
+            FOR EACH ROW
+            BEGIN
+                IF NOT (NEW.train_number <=> OLD.train_number AND NEW.start_date <=> OLD.start_date
+                        AND NEW.station_id <=> OLD.station_id AND NEW.stop_order <=> OLD.stop_order
+                        AND NEW.departure_time <=> OLD.departure_time
+                        AND NEW.arrival_time <=> OLD.arrival_time) THEN
+                    -- Schedule edits change which pairs exist and their times, so rebuild the run(s)
+                    CALL sp_refresh_od_run(OLD.train_number, OLD.start_date);
+                    IF NOT (NEW.train_number <=> OLD.train_number AND NEW.start_date <=> OLD.start_date) THEN
+                        CALL sp_refresh_od_run(NEW.train_number, NEW.start_date);
+                    END IF;
+                -- Otherwise keep OdAvailability.min_seats in step with the segment that changed
+                ELSEIF NEW.seats < OLD.seats THEN
+                    UPDATE OdAvailability od
+                    SET od.min_seats = LEAST(od.min_seats, NEW.seats)
+                    WHERE od.train_number = NEW.train_number
+                    AND od.start_date = NEW.start_date
+                    AND od.dep_stop_order <= NEW.stop_order
+                    AND od.arr_stop_order > NEW.stop_order;
+                ELSEIF NEW.seats > OLD.seats THEN
+                    -- Only pairs whose minimum was this segment can change
+                    UPDATE OdAvailability od
+                    SET od.min_seats = (
+                        SELECT MIN(s.seats)
+                        FROM Stopovers s
+                        WHERE s.train_number = od.train_number
+                        AND s.start_date = od.start_date
+                        AND s.stop_order >= od.dep_stop_order
+                        AND s.stop_order < od.arr_stop_order
+                    )
+                    WHERE od.train_number = NEW.train_number
+                    AND od.start_date = NEW.start_date
+                    AND od.dep_stop_order <= NEW.stop_order
+                    AND od.arr_stop_order > NEW.stop_order
+                    AND od.min_seats = OLD.seats;
+                END IF;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS after_stopover_insert;
+            """,
+            """
+            CREATE TRIGGER after_stopover_insert
+            AFTER INSERT ON `Stopovers`
+            FOR EACH ROW
+            BEGIN
+                CALL sp_refresh_od_run(NEW.train_number, NEW.start_date);
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS after_stopover_delete;
+            """,
+            """
+            CREATE TRIGGER after_stopover_delete
+            AFTER DELETE ON `Stopovers`
+            FOR EACH ROW
+            BEGIN
+                CALL sp_refresh_od_run(OLD.train_number, OLD.start_date);
+            END;
+            """,
+            "CALL sp_refresh_od_availability(NULL)"
+        ]
+    ),
+    (
+        "0016_seat_assignments",
+        "Enforce one order per seat and segment with SeatAssignments",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS `SeatAssignments` (
+                `train_number` VARCHAR(10) NOT NULL,
+                `start_date` DATE NOT NULL,
+                `stop_order` INT NOT NULL,
+                `seat_number` INT NOT NULL,
+                `order_id` VARCHAR(20) NOT NULL,
+                PRIMARY KEY (`train_number`, `start_date`, `stop_order`, `seat_number`),
+                INDEX `idx_seat_assignments_order` (`order_id`)
+            )
+            """,
+            # 已有数据中重叠的座位只保留先插入的一条，之后由分配器按数据库重新加载时避开
+            """
+            INSERT IGNORE INTO SeatAssignments (train_number, start_date, stop_order, seat_number, order_id)
+            SELECT s.train_number, s.start_date, s.stop_order, so.seat_number, so.order_id
+            FROM SalesOrders so
+            JOIN Stopovers s ON s.train_number = so.train_number
+                AND s.start_date = so.start_date
+                AND s.stop_order >= so.dep_stop_order
+                AND s.stop_order < so.arr_stop_order
+            WHERE so.seat_number IS NOT NULL
+            AND so.status IN ('Ready', 'Success', 'RefundPending')
+            """,
+            """
+            DROP TRIGGER IF EXISTS after_order_seat_insert;
+            """,
+            """
+            CREATE TRIGGER after_order_seat_insert
+            AFTER INSERT ON `SalesOrders`
+            FOR EACH ROW
+            BEGIN
+                IF NEW.seat_number IS NOT NULL AND NEW.status IN ('Ready', 'Success', 'RefundPending') THEN
+                    INSERT INTO SeatAssignments (train_number, start_date, stop_order, seat_number, order_id)
+                    SELECT s.train_number, s.start_date, s.stop_order, NEW.seat_number, NEW.order_id
+                    FROM Stopovers s
+                    WHERE s.train_number = NEW.train_number
+                    AND s.start_date = NEW.start_date
+                    AND s.stop_order >= NEW.dep_stop_order
+                    AND s.stop_order < NEW.arr_stop_order;
+                END IF;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS after_order_seat_update;
+            """,
+            """
+            CREATE TRIGGER after_order_seat_update
+            AFTER UPDATE ON `SalesOrders`
+            FOR EACH ROW
+            BEGIN
+                IF NOT (NEW.seat_number <=> OLD.seat_number
+                        AND NEW.dep_stop_order <=> OLD.dep_stop_order
+                        AND NEW.arr_stop_order <=> OLD.arr_stop_order
+                        AND (NEW.status IN ('Ready', 'Success', 'RefundPending'))
+                            = (OLD.status IN ('Ready', 'Success', 'RefundPending'))) THEN
+                    DELETE FROM SeatAssignments WHERE order_id = OLD.order_id;
+                    IF NEW.seat_number IS NOT NULL AND NEW.status IN ('Ready', 'Success', 'RefundPending') THEN
+                        INSERT INTO SeatAssignments (train_number, start_date, stop_order, seat_number, order_id)
+                        SELECT s.train_number, s.start_date, s.stop_order, NEW.seat_number, NEW.order_id
+                        FROM Stopovers s
+                        WHERE s.train_number = NEW.train_number
+                        AND s.start_date = NEW.start_date
+                        AND s.stop_order >= NEW.dep_stop_order
+                        AND s.stop_order < NEW.arr_stop_order;
+                    END IF;
+                END IF;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS before_order_delete;
+            """,
+            """
+            CREATE TRIGGER before_order_delete
+            BEFORE DELETE ON `SalesOrders`
+            FOR EACH ROW
+            BEGIN
+                DELETE FROM OrderOperations WHERE order_id = OLD.order_id;
+                DELETE FROM SeatHolds WHERE order_id = OLD.order_id;
+                DELETE FROM SeatAssignments WHERE order_id = OLD.order_id;
+                INSERT INTO OrderChanges (order_id, status) VALUES (OLD.order_id, NULL);
+            END;
+            """
+        ]
+    ),
+    (
+        "0017_order_id_registry",
+        "Keep order_id unique across SalesOrders partitions and stop dropping order history",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS `OrderIds` (
+                `order_id` VARCHAR(20) PRIMARY KEY,
+                `start_date` DATE NOT NULL
+            )
+            """,
+            # 已有的重复 order_id 只登记最早的一条，其余订单的删除或修改不受影响
+            """
+            INSERT IGNORE INTO OrderIds (order_id, start_date)
+            SELECT order_id, MIN(start_date) FROM SalesOrders GROUP BY order_id
+            """,
+            """
+            DROP TRIGGER IF EXISTS before_order_id_insert;
+            """,
+            """
+            CREATE TRIGGER before_order_id_insert
+            BEFORE INSERT ON `SalesOrders`
+            FOR EACH ROW
+            BEGIN
+                INSERT INTO OrderIds (order_id, start_date) VALUES (NEW.order_id, NEW.start_date);
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS before_order_id_update;
+            """,
+            """
+            CREATE TRIGGER before_order_id_update
+            BEFORE UPDATE ON `SalesOrders`
+            FOR EACH ROW
+            BEGIN
+                IF NOT (NEW.order_id <=> OLD.order_id AND NEW.start_date <=> OLD.start_date) THEN
+                    UPDATE OrderIds SET order_id = NEW.order_id, start_date = NEW.start_date
+                    WHERE order_id = OLD.order_id;
+                END IF;
+            END;
+            """,
+            """
+            DROP TRIGGER IF EXISTS before_order_delete;
+            """,
+            """
+            CREATE TRIGGER before_order_delete
+            BEFORE DELETE ON `SalesOrders`
+            FOR EACH ROW
+            BEGIN
+                DELETE FROM OrderOperations WHERE order_id = OLD.order_id;
+                DELETE FROM SeatHolds WHERE order_id = OLD.order_id;
+                DELETE FROM SeatAssignments WHERE order_id = OLD.order_id;
+                DELETE FROM OrderIds WHERE order_id = OLD.order_id;
+                INSERT INTO OrderChanges (order_id, status) VALUES (OLD.order_id, NULL);
+            END;
+            """,
+            """
+            DROP PROCEDURE IF EXISTS sp_maintain_partitions;
+            """,
+            """
+            CREATE PROCEDURE sp_maintain_partitions(
+                IN p_months_ahead INT,
+                IN p_retention_months INT
+            )
+            BEGIN
+                -- Only past runs' availability is dropped; orders and their operations are history
+                -- (and OrderIds must keep matching SalesOrders), so those tables only gain new months
+                CALL sp_maintain_table_partitions('Stopovers', p_months_ahead, p_retention_months);
+                CALL sp_maintain_table_partitions('SalesOrders', p_months_ahead, NULL);
+                CALL sp_maintain_table_partitions('OrderOperations', p_months_ahead, NULL);
+
+                -- Dropping partitions skips the delete triggers, so clean up rows derived from the dropped runs
+                IF p_retention_months IS NOT NULL THEN
+                    DELETE FROM OdAvailability
+                    WHERE start_date < CAST(DATE_FORMAT(CURDATE() - INTERVAL p_retention_months MONTH, '%Y-%m-01') AS DATE);
+                    DELETE FROM SeatHolds
+                    WHERE start_date < CAST(DATE_FORMAT(CURDATE() - INTERVAL p_retention_months MONTH, '%Y-%m-01') AS DATE);
+                    DELETE FROM SeatAssignments
+                    WHERE start_date < CAST(DATE_FORMAT(CURDATE() - INTERVAL p_retention_months MONTH, '%Y-%m-01') AS DATE);
+                END IF;
+            END;
+            """
+        ]
+    ),
+]
+
+def apply_migrations(cursor):
+    """在给定游标上执行所有未执行的迁移
+
+    Args:
+        cursor: 已连接到目标数据库的游标
+
+    Returns:
+        list: 本次执行的迁移版本号
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `SchemaMigrations` (
+            `version` VARCHAR(100) PRIMARY KEY,
+            `description` VARCHAR(255),
+            `applied_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("SELECT version FROM `SchemaMigrations`")
+    applied = {row[0] for row in cursor.fetchall()}
+
+    executed = []
+    for version, description, statements in MIGRATIONS:
+        if version in applied:
+            continue
+
+        for stmt in statements:
+            try:
+                if callable(stmt):
+                    stmt(cursor)
+                else:
+                    cursor.execute(stmt)
+            except Error as err:
+                if err.errno not in IGNORABLE_ERRORS:
+                    print(f"Error applying migration {version}: {err}")
+                    raise
+
+        cursor.execute(
+            "INSERT INTO `SchemaMigrations` (`version`, `description`) VALUES (%s, %s)",
+            (version, description)
+        )
+        executed.append(version)
+        print(f"Applied migration: {version}")
+
+    return executed
+
+def run_migrations():
+    """连接数据库并执行所有未执行的迁移
+
+    Returns:
+        bool: 是否全部执行成功
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor(buffered=True)
+        executed = apply_migrations(cursor)
+        conn.commit()
+        print(f"Migrations completed, {len(executed)} applied.")
+        return True
+
+    except Error as e:
+        if conn:
+            conn.rollback()
+        print(f"Migration failed: {e}")
+        return False
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+if __name__ == "__main__":
+    print("Running database migrations...")
+    if run_migrations():
+        print("Database migration successful!")
+    else:
+        print("Database migration failed.")
@@ -7,6 +7,7 @@ import csv
 import json
 import os
 from utils.hash_utils import hash_password
+from db.db_migrations import create_system_salesperson, backfill_order_stop_orders
 
 def insert_sample_data():
     """
@@ -49,7 +50,7 @@ def clear_existing_data(cursor):
     cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
     
     tables = [
-        "SalesOrders",
+        "OrderChanges", "IdempotencyKeys", "OdAvailability", "SeatHolds", "SeatAssignments", "OrderIds", "SalesOrders",
         "Salespersons", "Prices", "Stopovers", 
         "Trains", "Stations", "Customers"  # Added Customers table
     ]
@@ -218,6 +219,9 @@ def insert_salespersons_from_csv(cursor):
             print(f"Error inserting salesperson {row['salesperson_name']}: {e}")
             continue
     
+    # 清空后重新创建自动审批使用的系统乘务员
+    create_system_salesperson(cursor)
+    
     print(f"Inserted {inserted_count} salespersons")
     return inserted_count
 
@@ -248,6 +252,7 @@ def insert_sample_orders(cursor):
     # 生成示例订单
     from datetime import datetime, timedelta
     import random
+    from utils.id_generator import order_id_generator
     
     orders_data = []
     base_time = datetime.now() - timedelta(days=30)  # 从30天前开始
@@ -256,13 +261,12 @@ def insert_sample_orders(cursor):
         customer = random.choice(customers)[0]  # id_card
         train = random.choice(trains)
         
-        # 生成订单号 (年月日时分秒+4位随机数)
         order_time = base_time + timedelta(
             days=random.randint(0, 29),
             hours=random.randint(0, 23),
             minutes=random.randint(0, 59)
         )
-        order_id = order_time.strftime('%Y%m%d%H%M%S') + str(random.randint(1000, 9999))
+        order_id = order_id_generator.next_order_id()
         
         # 随机生成价格 (200-1000之间)
         price = round(random.uniform(200, 1000), 2)
@@ -294,6 +298,7 @@ def insert_sample_orders(cursor):
                 operation_type, operation_time, status
             ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """, orders_data)
+        backfill_order_stop_orders(cursor)
         
         print(f"Successfully inserted {len(orders_data)} sample orders")
         return len(orders_data)
@@ -4,6 +4,22 @@ import mysql.connector
 from mysql.connector import Error
 from db.db_config import DB_CONFIG
 from db.db_sample_data import insert_sample_data
+from db.db_migrations import apply_migrations
+
+# Tables range-partitioned by month: (table, partition column, primary key columns).
+# Partitioned tables cannot have foreign keys, so their cascades are done by triggers.
+PARTITIONED_TABLES = [
+    ('Stopovers', 'start_date', ('stopover_id', 'start_date')),
+    ('SalesOrders', 'start_date', ('order_id', 'start_date')),
+    ('OrderOperations', 'operation_time', ('operation_id', 'operation_time')),
+]
+# Monthly partitions created ahead of the current month
+PARTITION_MONTHS_AHEAD = 3
+# Stopovers partitions older than this many months are dropped (None keeps everything);
+# SalesOrders and OrderOperations are order history and keep all their partitions
+PARTITION_RETENTION_MONTHS = 24
+# OrderChanges rows older than this many days are purged; feed readers further behind reload in full
+ORDER_CHANGES_RETENTION_DAYS = 7
 
 def setup_database(drop_existing=True):
     """
@@ -56,6 +72,11 @@ def setup_database(drop_existing=True):
             create_triggers(cursor)
             # Procedures
             create_procedures(cursor)
+            # Events and the initial monthly partitions
+            create_events(cursor)
+            cursor.execute(f"CALL sp_maintain_partitions({PARTITION_MONTHS_AHEAD}, NULL)")
+            # Migrations (already covered by the statements above on a fresh database)
+            apply_migrations(cursor)
 
             insert_sample_data()
             conn.commit()
@@ -100,7 +121,7 @@ def create_tables(cursor):
         """,
         """
         CREATE TABLE IF NOT EXISTS `Stopovers` (
-            `stopover_id` INT PRIMARY KEY AUTO_INCREMENT,
+            `stopover_id` INT NOT NULL AUTO_INCREMENT,
             `train_number` VARCHAR(10) NOT NULL,
             `station_id` INT NOT NULL,
             `start_date` DATE NOT NULL,
@@ -108,9 +129,11 @@ def create_tables(cursor):
             `departure_time` DATETIME NULL,
             `stop_order` INT NOT NULL CHECK (`stop_order` > 0),
             `seats` INT NOT NULL CHECK (`seats` >= 0),
-            FOREIGN KEY (`train_number`) REFERENCES `Trains`(`train_number`) ON DELETE CASCADE,
-            FOREIGN KEY (`station_id`) REFERENCES `Stations`(`station_id`),
+            PRIMARY KEY (`stopover_id`, `start_date`),
             UNIQUE (`train_number`, `station_id`, `start_date`)
+        )
+        PARTITION BY RANGE COLUMNS (`start_date`) (
+            PARTITION pmax VALUES LESS THAN (MAXVALUE)
         );
         """,
         """
@@ -145,25 +168,40 @@ def create_tables(cursor):
         """,
         """
         CREATE TABLE IF NOT EXISTS `SalesOrders` (
-            `order_id` VARCHAR(20) PRIMARY KEY,
+            `order_id` VARCHAR(20) NOT NULL,
             `train_number` VARCHAR(10) NOT NULL,
             `start_date` DATE NOT NULL,
             `departure_station_id` INT NOT NULL,
             `arrival_station_id` INT NOT NULL,
+            `dep_stop_order` INT NULL,
+            `arr_stop_order` INT NULL,
             `price` DECIMAL(10, 2) NOT NULL,
             `customer_id` VARCHAR(50) NOT NULL,
             `operation_type` ENUM('Booking', 'Refund') NOT NULL,
             `operation_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
             `status` ENUM('Ready', 'Success', 'Cancelled', 'RefundPending', 'Refunded') NOT NULL DEFAULT 'Ready',
-            FOREIGN KEY (`train_number`) REFERENCES `Trains`(`train_number`) ON DELETE CASCADE,
-            FOREIGN KEY (`departure_station_id`) REFERENCES `Stations`(`station_id`) ON DELETE CASCADE,
-            FOREIGN KEY (`arrival_station_id`) REFERENCES `Stations`(`station_id`) ON DELETE CASCADE,
-            FOREIGN KEY (`customer_id`) REFERENCES `Customers`(`id_card`) ON DELETE CASCADE
+            `seat_number` INT NULL,
+            `version` INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (`order_id`, `start_date`),
+            INDEX `idx_orders_customer_time` (`customer_id`, `operation_time`),
+            INDEX `idx_orders_departure_station` (`departure_station_id`),
+            INDEX `idx_orders_arrival_station` (`arrival_station_id`)
+        )
+        PARTITION BY RANGE COLUMNS (`start_date`) (
+            PARTITION pmax VALUES LESS THAN (MAXVALUE)
+        );
+        """,
+        # The SalesOrders primary key has to include the partition column, so order_id alone is
+        # not unique there; this unpartitioned registry, filled by the SalesOrders triggers, is
+        """
+        CREATE TABLE IF NOT EXISTS `OrderIds` (
+            `order_id` VARCHAR(20) PRIMARY KEY,
+            `start_date` DATE NOT NULL
         );
         """,
         """
         CREATE TABLE IF NOT EXISTS `OrderOperations` (
-            `operation_id` INT PRIMARY KEY AUTO_INCREMENT,
+            `operation_id` INT NOT NULL AUTO_INCREMENT,
             `order_id` VARCHAR(20) NOT NULL,
             `salesperson_id` VARCHAR(10) NOT NULL,
             `operation_type` ENUM('Approve', 'Reject') NOT NULL,
@@ -171,8 +209,74 @@ def create_tables(cursor):
             `new_status` ENUM('Success', 'Cancelled', 'Refunded') NOT NULL,
             `operation_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
             `remarks` VARCHAR(255),
-            FOREIGN KEY (`order_id`) REFERENCES `SalesOrders`(`order_id`) ON DELETE CASCADE,
-            FOREIGN KEY (`salesperson_id`) REFERENCES `Salespersons`(`salesperson_id`) ON DELETE CASCADE
+            PRIMARY KEY (`operation_id`, `operation_time`),
+            INDEX `idx_order_operations_order` (`order_id`),
+            INDEX `idx_order_operations_salesperson` (`salesperson_id`, `operation_time`)
+        )
+        PARTITION BY RANGE COLUMNS (`operation_time`) (
+            PARTITION pmax VALUES LESS THAN (MAXVALUE)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS `OdAvailability` (
+            `train_number` VARCHAR(10) NOT NULL,
+            `start_date` DATE NOT NULL,
+            `departure_station_id` INT NOT NULL,
+            `arrival_station_id` INT NOT NULL,
+            `dep_stop_order` INT NOT NULL,
+            `arr_stop_order` INT NOT NULL,
+            `departure_time` DATETIME NULL,
+            `arrival_time` DATETIME NULL,
+            `price` DECIMAL(10, 2) NOT NULL,
+            `min_seats` INT NOT NULL,
+            PRIMARY KEY (`train_number`, `start_date`, `departure_station_id`, `arrival_station_id`),
+            INDEX `idx_od_lookup` (`departure_station_id`, `arrival_station_id`, `departure_time`),
+            FOREIGN KEY (`train_number`) REFERENCES `Trains`(`train_number`) ON DELETE CASCADE
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS `SeatHolds` (
+            `hold_id` BIGINT PRIMARY KEY AUTO_INCREMENT,
+            `order_id` VARCHAR(20) NOT NULL UNIQUE,
+            `train_number` VARCHAR(10) NOT NULL,
+            `start_date` DATE NOT NULL,
+            `dep_stop_order` INT NOT NULL,
+            `arr_stop_order` INT NOT NULL,
+            `expires_at` DATETIME NOT NULL,
+            INDEX `idx_seat_holds_expires` (`expires_at`)
+        );
+        """,
+        # One row per segment (Stopovers row in [dep_stop_order, arr_stop_order)) covered by
+        # an active order's seat, maintained by the SalesOrders triggers; the primary key
+        # stops two orders from holding the same seat on the same segment
+        """
+        CREATE TABLE IF NOT EXISTS `SeatAssignments` (
+            `train_number` VARCHAR(10) NOT NULL,
+            `start_date` DATE NOT NULL,
+            `stop_order` INT NOT NULL,
+            `seat_number` INT NOT NULL,
+            `order_id` VARCHAR(20) NOT NULL,
+            PRIMARY KEY (`train_number`, `start_date`, `stop_order`, `seat_number`),
+            INDEX `idx_seat_assignments_order` (`order_id`)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS `IdempotencyKeys` (
+            `idempotency_key` VARCHAR(64) PRIMARY KEY,
+            `operation` VARCHAR(20) NOT NULL,
+            `message` TEXT NULL,
+            `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `expires_at` DATETIME NOT NULL,
+            INDEX `idx_idempotency_expires` (`expires_at`)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS `OrderChanges` (
+            `change_seq` BIGINT PRIMARY KEY AUTO_INCREMENT,
+            `order_id` VARCHAR(20) NOT NULL,
+            `status` ENUM('Ready', 'Success', 'Cancelled', 'RefundPending', 'Refunded') NULL,
+            `changed_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX `idx_order_changes_time` (`changed_at`)
         );
         """
     ]
@@ -314,13 +418,18 @@ def create_indexes(cursor):
     index_statements = [
         "CREATE INDEX idx_trains_departure_station_id ON `Trains` (`departure_station_id`)",
         "CREATE INDEX idx_trains_arrival_station_id ON `Trains` (`arrival_station_id`)",
-        "CREATE INDEX idx_stopovers_station_id ON `Stopovers` (`station_id`)",
+        "CREATE INDEX idx_stopovers_station_date ON `Stopovers` (`station_id`, `start_date`, `train_number`, `stop_order`)",
+        "CREATE INDEX idx_stopovers_station_departure ON `Stopovers` (`station_id`, `departure_time`, `train_number`, `start_date`, `stop_order`)",
+        "CREATE INDEX idx_stopovers_run_order ON `Stopovers` (`train_number`, `start_date`, `stop_order`, `seats`)",
+        "CREATE INDEX idx_stopovers_station_arrival ON `Stopovers` (`station_id`, `arrival_time`)",
         "CREATE INDEX idx_prices_departure_station_id ON `Prices` (`departure_station_id`)",
         "CREATE INDEX idx_prices_arrival_station_id ON `Prices` (`arrival_station_id`)",
         "CREATE INDEX idx_customers_id_card ON `Customers` (`id_card`)",
         "CREATE INDEX idx_salespersons_id ON `Salespersons` (`salesperson_id`)",
         "CREATE INDEX idx_orders_train_number ON `SalesOrders` (`train_number`)",
+        "CREATE INDEX idx_orders_run_segment ON `SalesOrders` (`train_number`, `start_date`, `dep_stop_order`, `arr_stop_order`)",
         "CREATE INDEX idx_orders_operation_time ON `SalesOrders` (`operation_time`)",
+        "CREATE INDEX idx_orders_status_time ON `SalesOrders` (`status`, `operation_time`)",
         "CREATE INDEX idx_order_operations_time ON `OrderOperations` (`operation_time`)"
     ]
     
@@ -336,76 +445,238 @@ def create_indexes(cursor):
 def create_triggers(cursor):
     """Create all triggers"""
     trigger_statements = [
+        # Seats are reserved and returned by OrderService in the same transaction as the
+        # status change, only for the transitions that affect inventory, so the old
+        # per-update seat triggers are only dropped
         """
         DROP TRIGGER IF EXISTS after_order_success;
         """,
         """
-        CREATE TRIGGER after_order_success
+        DROP TRIGGER IF EXISTS after_order_refund;
+        """,
+        # Registering the id before the row is written makes a duplicate order_id on any
+        # start_date fail the INSERT with a duplicate key (1062)
+        """
+        DROP TRIGGER IF EXISTS before_order_id_insert;
+        """,
+        """
+        CREATE TRIGGER before_order_id_insert
+        BEFORE INSERT ON `SalesOrders`
+        FOR EACH ROW
+        BEGIN
+            INSERT INTO OrderIds (order_id, start_date) VALUES (NEW.order_id, NEW.start_date);
+        END;
+        """,
+        """
+        DROP TRIGGER IF EXISTS before_order_id_update;
+        """,
+        """
+        CREATE TRIGGER before_order_id_update
+        BEFORE UPDATE ON `SalesOrders`
+        FOR EACH ROW
+        BEGIN
+            IF NOT (NEW.order_id <=> OLD.order_id AND NEW.start_date <=> OLD.start_date) THEN
+                UPDATE OrderIds SET order_id = NEW.order_id, start_date = NEW.start_date
+                WHERE order_id = OLD.order_id;
+            END IF;
+        END;
+        """,
+        # Every new order, status change and deletion is appended to OrderChanges
+        # (status NULL for a deleted order) so staff views can poll for changes since a sequence
+        """
+        DROP TRIGGER IF EXISTS after_order_insert;
+        """,
+        """
+        CREATE TRIGGER after_order_insert
+        AFTER INSERT ON `SalesOrders`
+        FOR EACH ROW
+        BEGIN
+            INSERT INTO OrderChanges (order_id, status) VALUES (NEW.order_id, NEW.status);
+        END;
+        """,
+        """
+        DROP TRIGGER IF EXISTS after_order_status_update;
+        """,
+        """
+        CREATE TRIGGER after_order_status_update
         AFTER UPDATE ON `SalesOrders`
         FOR EACH ROW
         BEGIN
-            DECLARE dep_order INT;
-            DECLARE arr_order INT;
-            
-            -- Get departure and arrival stop orders first
-            SELECT stop_order INTO dep_order
-            FROM Stopovers s2 
-            WHERE s2.train_number = NEW.train_number 
-            AND s2.start_date = NEW.start_date
-            AND s2.station_id = NEW.departure_station_id;
-            
-            SELECT stop_order INTO arr_order
-            FROM Stopovers s3 
-            WHERE s3.train_number = NEW.train_number 
-            AND s3.start_date = NEW.start_date
-            AND s3.station_id = NEW.arrival_station_id;
-            
-            IF NEW.status = 'Success' AND OLD.status = 'Ready' THEN
-                UPDATE Stopovers s
-                SET s.seats = s.seats - 1
+            IF NEW.status <> OLD.status THEN
+                INSERT INTO OrderChanges (order_id, status) VALUES (NEW.order_id, NEW.status);
+            END IF;
+        END;
+        """,
+        # SeatAssignments follows the seat of every Ready/Success/RefundPending order; a seat
+        # already held on one of the segments fails the statement with a duplicate key (1062)
+        """
+        DROP TRIGGER IF EXISTS after_order_seat_insert;
+        """,
+        """
+        CREATE TRIGGER after_order_seat_insert
+        AFTER INSERT ON `SalesOrders`
+        FOR EACH ROW
+        BEGIN
+            IF NEW.seat_number IS NOT NULL AND NEW.status IN ('Ready', 'Success', 'RefundPending') THEN
+                INSERT INTO SeatAssignments (train_number, start_date, stop_order, seat_number, order_id)
+                SELECT s.train_number, s.start_date, s.stop_order, NEW.seat_number, NEW.order_id
+                FROM Stopovers s
                 WHERE s.train_number = NEW.train_number
                 AND s.start_date = NEW.start_date
-                AND s.seats > 0
-                AND s.stop_order >= dep_order
-                AND s.stop_order < arr_order;
+                AND s.stop_order >= NEW.dep_stop_order
+                AND s.stop_order < NEW.arr_stop_order;
             END IF;
         END;
         """,
         """
-        DROP TRIGGER IF EXISTS after_order_refund;
+        DROP TRIGGER IF EXISTS after_order_seat_update;
         """,
         """
-        CREATE TRIGGER after_order_refund
+        CREATE TRIGGER after_order_seat_update
         AFTER UPDATE ON `SalesOrders`
         FOR EACH ROW
         BEGIN
-            DECLARE dep_order INT;
-            DECLARE arr_order INT;
-            
-            -- Get departure and arrival stop orders first
-            SELECT stop_order INTO dep_order
-            FROM Stopovers s2 
-            WHERE s2.train_number = NEW.train_number 
-            AND s2.start_date = NEW.start_date
-            AND s2.station_id = NEW.departure_station_id;
-            
-            SELECT stop_order INTO arr_order
-            FROM Stopovers s3 
-            WHERE s3.train_number = NEW.train_number 
-            AND s3.start_date = NEW.start_date
-            AND s3.station_id = NEW.arrival_station_id;
-            
-            IF NEW.status = 'Refunded' AND OLD.status = 'RefundPending' THEN
-                UPDATE Stopovers s
-                SET s.seats = s.seats + 1
-                WHERE s.train_number = NEW.train_number
-                AND s.start_date = NEW.start_date
-                AND s.stop_order >= dep_order
-                AND s.stop_order < arr_order;
+            IF NOT (NEW.seat_number <=> OLD.seat_number
+                    AND NEW.dep_stop_order <=> OLD.dep_stop_order
+                    AND NEW.arr_stop_order <=> OLD.arr_stop_order
+                    AND (NEW.status IN ('Ready', 'Success', 'RefundPending'))
+                        = (OLD.status IN ('Ready', 'Success', 'RefundPending'))) THEN
+                DELETE FROM SeatAssignments WHERE order_id = OLD.order_id;
+                IF NEW.seat_number IS NOT NULL AND NEW.status IN ('Ready', 'Success', 'RefundPending') THEN
+                    INSERT INTO SeatAssignments (train_number, start_date, stop_order, seat_number, order_id)
+                    SELECT s.train_number, s.start_date, s.stop_order, NEW.seat_number, NEW.order_id
+                    FROM Stopovers s
+                    WHERE s.train_number = NEW.train_number
+                    AND s.start_date = NEW.start_date
+                    AND s.stop_order >= NEW.dep_stop_order
+                    AND s.stop_order < NEW.arr_stop_order;
+                END IF;
+            END IF;
+        END;
+        """,
+        """
+        DROP TRIGGER IF EXISTS after_stopover_seats_update;
+        """,
+        """
+        DROP TRIGGER IF EXISTS after_stopover_update;
+        """,
+        """
+        CREATE TRIGGER after_stopover_update
+        AFTER UPDATE ON `Stopovers`
+        FOR EACH ROW
+        BEGIN
+            IF NOT (NEW.train_number <=> OLD.train_number AND NEW.start_date <=> OLD.start_date
+                    AND NEW.station_id <=> OLD.station_id AND NEW.stop_order <=> OLD.stop_order
+                    AND NEW.departure_time <=> OLD.departure_time
+                    AND NEW.arrival_time <=> OLD.arrival_time) THEN
+                -- Schedule edits change which pairs exist and their times, so rebuild the run(s)
+                CALL sp_refresh_od_run(OLD.train_number, OLD.start_date);
+                IF NOT (NEW.train_number <=> OLD.train_number AND NEW.start_date <=> OLD.start_date) THEN
+                    CALL sp_refresh_od_run(NEW.train_number, NEW.start_date);
+                END IF;
+            -- Otherwise keep OdAvailability.min_seats in step with the segment that changed
+            ELSEIF NEW.seats < OLD.seats THEN
+                UPDATE OdAvailability od
+                SET od.min_seats = LEAST(od.min_seats, NEW.seats)
+                WHERE od.train_number = NEW.train_number
+                AND od.start_date = NEW.start_date
+                AND od.dep_stop_order <= NEW.stop_order
+                AND od.arr_stop_order > NEW.stop_order;
+            ELSEIF NEW.seats > OLD.seats THEN
+                -- Only pairs whose minimum was this segment can change
+                UPDATE OdAvailability od
+                SET od.min_seats = (
+                    SELECT MIN(s.seats)
+                    FROM Stopovers s
+                    WHERE s.train_number = od.train_number
+                    AND s.start_date = od.start_date
+                    AND s.stop_order >= od.dep_stop_order
+                    AND s.stop_order < od.arr_stop_order
+                )
+                WHERE od.train_number = NEW.train_number
+                AND od.start_date = NEW.start_date
+                AND od.dep_stop_order <= NEW.stop_order
+                AND od.arr_stop_order > NEW.stop_order
+                AND od.min_seats = OLD.seats;
+            END IF;
+        END;
+        """,
+        """
+        DROP TRIGGER IF EXISTS after_stopover_insert;
+        """,
+        """
+        CREATE TRIGGER after_stopover_insert
+        AFTER INSERT ON `Stopovers`
+        FOR EACH ROW
+        BEGIN
+            CALL sp_refresh_od_run(NEW.train_number, NEW.start_date);
+        END;
+        """,
+        """
+        DROP TRIGGER IF EXISTS after_stopover_delete;
+        """,
+        """
+        CREATE TRIGGER after_stopover_delete
+        AFTER DELETE ON `Stopovers`
+        FOR EACH ROW
+        BEGIN
+            CALL sp_refresh_od_run(OLD.train_number, OLD.start_date);
+        END;
+        """,
+        """
+        DROP TRIGGER IF EXISTS after_price_insert;
+        """,
+        """
+        CREATE TRIGGER after_price_insert
+        AFTER INSERT ON `Prices`
+        FOR EACH ROW
+        BEGIN
+            CALL sp_insert_od_pair(NEW.train_number, NEW.departure_station_id,
+                                   NEW.arrival_station_id, NEW.price);
+        END;
+        """,
+        """
+        DROP TRIGGER IF EXISTS after_price_update;
+        """,
+        """
+        CREATE TRIGGER after_price_update
+        AFTER UPDATE ON `Prices`
+        FOR EACH ROW
+        BEGIN
+            IF NEW.train_number = OLD.train_number
+                AND NEW.departure_station_id = OLD.departure_station_id
+                AND NEW.arrival_station_id = OLD.arrival_station_id THEN
+                UPDATE OdAvailability
+                SET price = NEW.price
+                WHERE train_number = NEW.train_number
+                AND departure_station_id = NEW.departure_station_id
+                AND arrival_station_id = NEW.arrival_station_id;
+            ELSE
+                DELETE FROM OdAvailability
+                WHERE train_number = OLD.train_number
+                AND departure_station_id = OLD.departure_station_id
+                AND arrival_station_id = OLD.arrival_station_id;
+
+                CALL sp_insert_od_pair(NEW.train_number, NEW.departure_station_id,
+                                       NEW.arrival_station_id, NEW.price);
             END IF;
         END;
         """,
         """
+        DROP TRIGGER IF EXISTS after_price_delete;
+        """,
+        """
+        CREATE TRIGGER after_price_delete
+        AFTER DELETE ON `Prices`
+        FOR EACH ROW
+        BEGIN
+            DELETE FROM OdAvailability
+            WHERE train_number = OLD.train_number
+            AND departure_station_id = OLD.departure_station_id
+            AND arrival_station_id = OLD.arrival_station_id;
+        END;
+        """,
+        """
         DROP TRIGGER IF EXISTS before_train_delete;
         """,
         """
@@ -413,13 +684,65 @@ def create_triggers(cursor):
         BEFORE DELETE ON `Trains`
         FOR EACH ROW
         BEGIN
-            -- Update all orders for this train that are Success or RefundPending to Refunded
-            -- Only affect future trips (start_date greater than current date)
-            UPDATE SalesOrders
-            SET status = 'Refunded', operation_type = 'Refund'
-            WHERE train_number = OLD.train_number
-            AND status IN ('Success', 'RefundPending')
-            AND start_date > CURDATE();
+            -- Partitioned tables have no foreign keys, so the former ON DELETE CASCADE is done here.
+            -- The orders are deleted with the train, so they are not marked Refunded first.
+            DELETE FROM SalesOrders WHERE train_number = OLD.train_number;
+            DELETE FROM Stopovers WHERE train_number = OLD.train_number;
+        END;
+        """,
+        """
+        DROP TRIGGER IF EXISTS before_order_delete;
+        """,
+        """
+        CREATE TRIGGER before_order_delete
+        BEFORE DELETE ON `SalesOrders`
+        FOR EACH ROW
+        BEGIN
+            DELETE FROM OrderOperations WHERE order_id = OLD.order_id;
+            DELETE FROM SeatHolds WHERE order_id = OLD.order_id;
+            DELETE FROM SeatAssignments WHERE order_id = OLD.order_id;
+            DELETE FROM OrderIds WHERE order_id = OLD.order_id;
+            INSERT INTO OrderChanges (order_id, status) VALUES (OLD.order_id, NULL);
+        END;
+        """,
+        """
+        DROP TRIGGER IF EXISTS before_station_delete;
+        """,
+        """
+        CREATE TRIGGER before_station_delete
+        BEFORE DELETE ON `Stations`
+        FOR EACH ROW
+        BEGIN
+            -- Stopovers.station_id used to be a restricting foreign key
+            IF EXISTS (SELECT 1 FROM Stopovers WHERE station_id = OLD.station_id) THEN
+                SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Station is still used by stopovers';
+            END IF;
+
+            DELETE FROM SalesOrders
+            WHERE departure_station_id = OLD.station_id
+            OR arrival_station_id = OLD.station_id;
+        END;
+        """,
+        """
+        DROP TRIGGER IF EXISTS before_customer_delete;
+        """,
+        """
+        CREATE TRIGGER before_customer_delete
+        BEFORE DELETE ON `Customers`
+        FOR EACH ROW
+        BEGIN
+            DELETE FROM SalesOrders WHERE customer_id = OLD.id_card;
+        END;
+        """,
+        """
+        DROP TRIGGER IF EXISTS before_salesperson_delete;
+        """,
+        """
+        CREATE TRIGGER before_salesperson_delete
+        BEFORE DELETE ON `Salespersons`
+        FOR EACH ROW
+        BEGIN
+            DELETE FROM OrderOperations WHERE salesperson_id = OLD.salesperson_id;
         END;
         """
     ]
@@ -463,7 +786,8 @@ def create_procedures(cursor):
                 LEFT JOIN OrderOperations op ON s.salesperson_id = op.salesperson_id
                 LEFT JOIN SalesOrders o ON op.order_id = o.order_id
             WHERE 
-                DATE(op.operation_time) = report_date
+                op.operation_time >= report_date
+                AND op.operation_time < report_date + INTERVAL 1 DAY
                 AND op.operation_type = 'Approve'
                 AND o.status IN ('Success', 'Refunded')
             GROUP BY 
@@ -500,7 +824,8 @@ def create_procedures(cursor):
                 LEFT JOIN OrderOperations op ON s.salesperson_id = op.salesperson_id
                 LEFT JOIN SalesOrders o ON op.order_id = o.order_id
             WHERE 
-                DATE(op.operation_time) = report_date
+                op.operation_time >= report_date
+                AND op.operation_time < report_date + INTERVAL 1 DAY
                 AND op.operation_type = 'Approve'
                 AND o.status IN ('Success', 'Refunded')
                 AND s.salesperson_id = staff_id
@@ -509,6 +834,149 @@ def create_procedures(cursor):
         END;
         """,
         """
+        DROP PROCEDURE IF EXISTS sp_insert_od_pair;
+        """,
+        """
+        CREATE PROCEDURE sp_insert_od_pair(
+            IN p_train_number VARCHAR(10),
+            IN p_departure_station_id INT,
+            IN p_arrival_station_id INT,
+            IN p_price DECIMAL(10, 2)
+        )
+        BEGIN
+            -- Materialize one priced station pair for every run of the train
+            INSERT INTO OdAvailability (
+                train_number, start_date,
+                departure_station_id, arrival_station_id,
+                dep_stop_order, arr_stop_order,
+                departure_time, arrival_time,
+                price, min_seats
+            )
+            SELECT 
+                s1.train_number,
+                s1.start_date,
+                s1.station_id,
+                s2.station_id,
+                s1.stop_order,
+                s2.stop_order,
+                s1.departure_time,
+                s2.arrival_time,
+                p_price,
+                (
+                    SELECT MIN(s3.seats)
+                    FROM Stopovers s3
+                    WHERE s3.train_number = s1.train_number
+                    AND s3.start_date = s1.start_date
+                    AND s3.stop_order >= s1.stop_order
+                    AND s3.stop_order < s2.stop_order
+                )
+            FROM 
+                Stopovers s1
+                JOIN Stopovers s2 ON s1.train_number = s2.train_number AND s1.start_date = s2.start_date
+            WHERE 
+                s1.train_number = p_train_number
+                AND s1.station_id = p_departure_station_id
+                AND s2.station_id = p_arrival_station_id
+                AND s1.stop_order < s2.stop_order
+            ON DUPLICATE KEY UPDATE
+                price = VALUES(price),
+                min_seats = VALUES(min_seats);
+        END;
+        """,
+        """
+        DROP PROCEDURE IF EXISTS sp_refresh_od_availability;
+        """,
+        """
+        CREATE PROCEDURE sp_refresh_od_availability(IN p_train_number VARCHAR(10))
+        BEGIN
+            -- Full rebuild (one train, or every train when NULL), used for backfills
+            -- and after bulk Stopovers loads
+            DELETE FROM OdAvailability
+            WHERE p_train_number IS NULL OR train_number = p_train_number;
+
+            INSERT INTO OdAvailability (
+                train_number, start_date,
+                departure_station_id, arrival_station_id,
+                dep_stop_order, arr_stop_order,
+                departure_time, arrival_time,
+                price, min_seats
+            )
+            SELECT 
+                s1.train_number,
+                s1.start_date,
+                s1.station_id,
+                s2.station_id,
+                s1.stop_order,
+                s2.stop_order,
+                s1.departure_time,
+                s2.arrival_time,
+                p.price,
+                MIN(s3.seats)
+            FROM 
+                Stopovers s1
+                JOIN Stopovers s2 ON s1.train_number = s2.train_number AND s1.start_date = s2.start_date
+                JOIN Stopovers s3 ON s1.train_number = s3.train_number AND s1.start_date = s3.start_date
+                JOIN Prices p ON s1.train_number = p.train_number 
+                    AND s1.station_id = p.departure_station_id
+                    AND s2.station_id = p.arrival_station_id
+            WHERE 
+                (p_train_number IS NULL OR s1.train_number = p_train_number)
+                AND s1.stop_order < s2.stop_order
+                AND s3.stop_order >= s1.stop_order
+                AND s3.stop_order < s2.stop_order
+            GROUP BY
+                s1.train_number, s1.start_date, s1.station_id, s2.station_id,
+                s1.stop_order, s2.stop_order, s1.departure_time, s2.arrival_time, p.price;
+        END;
+        """,
+        """
+        DROP PROCEDURE IF EXISTS sp_refresh_od_run;
+        """,
+        """
+        CREATE PROCEDURE sp_refresh_od_run(IN p_train_number VARCHAR(10), IN p_start_date DATE)
+        BEGIN
+            -- Rebuild the priced pairs of one run, called by the Stopovers insert/delete/update
+            -- triggers when a run's stops or times change
+            DELETE FROM OdAvailability
+            WHERE train_number = p_train_number AND start_date = p_start_date;
+
+            INSERT INTO OdAvailability (
+                train_number, start_date,
+                departure_station_id, arrival_station_id,
+                dep_stop_order, arr_stop_order,
+                departure_time, arrival_time,
+                price, min_seats
+            )
+            SELECT 
+                s1.train_number,
+                s1.start_date,
+                s1.station_id,
+                s2.station_id,
+                s1.stop_order,
+                s2.stop_order,
+                s1.departure_time,
+                s2.arrival_time,
+                p.price,
+                MIN(s3.seats)
+            FROM 
+                Stopovers s1
+                JOIN Stopovers s2 ON s1.train_number = s2.train_number AND s1.start_date = s2.start_date
+                JOIN Stopovers s3 ON s1.train_number = s3.train_number AND s1.start_date = s3.start_date
+                JOIN Prices p ON s1.train_number = p.train_number 
+                    AND s1.station_id = p.departure_station_id
+                    AND s2.station_id = p.arrival_station_id
+            WHERE 
+                s1.train_number = p_train_number
+                AND s1.start_date = p_start_date
+                AND s1.stop_order < s2.stop_order
+                AND s3.stop_order >= s1.stop_order
+                AND s3.stop_order < s2.stop_order
+            GROUP BY
+                s1.train_number, s1.start_date, s1.station_id, s2.station_id,
+                s1.stop_order, s2.stop_order, s1.departure_time, s2.arrival_time, p.price;
+        END;
+        """,
+        """
         DROP PROCEDURE IF EXISTS sp_get_train_route;
         """,
         """
@@ -576,6 +1044,104 @@ def create_procedures(cursor):
                     s.start_date, s.stop_order;
             END IF;
         END;
+        """,
+        """
+        DROP PROCEDURE IF EXISTS sp_maintain_table_partitions;
+        """,
+        """
+        CREATE PROCEDURE sp_maintain_table_partitions(
+            IN p_table VARCHAR(64),
+            IN p_months_ahead INT,
+            IN p_retention_months INT
+        )
+        BEGIN
+            -- Monthly partitions are named pYYYYMM and hold rows before the first day of the next month;
+            -- pmax catches everything beyond the last monthly partition
+            DECLARE v_last VARCHAR(64);
+            DECLARE v_month DATE;
+            DECLARE v_until DATE;
+            DECLARE v_cutoff VARCHAR(64);
+
+            SELECT MAX(PARTITION_NAME) INTO v_last
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = p_table
+            AND PARTITION_NAME <> 'pmax';
+
+            IF v_last IS NULL THEN
+                SET v_month = CAST(DATE_FORMAT(CURDATE(), '%Y-%m-01') AS DATE);
+            ELSE
+                SET v_month = STR_TO_DATE(CONCAT(SUBSTRING(v_last, 2), '01'), '%Y%m%d') + INTERVAL 1 MONTH;
+            END IF;
+            SET v_until = CAST(DATE_FORMAT(CURDATE(), '%Y-%m-01') AS DATE) + INTERVAL p_months_ahead MONTH;
+
+            -- Split new months off pmax
+            WHILE v_month <= v_until DO
+                SET @partition_sql = CONCAT(
+                    'ALTER TABLE `', p_table, '` REORGANIZE PARTITION pmax INTO (',
+                    'PARTITION p', DATE_FORMAT(v_month, '%Y%m'),
+                    ' VALUES LESS THAN (''', v_month + INTERVAL 1 MONTH, '''), ',
+                    'PARTITION pmax VALUES LESS THAN (MAXVALUE))'
+                );
+                PREPARE stmt FROM @partition_sql;
+                EXECUTE stmt;
+                DEALLOCATE PREPARE stmt;
+                SET v_month = v_month + INTERVAL 1 MONTH;
+            END WHILE;
+
+            -- Drop months older than the retention window
+            IF p_retention_months IS NOT NULL THEN
+                SET v_cutoff = CONCAT('p', DATE_FORMAT(CURDATE() - INTERVAL p_retention_months MONTH, '%Y%m'));
+                SET v_last = NULL;
+                SELECT MIN(PARTITION_NAME) INTO v_last
+                FROM information_schema.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = p_table
+                AND PARTITION_NAME <> 'pmax'
+                AND PARTITION_NAME < v_cutoff;
+
+                WHILE v_last IS NOT NULL DO
+                    SET @partition_sql = CONCAT('ALTER TABLE `', p_table, '` DROP PARTITION ', v_last);
+                    PREPARE stmt FROM @partition_sql;
+                    EXECUTE stmt;
+                    DEALLOCATE PREPARE stmt;
+
+                    SET v_last = NULL;
+                    SELECT MIN(PARTITION_NAME) INTO v_last
+                    FROM information_schema.PARTITIONS
+                    WHERE TABLE_SCHEMA = DATABASE()
+                    AND TABLE_NAME = p_table
+                    AND PARTITION_NAME <> 'pmax'
+                    AND PARTITION_NAME < v_cutoff;
+                END WHILE;
+            END IF;
+        END;
+        """,
+        """
+        DROP PROCEDURE IF EXISTS sp_maintain_partitions;
+        """,
+        """
+        CREATE PROCEDURE sp_maintain_partitions(
+            IN p_months_ahead INT,
+            IN p_retention_months INT
+        )
+        BEGIN
+            -- Only past runs' availability is dropped; orders and their operations are history
+            -- (and OrderIds must keep matching SalesOrders), so those tables only gain new months
+            CALL sp_maintain_table_partitions('Stopovers', p_months_ahead, p_retention_months);
+            CALL sp_maintain_table_partitions('SalesOrders', p_months_ahead, NULL);
+            CALL sp_maintain_table_partitions('OrderOperations', p_months_ahead, NULL);
+
+            -- Dropping partitions skips the delete triggers, so clean up rows derived from the dropped runs
+            IF p_retention_months IS NOT NULL THEN
+                DELETE FROM OdAvailability
+                WHERE start_date < CAST(DATE_FORMAT(CURDATE() - INTERVAL p_retention_months MONTH, '%Y-%m-01') AS DATE);
+                DELETE FROM SeatHolds
+                WHERE start_date < CAST(DATE_FORMAT(CURDATE() - INTERVAL p_retention_months MONTH, '%Y-%m-01') AS DATE);
+                DELETE FROM SeatAssignments
+                WHERE start_date < CAST(DATE_FORMAT(CURDATE() - INTERVAL p_retention_months MONTH, '%Y-%m-01') AS DATE);
+            END IF;
+        END;
         """
     ]
     
@@ -590,6 +1156,49 @@ def create_procedures(cursor):
             print(f"Error creating procedure: {err}")
             raise
 
+def create_events(cursor):
+    """Create scheduled events (requires event_scheduler=ON on the server)"""
+    retention = PARTITION_RETENTION_MONTHS if PARTITION_RETENTION_MONTHS is not None else "NULL"
+    event_statements = [
+        """
+        DROP EVENT IF EXISTS ev_maintain_partitions;
+        """,
+        f"""
+        CREATE EVENT ev_maintain_partitions
+        ON SCHEDULE EVERY 1 DAY
+        STARTS CURRENT_DATE + INTERVAL 1 DAY + INTERVAL 3 HOUR
+        DO CALL sp_maintain_partitions({PARTITION_MONTHS_AHEAD}, {retention});
+        """,
+        """
+        DROP EVENT IF EXISTS ev_purge_idempotency_keys;
+        """,
+        """
+        CREATE EVENT ev_purge_idempotency_keys
+        ON SCHEDULE EVERY 1 HOUR
+        DO DELETE FROM IdempotencyKeys WHERE expires_at <= NOW();
+        """,
+        """
+        DROP EVENT IF EXISTS ev_purge_order_changes;
+        """,
+        f"""
+        CREATE EVENT ev_purge_order_changes
+        ON SCHEDULE EVERY 1 DAY
+        STARTS CURRENT_DATE + INTERVAL 1 DAY + INTERVAL 4 HOUR
+        DO DELETE FROM OrderChanges WHERE changed_at < NOW() - INTERVAL {ORDER_CHANGES_RETENTION_DAYS} DAY;
+        """
+    ]
+
+    for stmt in event_statements:
+        try:
+            cursor.execute(stmt)
+            if "CREATE EVENT" in stmt:
+                print(f"Created event: {stmt.split('CREATE EVENT')[1].split()[0].strip()}")
+            else:
+                print(f"Dropped event: {stmt.split('DROP EVENT IF EXISTS')[1].split(';')[0].strip()}")
+        except Error as err:
+            print(f"Error creating event: {err}")
+            raise
+
 if __name__ == "__main__":
     print("Setting up database...")
     if setup_database(drop_existing=True):
@@ -1,6 +1,9 @@
 # models.py
 
 from db import db  # Import the singleton database instance
+from utils.search_cache import search_cache
+from utils.station_index import station_index
+from utils.seat_allocator import seat_allocators
 
 class BaseModel:
     """Base class for common CRUD operations."""
@@ -120,6 +123,7 @@ class Train(BaseModel):
             if not dep_station:
                 new_dep_station = Station(station_name=departure_station_name)
                 new_dep_station.save()
+                station_index.invalidate()
                 dep_station = Station.find_one({"station_name": departure_station_name})
                 if not dep_station:
                     return False
@@ -129,6 +133,7 @@ class Train(BaseModel):
             if not arr_station:
                 new_arr_station = Station(station_name=arrival_station_name)
                 new_arr_station.save()
+                station_index.invalidate()
                 arr_station = Station.find_one({"station_name": arrival_station_name})
                 if not arr_station:
                     return False
@@ -154,6 +159,10 @@ class Train(BaseModel):
                 params = (train_type, int(total_seats), dep_station['station_id'], arr_station['station_id'], train_number)
                 result = db.execute_query(query, params)
                 
+            # 列车类型等信息会出现在查询结果中，总座位数变化时需要重建座位分配器
+            search_cache.invalidate_train(train_number)
+            seat_allocators.invalidate_train(train_number)
+
             # 验证保存结果
             verify = cls.find_one({"train_number": train_number})
             return verify is not None
@@ -177,6 +186,15 @@ class Train(BaseModel):
         ORDER BY t.train_number
         """
         return db.execute_query(query, fetch_all=True)
+
+    @classmethod
+    def delete(cls, conditions):
+        """删除列车，同时使该列车的查询缓存和座位分配器失效（订单和经停站由 before_train_delete 一并删除）"""
+        result = super().delete(conditions)
+        if result and conditions.get('train_number'):
+            search_cache.invalidate_train(conditions['train_number'])
+            seat_allocators.invalidate_train(conditions['train_number'])
+        return result
  
 
 class Stopover(BaseModel):
@@ -192,6 +210,43 @@ class Stopover(BaseModel):
             stop_order=stop_order, seats=seats
         )
 
+    def save(self):
+        """保存经停站，同时使所属运行的查询缓存和座位分配器失效
+
+        OdAvailability 由 Stopovers 上的插入、删除和更新触发器按运行重建。
+        """
+        previous = None
+        if getattr(self, self._primary_key, None) is not None:
+            previous = self.find_one({self._primary_key: getattr(self, self._primary_key)})
+        result = super().save()
+        if result:
+            runs = {(getattr(self, 'train_number', None), getattr(self, 'start_date', None))}
+            if previous:
+                runs.add((previous['train_number'], previous['start_date']))
+            self._invalidate_runs(runs)
+        return result
+
+    @classmethod
+    def delete(cls, conditions):
+        """删除经停站，同时使所属运行的查询缓存和座位分配器失效"""
+        affected = cls.find_all(conditions) if conditions else None
+        result = super().delete(conditions)
+        if result:
+            cls._invalidate_runs({(row['train_number'], row['start_date']) for row in affected or []})
+        return result
+
+    @staticmethod
+    def _invalidate_runs(runs):
+        for train_number, start_date in runs:
+            if train_number is None:
+                continue
+            if start_date is None:
+                search_cache.invalidate_train(train_number)
+                seat_allocators.invalidate_train(train_number)
+            else:
+                search_cache.invalidate_run(train_number, start_date)
+                seat_allocators.invalidate_run(train_number, start_date)
+
 
 class Price(BaseModel):
     _table_name = "Prices"
@@ -313,6 +368,10 @@ class Price(BaseModel):
                     price=price
                 )
                 price_obj.save()
+
+            # 票价变更影响该列车所有运行日期以及该起止站的查询结果
+            search_cache.invalidate_train(train_number)
+            search_cache.invalidate_route(departure_station_name, arrival_station_name)
                 
             return True
             
@@ -358,12 +417,62 @@ class Price(BaseModel):
             query = f"UPDATE `{cls._table_name}` SET {', '.join(set_clauses)} WHERE {' AND '.join(where_clauses)}"
             params = set_params + where_params
             
-            return db.execute_query(query, tuple(params))
+            # 改变列车或起止站时，原线路和新线路的查询结果都会变化
+            affected = cls._find_affected_routes(conditions, values)
+            result = db.execute_query(query, tuple(params))
+            cls._invalidate_routes(affected)
+            return result
             
         except Exception as e:
             print(f"Error updating price: {e}")
             return False
 
+    @classmethod
+    def delete(cls, conditions):
+        """删除价格记录，同时使相关列车和线路的查询缓存失效"""
+        affected = cls._find_affected_routes(conditions)
+        result = super().delete(conditions)
+        cls._invalidate_routes(affected)
+        return result
+
+    @classmethod
+    def _find_affected_routes(cls, conditions, values=None):
+        """查找受价格变更影响的 (列车号, 出发站名, 到达站名)
+
+        Args:
+            conditions: 价格记录的筛选条件
+            values: 要更新的值，给出时同时包含更新后的列车和起止站
+        """
+        rows = cls.find_all(conditions) if conditions else None
+        routes = set()
+        for row in rows or []:
+            routes.add((row['train_number'], int(row['departure_station_id']), int(row['arrival_station_id'])))
+            if values:
+                routes.add((
+                    values.get('train_number', row['train_number']),
+                    int(values.get('departure_station_id', row['departure_station_id'])),
+                    int(values.get('arrival_station_id', row['arrival_station_id']))
+                ))
+        if not routes:
+            return set()
+
+        station_ids = {route[1] for route in routes} | {route[2] for route in routes}
+        placeholders = ", ".join(["%s"] * len(station_ids))
+        stations = db.execute_query(
+            f"SELECT station_id, station_name FROM Stations WHERE station_id IN ({placeholders})",
+            tuple(station_ids), fetch_all=True
+        )
+        names = {station['station_id']: station['station_name'] for station in stations or []}
+        return {(train_number, names.get(dep), names.get(arr)) for train_number, dep, arr in routes}
+
+    @staticmethod
+    def _invalidate_routes(routes):
+        """使 _find_affected_routes 返回的列车和起止站的查询缓存失效"""
+        for train_number, dep_station_name, arr_station_name in routes:
+            search_cache.invalidate_train(train_number)
+            if dep_station_name and arr_station_name:
+                search_cache.invalidate_route(dep_station_name, arr_station_name)
+
 class Salesperson(BaseModel):
     _table_name = "Salespersons"
     _primary_key = "salesperson_id"
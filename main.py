@@ -14,6 +14,9 @@ from core.order_management import OrderManagementInterface
 from core.route_viewer import RouteViewerInterface
 from core.staff_management import StaffManagementInterface
 from core.login_manager import LoginManager
+from core.hold_sweeper import SeatHoldSweeper
+from core.booking_queue import booking_queue
+from core.auto_approval import auto_approval
 
 from utils.gui_utils import GUIUtils
 
@@ -66,6 +69,9 @@ class MainApplication:
         
         self.train_management = TrainManagementInterface(self.main_window, train_mgmt_utils)
         
+        # 后台释放过期的座位预留
+        self.hold_sweeper = SeatHoldSweeper()
+        
     def run(self):
         """运行应用程序"""
         # 初始化数据库
@@ -78,6 +84,9 @@ class MainApplication:
         #     self.main_window.destroy()
         #     return
 
+        self.hold_sweeper.start()
+        booking_queue.start()
+
         # 显示登录界面
         self.login_manager.show_login_frame(self.show_main_menu_frame)
         
@@ -90,10 +99,16 @@ class MainApplication:
         self.main_window.mainloop()
         
         # 关闭数据库连接
+        self.hold_sweeper.stop()
+        auto_approval.stop()
+        booking_queue.stop()
         db.close()
     
     def on_closing(self):
         """窗口关闭处理"""
+        self.hold_sweeper.stop()
+        auto_approval.stop()
+        booking_queue.stop()
         db.close()  # 关闭数据库连接
         self.main_window.destroy()
     
@@ -129,6 +144,9 @@ class MainApplication:
         tk.Button(self.main_window, text="View Train Route", 
                command=self.route_viewer.show_train_route_frame, width=30).pack(pady=5)
 
+        tk.Button(self.main_window, text="Station Board", 
+               command=self.route_viewer.show_station_board_frame, width=30).pack(pady=5)
+
         tk.Button(self.main_window, text="View Train Information", 
                command=lambda: self.display_table(
                    TrainService.list_all_trains,
@@ -183,7 +201,8 @@ class MainApplication:
         self.show_main_menu_frame()
     
     def display_table(self, get_data_func, columns, enable_booking=False, is_order_view=False, 
-         is_staff_view=False, staff_info=None, window_size="800x400"):
+         is_staff_view=False, staff_info=None, window_size="800x400", get_more_func=None, page_size=None,
+         get_changes_func=None, poll_interval=None):
         """显示数据表格窗口
 
         参数:
@@ -194,6 +213,10 @@ class MainApplication:
             is_staff_view: 是否为员工视图
             staff_info: 员工信息
             window_size: 窗口大小，格式为"宽x高"，如"800x400"
+            get_more_func: 分页数据的下一页函数，参数为当前最后一行，为空时一次显示全部数据
+            page_size: 每页行数，返回的行数少于该值时不再显示加载更多
+            get_changes_func: 增量数据函数，参数为上次返回的变更序号，设置后刷新时只更新变化的行
+            poll_interval: 设置 get_changes_func 时自动刷新的间隔（毫秒），为空时只在操作后刷新
         """
         data_window = self.utils.create_modal_window(
             "Data View",
@@ -240,8 +263,9 @@ class MainApplication:
                     selected_cell["item"] = item
                     selected_cell["column"] = col_idx
                     
-                    # 显示选中的单元格
-                    tree.selection_set(item)
+                    # 显示选中的单元格（按住 Shift/Ctrl 时保留多选）
+                    if not event.state & 0x0005:
+                        tree.selection_set(item)
                     
                     # 更新状态标签
                     if "values" in tree.item(item):
@@ -307,15 +331,101 @@ class MainApplication:
         status_label = tk.Label(data_window, text="Right-click to copy cell content", anchor="w")
         status_label.grid(row=2, column=0, sticky="ew", pady=2, padx=5)
 
-        try:
-            data, error = get_data_func()
-            
+        # 按表格项记录原始行数据（Treeview 会把数字样式的字符串转换为整数，如去掉订单号的前导零）
+        rows = {}
+
+        def insert_rows(data):
+            for row in data:
+                item = tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
+                rows[item] = row
+            if get_more_func:
+                more_btn['state'] = 'normal' if page_size and len(data) >= page_size else 'disabled'
+
+        def reload_rows():
+            if get_changes_func:
+                apply_changes()
+                return
+            tree.delete(*tree.get_children())
+            rows.clear()
+            data, _ = get_data_func()
+            insert_rows(data or [])
+
+        # 增量刷新：按首列（订单ID）更新、插入或移除变化的行，保留当前的选择和滚动位置
+        feed = {"seq": None, "more": False}
+        items_by_key = {}
+
+        def apply_changes():
+            changes, error = get_changes_func(feed["seq"])
             if error:
-                messagebox.showinfo("Information", error)
-            
-            if data:
-                for row in data:
-                    tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
+                return error
+            if changes['reset']:
+                tree.delete(*tree.get_children())
+                rows.clear()
+                items_by_key.clear()
+            for key in changes['removed']:
+                item = items_by_key.pop(key, None)
+                if item:
+                    tree.delete(item)
+                    rows.pop(item, None)
+            # 新行按从新到旧返回，逆序插入到顶部；完整列表按原顺序追加
+            for row in (changes['rows'] if changes['reset'] else reversed(changes['rows'])):
+                values = [str(item) if item is not None else "-" for item in row]
+                item = items_by_key.get(row[0])
+                if item:
+                    tree.item(item, values=values)
+                else:
+                    item = tree.insert("", "end" if changes['reset'] else 0, values=values)
+                    items_by_key[row[0]] = item
+                rows[item] = row
+            feed["seq"] = changes['seq']
+            feed["more"] = changes['more']
+            return None
+
+        def poll_changes():
+            # 定时器挂在主窗口上，表格窗口关闭后在这里停止
+            if not data_window.winfo_exists():
+                return
+            try:
+                apply_changes()
+            except Exception as e:
+                print(f"Error refreshing data: {e}")
+                feed["more"] = False
+            # 积压的变更分页返回，还有下一页时立即再取，期间界面照常响应
+            self.main_window.after(0 if feed["more"] else poll_interval, poll_changes)
+
+        def load_more():
+            children = tree.get_children()
+            if not children:
+                return
+            try:
+                data, error = get_more_func(rows[children[-1]])
+            except Exception as e:
+                messagebox.showerror("Error", f"An error occurred: {str(e)}")
+                return
+            if data is None or (error and not data):
+                more_btn['state'] = 'disabled'
+                return
+            insert_rows(data)
+
+        if get_more_func:
+            more_btn = tk.Button(data_window, text="Load More", state='disabled', command=load_more)
+            more_btn.grid(row=3, column=0, pady=5)
+
+        try:
+            if get_changes_func:
+                error = apply_changes()
+                if error:
+                    messagebox.showinfo("Information", error)
+                if poll_interval:
+                    self.main_window.after(0 if feed["more"] else poll_interval, poll_changes)
+            else:
+                data, error = get_data_func()
+                
+                if error:
+                    messagebox.showinfo("Information", error)
+                
+                if data:
+                    insert_rows(data)
                     
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
@@ -363,21 +473,14 @@ class MainApplication:
                 cancel_btn['state'] = 'normal' if order_status == 'Ready' else 'disabled'
                 refund_btn['state'] = 'normal' if order_status == 'Success' else 'disabled'
 
-            def refresh_orders():
-                tree.delete(*tree.get_children())
-                data, _ = get_data_func()
-                if data:
-                    for row in data:
-                        tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
-
             def cancel_order():
                 selected_items = tree.selection()
                 if not selected_items:
                     messagebox.showwarning("Warning", "Please select an order first")
                     return
                 item = selected_items[0]
-                order_id = tree.item(item)['values'][0]
-                self.order_management.cancel_order(order_id, refresh_orders)
+                order_id = rows[item][0]
+                self.order_management.cancel_order(order_id, reload_rows)
 
             def request_refund():
                 selected_items = tree.selection()
@@ -385,8 +488,8 @@ class MainApplication:
                     messagebox.showwarning("Warning", "Please select an order first")
                     return
                 item = selected_items[0]
-                order_id = tree.item(item)['values'][0]
-                self.order_management.request_refund(order_id, refresh_orders)
+                order_id = rows[item][0]
+                self.order_management.request_refund(order_id, reload_rows)
 
             tree.bind('<<TreeviewSelect>>', on_select)
             
@@ -405,45 +508,43 @@ class MainApplication:
                 selected_items = tree.selection()
                 if not selected_items:
                     return
-                item = selected_items[0]
-                values = tree.item(item)['values']
-                status = values[-1]
-                approve_btn['state'] = 'normal' if status in ('Ready', 'RefundPending') else 'disabled'
-                reject_btn['state'] = 'normal' if status in ('Ready', 'RefundPending') else 'disabled'
-
-            def refresh_orders():
-                tree.delete(*tree.get_children())
-                data, _ = get_data_func()
-                if data:
-                    for row in data:
-                        tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
+                # 多选时所有选中订单都可处理才启用按钮
+                processable = all(
+                    tree.item(item)['values'][-1] in ('Ready', 'RefundPending')
+                    for item in selected_items
+                )
+                approve_btn['state'] = 'normal' if processable else 'disabled'
+                reject_btn['state'] = 'normal' if processable else 'disabled'
 
-            def process_order_approve():
+            def process_selected_orders(approve):
                 selected_items = tree.selection()
                 if not selected_items:
                     messagebox.showwarning("Warning", "Please select an order first")
                     return
-                item = selected_items[0]
-                order_id = tree.item(item)['values'][0]
-                self.staff_management.process_order(
-                    order_id, staff_info['salesperson_id'], True, refresh_orders
-                )
+                order_ids = [str(rows[item][0]) for item in selected_items]
+                if len(order_ids) == 1:
+                    self.staff_management.process_order(
+                        order_ids[0], staff_info['salesperson_id'], approve, reload_rows
+                    )
+                else:
+                    self.staff_management.process_orders(
+                        order_ids, staff_info['salesperson_id'], approve, reload_rows
+                    )
+
+            def process_order_approve():
+                process_selected_orders(True)
 
             def process_order_reject():
-                selected_items = tree.selection()
-                if not selected_items:
-                    messagebox.showwarning("Warning", "Please select an order first")
-                    return
-                item = selected_items[0]
-                order_id = tree.item(item)['values'][0]
-                self.staff_management.process_order(
-                    order_id, staff_info['salesperson_id'], False, refresh_orders
-                )
+                process_selected_orders(False)
 
+            tree.configure(selectmode="extended")
             tree.bind('<<TreeviewSelect>>', on_select)
             
             action_frame = tk.Frame(data_window)
             action_frame.grid(row=2, column=0, pady=5)
+
+            tk.Label(action_frame, text="Ctrl/Shift+click to select several orders",
+                font=("Arial", 10, "italic")).pack(side=tk.LEFT, padx=5)
             
             approve_btn = tk.Button(action_frame, text="Approve", state='disabled', command=process_order_approve)
             approve_btn.pack(side=tk.LEFT, padx=5)
@@ -451,7 +552,7 @@ class MainApplication:
             reject_btn = tk.Button(action_frame, text="Reject", state='disabled', command=process_order_reject)
             reject_btn.pack(side=tk.LEFT, padx=5)
 
-        tk.Button(data_window, text="Close", command=data_window.destroy).grid(row=3, column=0, pady=5)
+        tk.Button(data_window, text="Close", command=data_window.destroy).grid(row=4, column=0, pady=5)
 
 
 # 应用程序入口
@@ -0,0 +1 @@
+# Make 'tests' a proper package
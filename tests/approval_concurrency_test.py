@@ -0,0 +1,136 @@
+# approval_concurrency_test.py
+#
+# 订单批准并发测试：为一趟列车生成远多于座位数的待处理订单，由多个线程同时调用
+# OrderService.process_order 批准（每个订单由两名乘务员重复提交），结束后校验：
+#   1. 每个区间的成功订单数不超过总座位数（无超售）
+#   2. 每个区间的余票 = 总座位数 - 覆盖该区间的成功订单数（无丢失更新）
+#   3. 每个成功订单只有一条批准记录（无重复批准）
+#   4. 成功订单的座位号在重叠的区间上互不相同
+# 另外校验删除中间站（stop_order 不再连续）后跨越该站的订单仍可批准。
+# 需要 MySQL（见 db_fixture）。
+
+import random
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.db_fixture import TempDatabase, populate_run, insert_ready_orders, TRAIN_NUMBER, START_DATE
+
+STOPS = 6
+SEATS = 40
+ORDERS = 400
+WORKERS = 8
+STAFF = 4
+SEED = 42
+
+
+class ApprovalConcurrencyTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.database = TempDatabase(pool_size=WORKERS).create()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.database.drop()
+
+    def setUp(self):
+        from utils.seat_allocator import seat_allocators
+
+        conn = self.database.connect()
+        cursor = conn.cursor()
+        for table in ('OrderOperations', 'SeatHolds', 'SalesOrders', 'Prices', 'Stopovers',
+                      'Trains', 'Customers', 'Salespersons', 'Stations'):
+            cursor.execute(f"DELETE FROM `{table}`")
+        self.staff_ids = populate_run(cursor, STOPS, SEATS, staff=STAFF)
+        conn.commit()
+        self.conn = conn
+        self.cursor = cursor
+        seat_allocators.clear()
+
+    def tearDown(self):
+        self.cursor.close()
+        self.conn.close()
+
+    def approve_concurrently(self, order_ids):
+        from core.services import OrderService
+
+        # 每个订单由两名乘务员各提交一次，打乱顺序以制造同一订单和同一区间上的竞争
+        tasks = [(order_id, self.staff_ids[i % len(self.staff_ids)]) for order_id in order_ids for i in range(2)]
+        random.Random(SEED).shuffle(tasks)
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            return list(executor.map(lambda task: OrderService.process_order(task[0], True, task[1]), tasks))
+
+    def fetch(self, query, params=()):
+        self.conn.commit()  # 结束当前快照，读取最新数据
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
+
+    def test_no_overselling(self):
+        rng = random.Random(SEED)
+        segments = []
+        for _ in range(ORDERS):
+            dep = rng.randint(1, STOPS - 1)
+            segments.append((dep, rng.randint(dep + 1, STOPS)))
+        order_ids = insert_ready_orders(self.cursor, segments)
+        self.conn.commit()
+
+        results = self.approve_concurrently(order_ids)
+        approved = sum(1 for success, _ in results if success)
+
+        sold = [0] * (STOPS + 1)
+        success_orders = self.fetch(
+            "SELECT dep_stop_order, arr_stop_order, seat_number FROM SalesOrders WHERE status = 'Success'"
+        )
+        self.assertEqual(len(success_orders), approved)
+        for dep, arr, _ in success_orders:
+            for segment in range(dep, arr):
+                sold[segment] += 1
+
+        remaining = dict(self.fetch(
+            "SELECT stop_order, seats FROM Stopovers WHERE train_number = %s AND start_date = %s",
+            (TRAIN_NUMBER, START_DATE)
+        ))
+        for segment in range(1, STOPS):
+            self.assertLessEqual(sold[segment], SEATS, f"segment {segment} oversold")
+            self.assertEqual(remaining[segment], SEATS - sold[segment], f"segment {segment} lost an update")
+        # 订单远多于座位，至少有一个区间售罄
+        self.assertIn(SEATS, sold[1:STOPS])
+
+        duplicates = self.fetch(
+            "SELECT order_id FROM OrderOperations WHERE operation_type = 'Approve' "
+            "GROUP BY order_id HAVING COUNT(*) > 1"
+        )
+        self.assertEqual(duplicates, [])
+
+        for i, (dep, arr, seat) in enumerate(success_orders):
+            self.assertIsNotNone(seat)
+            for other_dep, other_arr, other_seat in success_orders[i + 1:]:
+                if seat == other_seat:
+                    self.assertTrue(arr <= other_dep or other_arr <= dep, f"seat {seat} sold twice")
+
+    def test_booking_across_deleted_stop(self):
+        from core.services import OrderService
+
+        # 删除第3站后 stop_order 为 1, 2, 4, 5, 6，区间 [2, 4) 只有一行
+        self.cursor.execute(
+            "DELETE FROM Stopovers WHERE train_number = %s AND start_date = %s AND stop_order = 3",
+            (TRAIN_NUMBER, START_DATE)
+        )
+        order_ids = insert_ready_orders(self.cursor, [(2, 4)] * SEATS + [(1, 5)])
+        self.conn.commit()
+
+        for order_id in order_ids[:SEATS]:
+            success, message = OrderService.process_order(order_id, True, self.staff_ids[0])
+            self.assertTrue(success, message)
+        success, message = OrderService.process_order(order_ids[-1], True, self.staff_ids[0])
+        self.assertFalse(success)
+
+        remaining = dict(self.fetch(
+            "SELECT stop_order, seats FROM Stopovers WHERE train_number = %s AND start_date = %s",
+            (TRAIN_NUMBER, START_DATE)
+        ))
+        self.assertEqual(remaining, {1: SEATS, 2: 0, 4: SEATS, 5: SEATS, 6: SEATS})
+
+
+if __name__ == "__main__":
+    unittest.main()
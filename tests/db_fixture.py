@@ -0,0 +1,167 @@
+# db_fixture.py
+#
+# 需要 MySQL 的测试共用的临时数据库：在 DB_CONFIG 指向的服务器上新建 <database>_test，
+# 按 db_setup 建表、视图、存储过程和触发器，并让全局 db 实例和连接池指向它。
+# 未安装 mysql.connector 或无法连接服务器时跳过测试。
+#
+# 运行全部测试（在项目根目录执行）:
+#   python -m unittest discover -s tests -p "*test.py"
+
+import datetime
+import unittest
+
+START_DATE = datetime.date(2025, 1, 1)
+TRAIN_NUMBER = 'T0001'
+
+
+class TempDatabase:
+    """测试用临时数据库"""
+
+    def __init__(self, pool_size=None):
+        """
+        Args:
+            pool_size (int, optional): 连接池大小，并发测试需要多于默认的 POOL_SIZE
+        """
+        try:
+            import mysql.connector
+        except ImportError:
+            raise unittest.SkipTest("mysql.connector is not installed")
+        from db import database as database_module
+        from db.db_config import DB_CONFIG
+
+        self.config = DB_CONFIG
+        self.original_database = DB_CONFIG['database']
+        self.name = f"{self.original_database}_test"
+        self._original_pool_size = database_module.POOL_SIZE
+        self.pool_size = pool_size
+        self._mysql = mysql.connector
+
+    def connect(self, database=None):
+        config = dict(self.config)
+        config['database'] = database or self.name
+        return self._mysql.connect(**config)
+
+    def create(self):
+        """新建数据库并让全局 db 实例指向它
+
+        Raises:
+            unittest.SkipTest: 无法连接 MySQL 服务器
+        """
+        config = {key: value for key, value in self.config.items() if key != 'database'}
+        try:
+            conn = self._mysql.connect(**config)
+        except self._mysql.Error as e:
+            raise unittest.SkipTest(f"MySQL server is not available: {e}")
+        cursor = conn.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS `{self.name}`")
+        cursor.execute(f"CREATE DATABASE `{self.name}` DEFAULT CHARACTER SET 'utf8mb4'")
+        cursor.close()
+        conn.close()
+
+        from db.db_setup import create_tables, create_views, create_triggers, create_procedures
+        conn = self.connect()
+        cursor = conn.cursor(buffered=True)
+        try:
+            create_tables(cursor)
+            create_views(cursor)
+            create_triggers(cursor)
+            create_procedures(cursor)
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+        self._point_db(self.name, self.pool_size)
+        return self
+
+    def drop(self):
+        """删除数据库，全局 db 实例恢复指向原数据库"""
+        self._point_db(self.original_database, self._original_pool_size)
+        conn = self.connect(self.original_database)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{self.name}`")
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _point_db(self, database, pool_size=None):
+        from db import db
+        from db import database as database_module
+        from utils.search_cache import search_cache
+        from utils.seat_allocator import seat_allocators
+
+        if pool_size is not None:
+            database_module.POOL_SIZE = pool_size
+        self.config['database'] = database
+        db.close()
+        db.connect()
+        db.pool = None
+        search_cache.clear()
+        seat_allocators.clear()
+
+
+def populate_run(cursor, stops, seats, staff=1):
+    """生成一趟列车 TRAIN_NUMBER 在 START_DATE 的运行、各区间票价、一名乘客和 staff 名乘务员
+
+    车站编号和 stop_order 均为 1..stops。
+
+    Returns:
+        list: 乘务员ID列表
+    """
+    cursor.executemany(
+        "INSERT INTO `Stations` (`station_name`, `station_code`) VALUES (%s, %s)",
+        [(f"S{i:03d}", f"C{i:03d}") for i in range(1, stops + 1)]
+    )
+    cursor.execute(
+        "INSERT INTO `Trains` (`train_number`, `train_type`, `total_seats`, `departure_station_id`, "
+        "`arrival_station_id`) VALUES (%s, %s, %s, %s, %s)",
+        (TRAIN_NUMBER, 'High-Speed', seats, 1, stops)
+    )
+
+    t = datetime.datetime.combine(START_DATE, datetime.time(8))
+    stopovers = []
+    for order in range(1, stops + 1):
+        arrival = t if order > 1 else None
+        departure = t + datetime.timedelta(minutes=2) if order < stops else None
+        stopovers.append((TRAIN_NUMBER, order, START_DATE, arrival, departure, order, seats))
+        t += datetime.timedelta(minutes=30)
+    cursor.executemany(
+        "INSERT INTO `Stopovers` (`train_number`, `station_id`, `start_date`, `arrival_time`, "
+        "`departure_time`, `stop_order`, `seats`) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        stopovers
+    )
+    cursor.executemany(
+        "INSERT INTO `Prices` (`train_number`, `departure_station_id`, `arrival_station_id`, `price`) "
+        "VALUES (%s, %s, %s, %s)",
+        [(TRAIN_NUMBER, i, j, 10 * (j - i)) for i in range(1, stops + 1) for j in range(i + 1, stops + 1)]
+    )
+
+    cursor.execute("INSERT INTO `Customers` (`name`, `phone`, `id_card`) VALUES (%s, %s, %s)",
+                   ('Test', '10000000000', 'TEST0001'))
+    staff_ids = [f"T{i:03d}" for i in range(staff)]
+    cursor.executemany(
+        "INSERT INTO `Salespersons` (`salesperson_id`, `salesperson_name`, `contact_number`, `email`, "
+        "`password`, `role`) VALUES (%s, %s, %s, %s, %s, 'Salesperson')",
+        [(sid, sid, '10000000000', f"{sid}@test.local", '-') for sid in staff_ids]
+    )
+    return staff_ids
+
+
+def insert_ready_orders(cursor, segments):
+    """为 (dep_stop_order, arr_stop_order) 列表插入待审批、没有座位预留的新订单
+
+    Returns:
+        list: 订单ID列表
+    """
+    rows = [
+        (f"O{n:08d}", TRAIN_NUMBER, START_DATE, dep, arr, dep, arr, 10 * (arr - dep), 'TEST0001')
+        for n, (dep, arr) in enumerate(segments)
+    ]
+    cursor.executemany(
+        "INSERT INTO `SalesOrders` (`order_id`, `train_number`, `start_date`, `departure_station_id`, "
+        "`arrival_station_id`, `dep_stop_order`, `arr_stop_order`, `price`, `customer_id`, "
+        "`operation_type`, `status`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'Booking', 'Ready')",
+        rows
+    )
+    return [row[0] for row in rows]
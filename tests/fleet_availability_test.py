@@ -0,0 +1,82 @@
+# fleet_availability_test.py
+#
+# 全线余票矩阵：由经停记录构建（区间数不同、stop_order 不连续）、最少余票、上座率和增量更新。
+# 需要 numpy（以及 db 模块依赖的 mysql.connector，构建矩阵本身不访问数据库）。
+
+import datetime
+import unittest
+
+try:
+    import numpy as np
+    from core.fleet_availability import FleetAvailabilityMatrix
+except ImportError as e:
+    np = None
+    IMPORT_ERROR = str(e)
+else:
+    IMPORT_ERROR = None
+
+DAY = datetime.date(2025, 1, 1)
+
+
+def stopovers(train_number, total_seats, seats_by_order):
+    return [
+        {'train_number': train_number, 'start_date': DAY, 'stop_order': order,
+         'seats': seats, 'total_seats': total_seats}
+        for order, seats in seats_by_order
+    ]
+
+
+@unittest.skipIf(np is None, f"fleet availability dependencies are missing: {IMPORT_ERROR}")
+class FleetAvailabilityMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        rows = (
+            stopovers('G1', 10, [(1, 8), (2, 3), (3, 6), (4, 10)])
+            + stopovers('G2', 4, [(1, 4), (2, 4)])
+            # 第3站已删除：区间为 stop_order 1, 2, 4
+            + stopovers('G3', 5, [(1, 5), (2, 1), (4, 2), (5, 5)])
+        )
+        self.matrix = FleetAvailabilityMatrix.from_rows(rows)
+
+    def test_builds_one_row_per_run(self):
+        self.assertEqual(self.matrix.runs, [('G1', DAY), ('G2', DAY), ('G3', DAY)])
+        self.assertEqual(self.matrix.seats.shape, (3, 4))
+        self.assertEqual(self.matrix.valid.sum(axis=1).tolist(), [3, 1, 3])
+        # 终点站和删除的中间站不是有效区间
+        self.assertFalse(self.matrix.valid[2, 2])
+
+    def test_min_seats_and_runs_below(self):
+        self.assertEqual(self.matrix.min_seats().tolist(), [3, 4, 1])
+        self.assertEqual(self.matrix.runs_below(4), [('G1', DAY, 3), ('G3', DAY, 1)])
+        self.assertEqual(self.matrix.runs_below(1), [])
+
+    def test_load_factor_ignores_invalid_segments(self):
+        factor = self.matrix.load_factor_by_segment()
+        np.testing.assert_allclose(factor[0, :3], [0.2, 0.7, 0.4])
+        self.assertTrue(np.isnan(factor[0, 3]))
+        self.assertEqual(factor[1, 0], 0.0)
+        self.assertTrue(np.isnan(factor[2, 2]))
+
+        summary = {run[0]: run[2:] for run in self.matrix.load_summary()}
+        self.assertEqual(summary['G2'], (1, 4, 0.0, 0.0))
+        self.assertEqual(summary['G1'][:2], (3, 3))
+        self.assertAlmostEqual(summary['G1'][2], 0.7)
+
+    def test_apply_booking_updates_route_segments(self):
+        self.assertTrue(self.matrix.apply_booking('G1', '2025-01-01', 2, 4, -1))
+        self.assertEqual(self.matrix.seats[0, :3].tolist(), [8, 2, 5])
+        self.matrix.apply_booking('G1', DAY, 2, 4, +1)
+        self.assertEqual(self.matrix.seats[0, :3].tolist(), [8, 3, 6])
+
+        self.matrix.apply_booking('G3', DAY, 2, 5, -1)
+        self.assertEqual(self.matrix.min_seats()[2], 0)
+        self.assertFalse(self.matrix.apply_booking('G9', DAY, 1, 2, -1))
+
+    def test_empty_rows(self):
+        matrix = FleetAvailabilityMatrix.from_rows([])
+        self.assertEqual(matrix.runs, [])
+        self.assertEqual(matrix.runs_below(10), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
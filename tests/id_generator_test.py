@@ -0,0 +1,77 @@
+# id_generator_test.py
+#
+# 订单号生成器：严格递增（含时钟回拨和序列号用完）、批量生成、解析和节点号校验。
+
+import os
+import unittest
+from unittest import mock
+
+from utils.id_generator import IdGenerator, EPOCH_MS, MAX_SEQUENCE, NODE_ID_ENV, ID_WIDTH
+
+
+def clock(*ms):
+    """按顺序返回给定毫秒时间戳（相对 EPOCH_MS）的 _time_ns"""
+    values = iter(ms)
+    return lambda: (EPOCH_MS + next(values)) * 1000000
+
+
+class IdGeneratorTest(unittest.TestCase):
+
+    def test_ids_increase_within_a_millisecond(self):
+        generator = IdGenerator(3)
+        time_ns = clock(*[100] * 5)
+        ids = [generator.next_id(time_ns) for _ in range(5)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual([IdGenerator.parse(value)[2] for value in ids], [0, 1, 2, 3, 4])
+
+    def test_ids_increase_when_clock_goes_backwards(self):
+        generator = IdGenerator(3)
+        time_ns = clock(1000, 1001, 500, 400, 1001, 1002)
+        ids = [generator.next_id(time_ns) for _ in range(6)]
+        self.assertEqual(ids, sorted(set(ids)))
+        # 回拨期间沿用上一次的时间戳，时钟追上后恢复
+        self.assertEqual([IdGenerator.parse(value)[0] - EPOCH_MS for value in ids],
+                         [1000, 1001, 1001, 1001, 1001, 1002])
+
+    def test_sequence_overflow_borrows_next_millisecond(self):
+        generator = IdGenerator(0)
+        time_ns = clock(*[100] * (MAX_SEQUENCE + 2))
+        ids = [generator.next_id(time_ns) for _ in range(MAX_SEQUENCE + 2)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(IdGenerator.parse(ids[-1])[0] - EPOCH_MS, 101)
+        self.assertEqual(IdGenerator.parse(ids[-1])[2], 0)
+
+    def test_batch_ids_follow_single_ids(self):
+        generator = IdGenerator(7)
+        first = generator.next_id()
+        batch = generator.next_ids(10)
+        self.assertEqual(len(set(batch)), 10)
+        self.assertEqual([first] + batch, sorted([first] + batch))
+        self.assertGreater(generator.next_id(), batch[-1])
+
+    def test_order_ids_are_fixed_width_and_sortable(self):
+        generator = IdGenerator(1)
+        order_ids = [generator.next_order_id()] + generator.next_order_ids(3)
+        self.assertTrue(all(len(order_id) == ID_WIDTH and order_id.isdigit() for order_id in order_ids))
+        self.assertEqual(order_ids, sorted(order_ids))
+        self.assertEqual(IdGenerator.parse(order_ids[0])[1], 1)
+
+    def test_node_id_is_validated(self):
+        for node_id in (-1, 1024, '3', 2.0, True):
+            with self.assertRaises(ValueError):
+                IdGenerator(node_id)
+        self.assertEqual(IdGenerator(1023).node_id, 1023)
+
+    def test_node_id_from_environment(self):
+        with mock.patch.dict(os.environ, {NODE_ID_ENV: '12'}):
+            self.assertEqual(IdGenerator().node_id, 12)
+        with mock.patch.dict(os.environ, {NODE_ID_ENV: ''}):
+            self.assertEqual(IdGenerator().node_id, 0)
+        for value in ('abc', '1024'):
+            with mock.patch.dict(os.environ, {NODE_ID_ENV: value}):
+                with self.assertRaisesRegex(ValueError, NODE_ID_ENV):
+                    IdGenerator()
+
+
+if __name__ == "__main__":
+    unittest.main()
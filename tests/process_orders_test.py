@@ -0,0 +1,108 @@
+# process_orders_test.py
+#
+# 批量审批的全有或全无：任一组余票不足时整批回滚，批次中的订单、余票、
+# 操作记录和座位分配器都保持审批前的状态。需要 MySQL（见 db_fixture）。
+
+import unittest
+
+from tests.db_fixture import TempDatabase, populate_run, insert_ready_orders, TRAIN_NUMBER, START_DATE
+
+SEATS = 2
+
+
+class ProcessOrdersTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.database = TempDatabase().create()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.database.drop()
+
+    def setUp(self):
+        from utils.seat_allocator import seat_allocators
+
+        conn = self.database.connect()
+        cursor = conn.cursor()
+        for table in ('OrderOperations', 'SeatHolds', 'SalesOrders', 'Prices', 'Stopovers',
+                      'Trains', 'Customers', 'Salespersons', 'Stations'):
+            cursor.execute(f"DELETE FROM `{table}`")
+        self.staff_id = populate_run(cursor, stops=3, seats=SEATS)[0]
+        # 两张 1->3 的票用完 2->3 区间的座位，第三张 2->3 的票无座
+        self.order_ids = insert_ready_orders(cursor, [(1, 3), (1, 3), (2, 3)])
+        conn.commit()
+        cursor.close()
+        conn.close()
+        seat_allocators.clear()
+
+    def snapshot(self):
+        conn = self.database.connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT order_id, status, version, seat_number FROM SalesOrders ORDER BY order_id"
+            )
+            orders = cursor.fetchall()
+            cursor.execute(
+                "SELECT stop_order, seats FROM Stopovers WHERE train_number = %s AND start_date = %s "
+                "ORDER BY stop_order",
+                (TRAIN_NUMBER, START_DATE)
+            )
+            seats = cursor.fetchall()
+            cursor.execute("SELECT COUNT(*) FROM OrderOperations")
+            operations = cursor.fetchone()[0]
+            return orders, seats, operations
+        finally:
+            cursor.close()
+            conn.close()
+
+    def assert_unchanged(self, before):
+        from utils.seat_allocator import seat_allocators
+
+        orders, seats, operations = self.snapshot()
+        self.assertEqual(orders, before[0])
+        self.assertTrue(all(status == 'Ready' and seat is None for _, status, _, seat in orders))
+        self.assertEqual(seats, before[1])
+        self.assertEqual(operations, 0)
+        # 前一组在内存中分配的座位随事务一起丢弃
+        self.assertIsNone(seat_allocators.peek(TRAIN_NUMBER, START_DATE))
+
+    def test_failed_group_rolls_back_whole_batch(self):
+        from core.services import OrderService
+
+        before = self.snapshot()
+        success, message = OrderService.process_orders(self.order_ids, True, self.staff_id)
+        self.assertFalse(success, message)
+        self.assert_unchanged(before)
+
+    def test_failed_group_rolls_back_whole_batch_through_queue(self):
+        from core.booking_queue import BookingQueue
+
+        before = self.snapshot()
+        queue = BookingQueue(workers=2)
+        try:
+            success, message = queue.process_orders(self.order_ids, True, self.staff_id).result(timeout=30)
+        finally:
+            queue.stop()
+        self.assertFalse(success, message)
+        self.assert_unchanged(before)
+
+    def test_batch_commits_together(self):
+        from core.services import OrderService
+
+        processed = []
+        success, message = OrderService.process_orders(self.order_ids[:2], True, self.staff_id,
+                                                       processed=processed)
+        self.assertTrue(success, message)
+        self.assertEqual(sorted(processed), self.order_ids[:2])
+
+        orders, seats, operations = self.snapshot()
+        self.assertEqual([status for _, status, _, _ in orders], ['Success', 'Success', 'Ready'])
+        self.assertEqual(len({seat for _, _, _, seat in orders[:2]}), 2)
+        self.assertEqual(seats, [(1, 0), (2, 0), (3, SEATS)])
+        self.assertEqual(operations, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
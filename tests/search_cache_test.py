@@ -0,0 +1,85 @@
+# search_cache_test.py
+#
+# 余票查询缓存：LRU 淘汰、按运行/列车/起止站失效、失效代数丢弃过期写入和 TTL 过期。
+
+import unittest
+
+from utils.search_cache import SearchCache
+
+RUN_A = ('G1', '2025-01-01')
+RUN_B = ('G2', '2025-01-01')
+
+
+class SearchCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.cache = SearchCache(maxsize=2, ttl=30, clock=lambda: self.now)
+
+    def put(self, key, value, runs):
+        return self.cache.put(key, value, runs, self.cache.begin())
+
+    def test_evicts_least_recently_used(self):
+        self.put(('A', 'B', 'd1'), 1, [RUN_A])
+        self.put(('A', 'C', 'd1'), 2, [RUN_A])
+        self.assertEqual(self.cache.get(('A', 'B', 'd1')), 1)  # 变为最近使用
+        self.put(('A', 'D', 'd1'), 3, [RUN_B])
+
+        self.assertIsNone(self.cache.get(('A', 'C', 'd1')))
+        self.assertEqual(self.cache.get(('A', 'B', 'd1')), 1)
+        self.assertEqual(self.cache.get(('A', 'D', 'd1')), 3)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+        # 被淘汰的缓存项也从索引中移除
+        self.assertEqual(self.cache.invalidate_route('A', 'C'), 0)
+
+    def test_invalidate_run_train_and_route(self):
+        self.put(('A', 'B', 'd1'), 1, [RUN_A])
+        self.put(('A', 'C', 'd1'), 2, [RUN_B])
+        self.assertEqual(self.cache.invalidate_run(*RUN_A), 1)
+        self.assertIsNone(self.cache.get(('A', 'B', 'd1')))
+        self.assertEqual(self.cache.get(('A', 'C', 'd1')), 2)
+
+        self.assertEqual(self.cache.invalidate_train('G2'), 1)
+        self.assertIsNone(self.cache.get(('A', 'C', 'd1')))
+
+        self.put(('A', 'B', 'd2'), 3, [])
+        self.assertEqual(self.cache.invalidate_route('A', 'B'), 1)
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_write_after_invalidation_is_dropped(self):
+        token = self.cache.begin()
+        # 查询数据库期间有订单被审批，之前读到的余票不能写入缓存
+        self.cache.invalidate_run(*RUN_B)
+        self.assertFalse(self.cache.put(('A', 'B', 'd1'), 1, [RUN_A], token))
+        self.assertIsNone(self.cache.get(('A', 'B', 'd1')))
+
+        self.assertTrue(self.put(('A', 'B', 'd1'), 1, [RUN_A]))
+        self.assertEqual(self.cache.get(('A', 'B', 'd1')), 1)
+
+    def test_clear_drops_pending_writes(self):
+        token = self.cache.begin()
+        self.cache.clear()
+        self.assertFalse(self.cache.put(('A', 'B', 'd1'), 1, [RUN_A], token))
+
+    def test_entries_expire_after_ttl(self):
+        self.put(('A', 'B', 'd1'), 1, [RUN_A])
+        self.now = 29.9
+        self.assertEqual(self.cache.get(('A', 'B', 'd1')), 1)
+        self.now = 30.0
+        self.assertIsNone(self.cache.get(('A', 'B', 'd1')))
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['expirations'], 1)
+        self.assertEqual(stats['size'], 0)
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_no_ttl_keeps_entries(self):
+        cache = SearchCache(ttl=None, clock=lambda: self.now)
+        cache.put(('A', 'B', 'd1'), 1, [RUN_A], cache.begin())
+        self.now = 1e9
+        self.assertEqual(cache.get(('A', 'B', 'd1')), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+# seat_allocator_test.py
+#
+# 座位分配器：best fit 减少碎片、释放后复用、占用冲突校验，以及 stop_order 不连续时的区间映射。
+
+import unittest
+
+from utils.seat_allocator import SeatAllocator, SeatAllocatorRegistry
+
+
+class SeatAllocatorTest(unittest.TestCase):
+
+    def test_allocates_whole_route_once_per_seat(self):
+        allocator = SeatAllocator(2, 3)
+        self.assertEqual(allocator.allocate(1, 4), 1)
+        self.assertEqual(allocator.allocate(1, 4), 2)
+        self.assertIsNone(allocator.allocate(2, 3))
+        self.assertEqual(allocator.available(1, 2), 0)
+
+    def test_best_fit_keeps_long_gaps_free(self):
+        # 座位1已售 1->2，座位2全程空闲：2->3 放进座位1的剩余空档，座位2留给长途
+        allocator = SeatAllocator(2, 3)
+        allocator.occupy(1, 1, 2)
+        self.assertEqual(allocator.allocate(2, 3), 1)
+        self.assertEqual(allocator.allocate(1, 4), 2)
+
+    def test_fragmentation_blocks_whole_route(self):
+        # 每个区间都有空座，但没有一个座位在整段行程上空闲
+        allocator = SeatAllocator(2, 2)
+        allocator.occupy(1, 1, 2)
+        allocator.occupy(2, 2, 3)
+        self.assertEqual(allocator.available(1, 2), 1)
+        self.assertEqual(allocator.available(2, 3), 1)
+        self.assertEqual(allocator.available(1, 3), 0)
+        self.assertIsNone(allocator.allocate(1, 3))
+
+    def test_release_makes_seat_available_again(self):
+        allocator = SeatAllocator(1, 3)
+        allocator.occupy(1, 1, 3)
+        self.assertIsNone(allocator.allocate(2, 4))
+        allocator.release(1, 1, 3)
+        self.assertEqual(allocator.allocate(2, 4), 1)
+        self.assertEqual(allocator.allocate(1, 2), 1)
+        self.assertEqual(allocator.available(1, 4), 0)
+
+    def test_occupy_and_release_are_checked(self):
+        allocator = SeatAllocator(2, 3)
+        allocator.occupy(1, 1, 3)
+        with self.assertRaises(ValueError):
+            allocator.occupy(1, 2, 4)
+        with self.assertRaises(ValueError):
+            allocator.release(1, 2, 4)
+        with self.assertRaises(ValueError):
+            allocator.occupy(3, 1, 2)
+        allocator.occupy(1, 3, 4)
+
+    def test_non_contiguous_stop_orders(self):
+        # 删除第3站后经停站为 1, 2, 4, 5：区间 [1,2), [2,4), [4,5)
+        allocator = SeatAllocator(1, 3, [1, 2, 4, 5])
+        self.assertEqual(allocator.allocate(2, 4), 1)
+        self.assertEqual(allocator.available(1, 2), 1)
+        self.assertEqual(allocator.available(4, 5), 1)
+        self.assertIsNone(allocator.allocate(1, 5))
+        self.assertEqual(allocator.allocate(4, 5), 1)
+        allocator.release(1, 2, 4)
+        self.assertEqual(allocator.allocate(1, 4), 1)
+        self.assertEqual(allocator.available(1, 5), 0)
+
+    def test_stop_orders_must_match_segments(self):
+        with self.assertRaises(ValueError):
+            SeatAllocator(1, 3, [1, 2, 4])
+
+
+class SeatAllocatorRegistryTest(unittest.TestCase):
+
+    def test_loads_once_and_invalidates(self):
+        registry = SeatAllocatorRegistry()
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return SeatAllocator(1, 1)
+
+        allocator = registry.get('G1', '2025-01-01', loader)
+        self.assertIs(registry.get('G1', '2025-01-01', loader), allocator)
+        self.assertEqual(len(loads), 1)
+
+        registry.invalidate_run('G1', '2025-01-01')
+        self.assertIsNone(registry.peek('G1', '2025-01-01'))
+        registry.get('G1', '2025-01-01', loader)
+        registry.get('G1', '2025-01-02', loader)
+        self.assertEqual(len(loads), 3)
+
+        registry.invalidate_train('G1')
+        self.assertIsNone(registry.peek('G1', '2025-01-02'))
+        self.assertIsNone(registry.get('G2', '2025-01-01', lambda: None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# station_index_test.py
+#
+# 车站前缀索引：按站名、代码和拼音（需要 pypinyin）的前缀补全，以及别名的唯一解析。
+
+import contextlib
+import io
+import unittest
+
+from utils import station_index as station_index_module
+from utils.station_index import StationIndex, PINYIN_AVAILABLE
+
+STATIONS = [
+    {'station_id': 1, 'station_name': '北京南', 'station_code': 'VNP'},
+    {'station_id': 2, 'station_name': '北京西', 'station_code': 'BXP'},
+    {'station_id': 3, 'station_name': '上海虹桥', 'station_code': 'AOH'},
+    {'station_id': 4, 'station_name': '南京', 'station_code': 'NJH'},
+    {'station_id': 5, 'station_name': '南京南', 'station_code': 'NKH'},
+]
+
+
+class StationIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = StationIndex()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.index.build(STATIONS)
+
+    def names(self, prefix, limit=10):
+        return [station['station_name'] for station in self.index.suggest(prefix, limit)]
+
+    def test_suggest_by_name_prefix(self):
+        self.assertEqual(sorted(self.names('北京')), ['北京南', '北京西'])
+        self.assertEqual(self.names('上海'), ['上海虹桥'])
+        self.assertEqual(self.names('广州'), [])
+        self.assertEqual(self.names('  '), [])
+
+    def test_exact_match_comes_first(self):
+        self.assertEqual(self.names('南京'), ['南京', '南京南'])
+        self.assertEqual(self.names('南京', limit=1), ['南京'])
+
+    def test_suggest_by_code_ignores_case(self):
+        self.assertEqual(self.names('bx'), ['北京西'])
+        self.assertEqual(self.names('NK'), ['南京南'])
+
+    def test_resolve_name_and_code(self):
+        self.assertEqual(self.index.resolve('北京西')['station_id'], 2)
+        self.assertEqual(self.index.resolve(' aoh ')['station_id'], 3)
+        self.assertIsNone(self.index.resolve('北京'))
+        self.assertIsNone(self.index.resolve(''))
+
+    def test_invalidate_marks_index_stale(self):
+        self.assertTrue(self.index.loaded)
+        self.index.invalidate()
+        self.assertFalse(self.index.loaded)
+
+    @unittest.skipUnless(PINYIN_AVAILABLE, "pypinyin is not installed")
+    def test_suggest_and_resolve_by_pinyin(self):
+        self.assertEqual(sorted(self.names('beijing')), ['北京南', '北京西'])
+        self.assertEqual(self.names('shhq'), ['上海虹桥'])
+        self.assertEqual(self.index.resolve('bjx')['station_id'], 2)
+        # 别名按整个键解析：南京的首字母 nj 是 njn 的前缀，不影响南京南的解析
+        self.assertEqual(self.index.resolve('njn')['station_id'], 5)
+
+    def test_warns_once_without_pypinyin(self):
+        original = station_index_module.PINYIN_AVAILABLE
+        station_index_module.PINYIN_AVAILABLE = False
+        try:
+            index = StationIndex()
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                index.build(STATIONS)
+                index.build(STATIONS)
+        finally:
+            station_index_module.PINYIN_AVAILABLE = original
+        self.assertEqual(output.getvalue().count("pypinyin is not installed"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
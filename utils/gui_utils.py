@@ -76,6 +76,24 @@ class GUIUtils:
         confirm_window.wait_window()  # 等待窗口关闭
         return result[0]
     
+    def when_done(self, future, callback, poll_interval=50):
+        """在主循环中等待 Future 完成后调用 callback(result)，等待期间界面保持响应
+
+        Future 由工作线程完成，这里用 after 定时检查，callback 始终在主线程中执行；
+        Future 抛出异常时以 (False, 错误信息) 调用 callback。
+        """
+        def poll():
+            if not future.done():
+                self.main_window.after(poll_interval, poll)
+                return
+            try:
+                result = future.result()
+            except Exception as e:
+                result = (False, str(e))
+            callback(result)
+
+        poll()
+
     @staticmethod
     def validate_date(date_str):
         """验证日期格式是否正确"""
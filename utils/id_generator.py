@@ -0,0 +1,112 @@
+# id_generator.py
+
+import os
+import threading
+import time
+
+# 自定义纪元 2024-01-01 00:00:00 UTC（毫秒）
+EPOCH_MS = 1704067200000
+
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+TIMESTAMP_SHIFT = NODE_BITS + SEQUENCE_BITS
+
+# 63位ID的十进制最多19位，补零到固定宽度后字符串顺序与数值顺序一致
+ID_WIDTH = 19
+
+# 多进程部署时每个进程使用不同的节点号（0-1023）
+NODE_ID_ENV = "TRAIN_TICKET_NODE_ID"
+
+
+class IdGenerator:
+    """Snowflake 风格的ID生成器
+
+    ID 由 41 位毫秒时间戳（相对 EPOCH_MS）、10 位节点号和 12 位序列号组成，
+    同一节点内严格递增，不同节点之间不会重复，按时间大致有序，插入 B+ 树索引时总是追加在末尾。
+    同一毫秒内序列号用完或系统时钟回拨时，沿用并推进上一次的时间戳而不是等待，
+    因此不会阻塞，也不会生成重复或倒序的ID。
+    """
+
+    def __init__(self, node_id=None):
+        """
+        Args:
+            node_id (int, optional): 节点号，0-1023；为空时读取环境变量 TRAIN_TICKET_NODE_ID（未设置时为0）
+
+        Raises:
+            ValueError: 节点号不是整数或超出范围
+        """
+        source = "Node id"
+        if node_id is None:
+            source = f"{NODE_ID_ENV} environment variable"
+            node_id = (os.environ.get(NODE_ID_ENV) or "0").strip()
+            try:
+                node_id = int(node_id)
+            except ValueError:
+                raise ValueError(f"{source} must be an integer between 0 and {MAX_NODE_ID}, "
+                                 f"got {node_id!r}") from None
+        if isinstance(node_id, bool) or not isinstance(node_id, int) or not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f"{source} must be an integer between 0 and {MAX_NODE_ID}, got {node_id!r}")
+        self.node_id = node_id
+        self._node_bits = node_id << SEQUENCE_BITS
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_id(self, _time_ns=time.time_ns):
+        """生成下一个整数ID"""
+        with self._lock:
+            now = _time_ns() // 1000000 - EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms = now
+                sequence = self._sequence = 0
+            else:
+                sequence = self._sequence + 1
+                if sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    sequence = 0
+                self._sequence = sequence
+            return (self._last_ms << TIMESTAMP_SHIFT) | self._node_bits | sequence
+
+    def next_ids(self, count):
+        """一次生成 count 个连续的整数ID（只加一次锁，用于团体订票和批量导入）"""
+        with self._lock:
+            now = time.time_ns() // 1000000 - EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = -1
+            ids = []
+            for _ in range(count):
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+                ids.append((self._last_ms << TIMESTAMP_SHIFT) | self._node_bits | self._sequence)
+            return ids
+
+    def next_order_id(self):
+        """生成下一个订单号（19位定长数字字符串，适用于 VARCHAR(20) 列）"""
+        return str(self.next_id()).zfill(ID_WIDTH)
+
+    def next_order_ids(self, count):
+        """一次生成 count 个订单号"""
+        return [str(value).zfill(ID_WIDTH) for value in self.next_ids(count)]
+
+    @staticmethod
+    def parse(value):
+        """解析ID
+
+        Returns:
+            tuple: (生成时间的 Unix 毫秒时间戳, 节点号, 序列号)
+        """
+        value = int(value)
+        return (
+            (value >> TIMESTAMP_SHIFT) + EPOCH_MS,
+            (value >> SEQUENCE_BITS) & MAX_NODE_ID,
+            value & MAX_SEQUENCE,
+        )
+
+
+# 全局订单号生成器，节点号来自环境变量 TRAIN_TICKET_NODE_ID（默认0）
+order_id_generator = IdGenerator()
@@ -0,0 +1,165 @@
+# search_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class SearchCache:
+    """余票查询结果缓存
+
+    以 (出发站, 到达站, 日期) 为键的有界 LRU 缓存。每个缓存项记录其结果中
+    涉及的车次运行 (train_number, start_date)，当审批、退款或票价变更触及
+    这些车次时精确失效对应的缓存项。
+    失效只在本进程内进行，其他进程（其他售票终端）提交的变更要等缓存项超过
+    ttl 秒后才会被看到，ttl 即跨进程余票显示的最大延迟。
+    """
+
+    def __init__(self, maxsize=256, ttl=30, clock=time.monotonic):
+        """
+        Args:
+            maxsize (int): 最多缓存的查询数
+            ttl (float): 缓存项的有效期（秒），None 表示只靠显式失效
+            clock (callable): 返回当前时间（秒）的函数
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()   # key -> (value, runs, expires_at)
+        self._run_index = {}            # (train_number, start_date) -> set(keys)
+        self._train_index = {}          # train_number -> set(keys)
+        self._route_index = {}          # (dep, arr) -> set(keys)
+        self._generation = 0            # 每次失效递增，用于丢弃过期的写入
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expirations = 0
+
+    def begin(self):
+        """在查询数据库前获取写入令牌
+
+        Returns:
+            int: 当前失效代数，需在 put() 时传回
+        """
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """读取缓存项，未命中返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and self._clock() >= entry[2]:
+                self._unlink(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, runs, token):
+        """写入缓存项
+
+        Args:
+            key (tuple): (出发站, 到达站, 日期)
+            value: 缓存的查询结果
+            runs (iterable): 结果涉及的 (train_number, start_date) 列表
+            token (int): begin() 返回的令牌；若期间发生过失效则放弃写入，
+                避免把审批前读到的余票写回缓存
+        """
+        with self._lock:
+            if token != self._generation:
+                return False
+            if key in self._entries:
+                self._unlink(key)
+            runs = {(str(train), str(date)) for train, date in runs}
+            expires_at = self._clock() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (value, runs, expires_at)
+            for run in runs:
+                self._run_index.setdefault(run, set()).add(key)
+                self._train_index.setdefault(run[0], set()).add(key)
+            self._route_index.setdefault((key[0], key[1]), set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._unlink(oldest)
+                self.evictions += 1
+            return True
+
+    def invalidate_run(self, train_number, start_date):
+        """使包含指定车次运行的缓存项失效（订单审批、退款）"""
+        with self._lock:
+            keys = self._run_index.get((str(train_number), str(start_date)), set())
+            return self._invalidate_keys(keys)
+
+    def invalidate_train(self, train_number):
+        """使包含指定列车任意运行日期的缓存项失效（票价变更、列车删除）"""
+        with self._lock:
+            keys = self._train_index.get(str(train_number), set())
+            return self._invalidate_keys(keys)
+
+    def invalidate_route(self, dep_station_name, arr_station_name):
+        """使指定起止站的缓存项失效（新增票价可能带来新的车次）"""
+        with self._lock:
+            keys = self._route_index.get((dep_station_name, arr_station_name), set())
+            return self._invalidate_keys(keys)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._run_index.clear()
+            self._train_index.clear()
+            self._route_index.clear()
+
+    def stats(self):
+        """返回缓存命中统计
+
+        Returns:
+            dict: hits, misses, hit_rate, size, evictions, invalidations, expirations
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._entries),
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'expirations': self.expirations
+            }
+
+    def _invalidate_keys(self, keys):
+        # 即使没有命中的缓存项也推进代数，保证并发查询不会写回旧数据
+        self._generation += 1
+        keys = list(keys)
+        for key in keys:
+            self._unlink(key)
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def _unlink(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for run in entry[1]:
+            self._discard(self._run_index, run, key)
+            self._discard(self._train_index, run[0], key)
+        self._discard(self._route_index, (key[0], key[1]), key)
+
+    @staticmethod
+    def _discard(index, index_key, key):
+        keys = index.get(index_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[index_key]
+
+
+# 全局查询缓存实例
+search_cache = SearchCache()
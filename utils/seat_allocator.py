@@ -0,0 +1,196 @@
+# seat_allocator.py
+
+import bisect
+import threading
+
+
+class SeatAllocator:
+    """单次列车运行的座位分配器
+
+    每个座位用一个整数位图记录已占用的区间，第 k 位表示从第 k 个经停站（stop_orders[k]）
+    到下一个经停站的区间。删除中间站后 stop_order 可能不连续，区间按实际的经停站编号。
+    占用模式相同的座位归为一组，分配时只需遍历不同的占用模式而不是全部座位，
+    在能容纳请求区间的模式中选择最贴合的一个（best fit）：请求区间所在的连续空闲段
+    剩余越少越好，从而把长空闲段留给长途旅客，减少碎片、提高可售座位数。
+    """
+
+    def __init__(self, total_seats, segments, stop_orders=None):
+        """
+        Args:
+            total_seats (int): 总座位数，座位号为 1..total_seats
+            segments (int): 区间数（经停站数-1）
+            stop_orders (list, optional): 升序的各经停站 stop_order，共 segments+1 个，
+                默认为 1..segments+1
+
+        Raises:
+            ValueError: stop_orders 的个数与区间数不符
+        """
+        if stop_orders is None:
+            stop_orders = range(1, segments + 2)
+        self.stop_orders = sorted(stop_orders)
+        if len(self.stop_orders) != segments + 1:
+            raise ValueError(f"Expected {segments + 1} stop orders, got {len(self.stop_orders)}")
+        self.total_seats = total_seats
+        self.segments = segments
+        self._occupied = [0] * (total_seats + 1)
+        self._groups = {0: list(range(1, total_seats + 1))}  # 占用位图 -> 升序座位号列表
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def segment_mask(dep_stop_order, arr_stop_order):
+        """stop_order 连续（1..segments+1）时区间 [dep_stop_order, arr_stop_order) 对应的位图"""
+        return ((1 << (arr_stop_order - dep_stop_order)) - 1) << (dep_stop_order - 1)
+
+    def _route(self, dep_stop_order, arr_stop_order):
+        """行程覆盖的区间下标范围 [lo, hi)（从0开始）
+
+        出发站的 stop_order 在 [dep_stop_order, arr_stop_order) 内的区间都被覆盖，
+        与 Stopovers 上 stop_order >= dep AND stop_order < arr 的区间一致。
+        """
+        lo = bisect.bisect_left(self.stop_orders, dep_stop_order)
+        hi = min(bisect.bisect_left(self.stop_orders, arr_stop_order), self.segments)
+        return lo, max(lo, hi)
+
+    def _mask(self, lo, hi):
+        return ((1 << (hi - lo)) - 1) << lo
+
+    def allocate(self, dep_stop_order, arr_stop_order):
+        """为一段行程分配座位
+
+        Returns:
+            int: 座位号，没有任何座位在整段行程上空闲时返回None
+        """
+        lo, hi = self._route(dep_stop_order, arr_stop_order)
+        if lo == hi:
+            return None
+        mask = self._mask(lo, hi)
+        with self._lock:
+            best = None
+            best_score = None
+            for pattern, seats in self._groups.items():
+                if pattern & mask:
+                    continue
+                score = self._fit_score(pattern, lo, hi) + (seats[0],)
+                if best_score is None or score < best_score:
+                    best, best_score = pattern, score
+            if best is None:
+                return None
+
+            seat = self._groups[best][0]
+            self._move(seat, best | mask)
+            return seat
+
+    def occupy(self, seat_number, dep_stop_order, arr_stop_order):
+        """将指定座位标记为在该区间已占用（用于从已有订单恢复状态）
+
+        Raises:
+            ValueError: 座位号无效或区间已被占用
+        """
+        mask = self._mask(*self._route(dep_stop_order, arr_stop_order))
+        with self._lock:
+            self._check_seat(seat_number)
+            pattern = self._occupied[seat_number]
+            if pattern & mask:
+                raise ValueError(f"Seat {seat_number} is already occupied on this route")
+            self._move(seat_number, pattern | mask)
+
+    def release(self, seat_number, dep_stop_order, arr_stop_order):
+        """释放座位在该区间的占用
+
+        Raises:
+            ValueError: 座位号无效或区间未被占用
+        """
+        mask = self._mask(*self._route(dep_stop_order, arr_stop_order))
+        with self._lock:
+            self._check_seat(seat_number)
+            pattern = self._occupied[seat_number]
+            if pattern & mask != mask:
+                raise ValueError(f"Seat {seat_number} is not occupied on this route")
+            self._move(seat_number, pattern & ~mask)
+
+    def available(self, dep_stop_order, arr_stop_order):
+        """在整段行程上空闲的座位数"""
+        mask = self._mask(*self._route(dep_stop_order, arr_stop_order))
+        with self._lock:
+            return sum(len(seats) for pattern, seats in self._groups.items() if not pattern & mask)
+
+    def _fit_score(self, pattern, lo, hi):
+        """请求区间 [lo, hi)（从0开始的区间下标）放入该占用模式后的碎片评分，越小越好
+
+        Returns:
+            tuple: (所在空闲段剩余的区间数, 两侧较短的剩余长度)
+        """
+        below = pattern & ((1 << lo) - 1)
+        left_free = lo - below.bit_length()
+        above = pattern >> hi
+        right_free = (above & -above).bit_length() - 1 if above else self.segments - hi
+        return left_free + right_free, min(left_free, right_free)
+
+    def _move(self, seat_number, new_pattern):
+        old_pattern = self._occupied[seat_number]
+        seats = self._groups[old_pattern]
+        del seats[bisect.bisect_left(seats, seat_number)]
+        if not seats:
+            del self._groups[old_pattern]
+        bisect.insort(self._groups.setdefault(new_pattern, []), seat_number)
+        self._occupied[seat_number] = new_pattern
+
+    def _check_seat(self, seat_number):
+        if not 1 <= seat_number <= self.total_seats:
+            raise ValueError(f"Invalid seat number: {seat_number}")
+
+
+class SeatAllocatorRegistry:
+    """按 (train_number, start_date) 管理各次运行的座位分配器，首次使用时加载"""
+
+    def __init__(self):
+        self._allocators = {}
+        self._lock = threading.Lock()
+
+    def get(self, train_number, start_date, loader):
+        """获取分配器，不存在时调用 loader() 构建
+
+        Args:
+            loader (callable): 返回 SeatAllocator 的函数，返回None表示该运行不存在
+        """
+        key = (str(train_number), str(start_date))
+        with self._lock:
+            allocator = self._allocators.get(key)
+        if allocator is not None:
+            return allocator
+
+        allocator = loader()
+        if allocator is None:
+            return None
+        with self._lock:
+            # 并发加载时保留先完成的实例
+            return self._allocators.setdefault(key, allocator)
+
+    def put(self, train_number, start_date, allocator):
+        """用重新加载的分配器替换缓存中的实例"""
+        with self._lock:
+            self._allocators[(str(train_number), str(start_date))] = allocator
+
+    def peek(self, train_number, start_date):
+        """获取已加载的分配器，未加载时返回None（不触发加载）"""
+        with self._lock:
+            return self._allocators.get((str(train_number), str(start_date)))
+
+    def invalidate_run(self, train_number, start_date):
+        """丢弃指定运行的分配器，下次使用时从数据库重新加载"""
+        with self._lock:
+            self._allocators.pop((str(train_number), str(start_date)), None)
+
+    def invalidate_train(self, train_number):
+        """丢弃指定列车所有运行的分配器（列车删除、经停变更）"""
+        with self._lock:
+            for key in [key for key in self._allocators if key[0] == str(train_number)]:
+                del self._allocators[key]
+
+    def clear(self):
+        with self._lock:
+            self._allocators.clear()
+
+
+# 全局座位分配器注册表
+seat_allocators = SeatAllocatorRegistry()
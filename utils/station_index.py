@@ -0,0 +1,133 @@
+# station_index.py
+
+import bisect
+import threading
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 未安装 pypinyin 时仅索引站名和站点代码（代码本身即拼音首字母）
+    lazy_pinyin = None
+    Style = None
+
+# 是否支持按拼音全拼/首字母查询车站
+PINYIN_AVAILABLE = lazy_pinyin is not None
+
+
+class StationIndex:
+    """车站前缀索引，用于查询表单的自动补全
+
+    在内存中维护一个按键排序的列表，键包括站名、站点代码以及拼音首字母/全拼
+    （需要 pypinyin），通过二分查找回答前缀查询，并直接解析到 station_id。
+    """
+
+    def __init__(self):
+        self._keys = []         # 排序后的 (key, station_id)
+        self._stations = {}     # station_id -> 车站信息字典
+        self._by_name = {}      # station_name -> station_id
+        self._by_alias = {}     # 小写的代码/拼音首字母 -> set(station_id)
+        self.loaded = False
+        self._pinyin_warned = False
+        self._lock = threading.Lock()
+
+    def build(self, stations):
+        """根据车站记录重建索引
+
+        Args:
+            stations (list): 包含 station_id, station_name, station_code 的字典列表
+        """
+        if not PINYIN_AVAILABLE and not self._pinyin_warned:
+            self._pinyin_warned = True
+            print("Warning: pypinyin is not installed, stations can only be searched by name or code "
+                  "(pip install pypinyin to enable pinyin search)")
+        keys = []
+        by_name = {}
+        by_alias = {}
+        station_map = {}
+        for station in stations or []:
+            station_id = station['station_id']
+            name = station['station_name']
+            station_map[station_id] = station
+            by_name[name] = station_id
+
+            aliases = set()
+            if station.get('station_code'):
+                aliases.add(station['station_code'].lower())
+            aliases.update(self._pinyin_keys(name))
+            for alias in aliases:
+                by_alias.setdefault(alias, set()).add(station_id)
+
+            for key in {name.lower()} | aliases:
+                keys.append((key, station_id))
+
+        keys.sort()
+        with self._lock:
+            self._keys = keys
+            self._stations = station_map
+            self._by_name = by_name
+            self._by_alias = by_alias
+            self.loaded = True
+
+    def invalidate(self):
+        """标记索引过期，下次使用时重新加载（新增车站后调用）"""
+        with self._lock:
+            self.loaded = False
+
+    def suggest(self, prefix, limit=10):
+        """按前缀返回匹配的车站
+
+        Args:
+            prefix (str): 用户输入的前缀（站名、代码或拼音首字母）
+            limit (int): 最多返回的车站数
+
+        Returns:
+            list: 车站信息字典列表，完全匹配的车站排在前面
+        """
+        prefix = (prefix or '').strip().lower()
+        if not prefix:
+            return []
+
+        keys = self._keys
+        exact = []
+        partial = []
+        seen = set()
+        i = bisect.bisect_left(keys, (prefix,))
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            key, station_id = keys[i]
+            if station_id not in seen:
+                seen.add(station_id)
+                (exact if key == prefix else partial).append(station_id)
+            i += 1
+
+        return [self._stations[station_id] for station_id in (exact + partial)[:limit]]
+
+    def resolve(self, text):
+        """将用户输入解析为唯一车站
+
+        先按站名精确匹配，再按代码/拼音首字母匹配（仅在唯一时成功）。
+
+        Returns:
+            dict: 车站信息字典，无法唯一确定时返回None
+        """
+        text = (text or '').strip()
+        if not text:
+            return None
+
+        station_id = self._by_name.get(text)
+        if station_id is None:
+            candidates = self._by_alias.get(text.lower(), set())
+            if len(candidates) != 1:
+                return None
+            station_id = next(iter(candidates))
+        return self._stations.get(station_id)
+
+    @staticmethod
+    def _pinyin_keys(name):
+        if lazy_pinyin is None:
+            return set()
+        syllables = lazy_pinyin(name)
+        initials = lazy_pinyin(name, style=Style.FIRST_LETTER)
+        return {''.join(syllables).lower(), ''.join(initials).lower()}
+
+
+# 全局车站索引实例
+station_index = StationIndex()